@@ -0,0 +1,228 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Iterator, List, Optional
+import metrics
+
+class AdmissionError(Exception):
+    """An upstream LLM call was not admitted"""
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class AdmissionRejected(AdmissionError):
+    """The wait queue was full; rejected without waiting"""
+    status_code = 429
+
+class AdmissionTimeout(AdmissionError):
+    """The request's deadline passed while it waited in the queue"""
+    status_code = 503
+
+# Absolute deadline (time.monotonic()) of the request being served, if any
+_deadline: ContextVar[Optional[float]] = ContextVar("admission_deadline", default=None)
+
+@contextmanager
+def request_deadline(seconds: float, start: Optional[float] = None) -> Iterator[float]:
+    """
+    Bound the total time LLM calls in the with-block may wait for admission.
+
+    Args:
+        seconds: Time budget for queueing, shared by all calls the request makes
+        start: time.monotonic() the budget counts from, e.g. when the request
+            arrived (default now)
+
+    Yields:
+        The absolute deadline on the time.monotonic() clock
+    """
+    deadline = (time.monotonic() if start is None else start) + seconds
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+class AdmissionController:
+    """
+    Admission control in front of the Anthropic API.
+
+    A call is admitted when fewer than max_concurrent calls are in flight and its
+    estimated tokens fit in the tokens-per-minute budget (a sliding 60s window).
+    Otherwise it waits in a bounded FIFO queue until admitted or its deadline passes;
+    when the queue is full, it is rejected at once so the client can back off.
+
+    Requests are also counted from the moment they arrive (see request()): one
+    still waiting for a worker thread has not reached the queue yet, but takes
+    its place in it all the same.
+    """
+
+    WINDOW_SECONDS = 60.0
+
+    def __init__(self, max_concurrent: int, tokens_per_minute: int = 0,
+                 max_queue: int = 64, default_timeout: float = 30.0):
+        """
+        Args:
+            max_concurrent: Maximum calls in flight at once
+            tokens_per_minute: Token budget per 60s window (0 for no budget)
+            max_queue: Maximum calls waiting for admission
+            default_timeout: Queueing time allowed outside request_deadline()
+        """
+        self.max_concurrent = max_concurrent
+        self.tokens_per_minute = tokens_per_minute
+        self.max_queue = max_queue
+        self.default_timeout = default_timeout
+
+        self._cond = threading.Condition()
+        self._pending_requests = 0
+        self._in_flight = 0
+        self._waiters: Deque[object] = deque()
+        self._window: Deque[List] = deque()  # [admitted at, tokens] per admitted call
+        self._window_tokens = 0
+
+    @classmethod
+    def from_config(cls, config) -> "AdmissionController":
+        return cls(
+            max_concurrent=config.LLM_MAX_CONCURRENCY,
+            tokens_per_minute=config.LLM_TOKENS_PER_MINUTE,
+            max_queue=config.LLM_QUEUE_SIZE,
+            default_timeout=config.LLM_QUEUE_TIMEOUT
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def pending_requests(self) -> int:
+        return self._pending_requests
+
+    @contextmanager
+    def request(self) -> Iterator[None]:
+        """
+        Count a request as pending from its arrival until it is answered.
+
+        Enter it on the event loop, before the request is handed to a worker thread:
+        requests waiting for a thread never reach the admission queue, so it could
+        not fill up otherwise. At most max_concurrent + max_queue requests are
+        pending at once; beyond that they are rejected without waiting.
+
+        Raises:
+            AdmissionRejected: As many requests as calls can run or wait are pending already
+        """
+        with self._cond:
+            if self._pending_requests >= self.max_concurrent + self.max_queue:
+                metrics.ADMISSION_REJECTIONS.labels("queue_full").inc()
+                raise AdmissionRejected("Too many requests waiting for the language model",
+                                        retry_after=self._retry_after(time.monotonic()))
+            self._pending_requests += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._pending_requests -= 1
+
+    @contextmanager
+    def admit(self, estimated_tokens: int) -> Iterator[list]:
+        """
+        Hold an admission slot for the duration of the with-block.
+
+        Args:
+            estimated_tokens: Expected input plus output tokens of the call
+
+        Yields:
+            A one-item list; set its item to the actual token count once known
+            so the budget is charged for real usage instead of the estimate
+
+        Raises:
+            AdmissionRejected: The wait queue is full
+            AdmissionTimeout: The deadline passed before the call was admitted
+        """
+        entry = self._acquire(estimated_tokens)
+        actual = [None]
+        try:
+            yield actual
+        finally:
+            self._release(entry, actual[0])
+
+    def _acquire(self, tokens: int) -> list:
+        start = time.monotonic()
+        deadline = _deadline.get() or start + self.default_timeout
+        ticket = object()
+
+        with self._cond:
+            self._expire_window(start)
+            if not self._waiters and self._can_admit(tokens):
+                return self._admit(tokens, start, start)
+
+            if len(self._waiters) >= self.max_queue:
+                metrics.ADMISSION_REJECTIONS.labels("queue_full").inc()
+                raise AdmissionRejected("Too many requests waiting for the language model",
+                                        retry_after=self._retry_after(start))
+
+            self._waiters.append(ticket)
+            metrics.ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._expire_window(now)
+                    if self._waiters[0] is ticket and self._can_admit(tokens):
+                        return self._admit(tokens, start, now)
+                    if now >= deadline:
+                        metrics.ADMISSION_REJECTIONS.labels("deadline").inc()
+                        metrics.ADMISSION_WAIT.observe(now - start)
+                        raise AdmissionTimeout("Timed out waiting for the language model",
+                                               retry_after=self._retry_after(now))
+                    # Wake up for the deadline or when budget leaves the window, whichever is first
+                    wait = deadline - now
+                    if self._window:
+                        wait = min(wait, self._window[0][0] + self.WINDOW_SECONDS - now)
+                    self._cond.wait(max(wait, 0.001))
+            finally:
+                self._waiters.remove(ticket)
+                metrics.ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
+                # The next waiter may now be at the head of the queue
+                self._cond.notify_all()
+
+    def _can_admit(self, tokens: int) -> bool:
+        if self._in_flight >= self.max_concurrent:
+            return False
+        if not self.tokens_per_minute or not self._window:
+            # An empty window always admits, so calls larger than the budget still run
+            return True
+        return self._window_tokens + tokens <= self.tokens_per_minute
+
+    def _admit(self, tokens: int, start: float, now: float) -> list:
+        self._in_flight += 1
+        entry = [now, tokens]
+        self._window.append(entry)
+        self._window_tokens += tokens
+        metrics.ADMISSION_IN_FLIGHT.set(self._in_flight)
+        metrics.ADMISSION_WAIT.observe(now - start)
+        return entry
+
+    def _release(self, entry: list, actual_tokens: Optional[int]):
+        with self._cond:
+            self._in_flight -= 1
+            if actual_tokens is not None and any(item is entry for item in self._window):
+                self._window_tokens += actual_tokens - entry[1]
+                entry[1] = actual_tokens
+            metrics.ADMISSION_IN_FLIGHT.set(self._in_flight)
+            self._cond.notify_all()
+
+    def _expire_window(self, now: float):
+        while self._window and self._window[0][0] <= now - self.WINDOW_SECONDS:
+            _, tokens = self._window.popleft()
+            self._window_tokens -= tokens
+
+    def _retry_after(self, now: float) -> float:
+        """Seconds until capacity is likely to free up, for the Retry-After header"""
+        if self.tokens_per_minute and self._window and self._window_tokens >= self.tokens_per_minute:
+            return max(1.0, self._window[0][0] + self.WINDOW_SECONDS - now)
+        return 1.0
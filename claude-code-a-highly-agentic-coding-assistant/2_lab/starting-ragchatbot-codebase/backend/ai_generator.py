@@ -1,5 +1,7 @@
-import anthropic
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
+import json
+from admission import AdmissionController
+import metrics
 
 class AIGenerator:
     """Handles interactions with Anthropic's Claude API for generating responses"""
@@ -29,9 +31,11 @@ All responses must be:
 Provide only the direct answer to what was asked.
 """
     
-    def __init__(self, api_key: str, model: str):
-        self.client = anthropic.Anthropic(api_key=api_key)
+    def __init__(self, api_key: str, model: str, admission: Optional[AdmissionController] = None):
+        self.api_key = api_key
+        self._client = None
         self.model = model
+        self.admission = admission
         
         # Pre-build base API parameters
         self.base_params = {
@@ -40,6 +44,14 @@ Provide only the direct answer to what was asked.
             "max_tokens": 800
         }
     
+    @property
+    def client(self):
+        """Anthropic client, created (and the anthropic package imported) on first use"""
+        if self._client is None:
+            import anthropic
+            self._client = anthropic.Anthropic(api_key=self.api_key)
+        return self._client
+    
     def generate_response(self, query: str,
                          conversation_history: Optional[str] = None,
                          tools: Optional[List] = None,
@@ -57,6 +69,35 @@ Provide only the direct answer to what was asked.
             Generated response as string
         """
         
+        # Get response from Claude
+        response, api_params = self.start_response(query, conversation_history, tools)
+        
+        # Handle tool execution if needed
+        tool_calls = self.get_tool_calls(response) if tool_manager else []
+        metrics.TOOL_CALLS_PER_QUERY.observe(len(tool_calls))
+        if tool_calls:
+            return self._handle_tool_execution(response, api_params, tool_manager)
+        
+        # Return direct response
+        return response.content[0].text
+    
+    def start_response(self, query: str,
+                       conversation_history: Optional[str] = None,
+                       tools: Optional[List] = None) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Make the first API call for a query without executing any requested tools.
+        
+        Used directly by batch processing, which executes the tool calls of many
+        queries together before finishing each one with complete_with_tool_results.
+        
+        Args:
+            query: The user's question or request
+            conversation_history: Previous messages for context
+            tools: Available tools the AI can use
+            
+        Returns:
+            Tuple of (API response, parameters used for the call)
+        """
         # Build system content efficiently - avoid string ops when possible
         system_content = (
             f"{self.SYSTEM_PROMPT}\n\nPrevious conversation:\n{conversation_history}"
@@ -76,15 +117,16 @@ Provide only the direct answer to what was asked.
             api_params["tools"] = tools
             api_params["tool_choice"] = {"type": "auto"}
         
-        # Get response from Claude
-        response = self.client.messages.create(**api_params)
-        
-        # Handle tool execution if needed
-        if response.stop_reason == "tool_use" and tool_manager:
-            return self._handle_tool_execution(response, api_params, tool_manager)
-        
-        # Return direct response
-        return response.content[0].text
+        with metrics.ANTHROPIC_INITIAL.time():
+            response = self._create(api_params)
+        return response, api_params
+    
+    @staticmethod
+    def get_tool_calls(response) -> List[Any]:
+        """Return the tool use blocks of a response, or an empty list if no tool was requested"""
+        if response.stop_reason != "tool_use":
+            return []
+        return [block for block in response.content if block.type == "tool_use"]
     
     def _handle_tool_execution(self, initial_response, base_params: Dict[str, Any], tool_manager):
         """
@@ -95,6 +137,35 @@ Provide only the direct answer to what was asked.
             base_params: Base API parameters
             tool_manager: Manager to execute tools
             
+        Returns:
+            Final response text after tool execution
+        """
+        # Execute all tool calls and collect results
+        tool_results = []
+        for content_block in self.get_tool_calls(initial_response):
+            tool_result = tool_manager.execute_tool(
+                content_block.name, 
+                **content_block.input
+            )
+            
+            tool_results.append({
+                "type": "tool_result",
+                "tool_use_id": content_block.id,
+                "content": tool_result
+            })
+        
+        return self.complete_with_tool_results(initial_response, base_params, tool_results)
+    
+    def complete_with_tool_results(self, initial_response, base_params: Dict[str, Any],
+                                   tool_results: List[Dict[str, Any]]) -> str:
+        """
+        Send executed tool results back to Claude and get the final response.
+        
+        Args:
+            initial_response: The response containing tool use requests
+            base_params: Base API parameters
+            tool_results: tool_result content blocks for every tool use request
+            
         Returns:
             Final response text after tool execution
         """
@@ -104,21 +175,6 @@ Provide only the direct answer to what was asked.
         # Add AI's tool use response
         messages.append({"role": "assistant", "content": initial_response.content})
         
-        # Execute all tool calls and collect results
-        tool_results = []
-        for content_block in initial_response.content:
-            if content_block.type == "tool_use":
-                tool_result = tool_manager.execute_tool(
-                    content_block.name, 
-                    **content_block.input
-                )
-                
-                tool_results.append({
-                    "type": "tool_result",
-                    "tool_use_id": content_block.id,
-                    "content": tool_result
-                })
-        
         # Add tool results as single message
         if tool_results:
             messages.append({"role": "user", "content": tool_results})
@@ -131,5 +187,32 @@ Provide only the direct answer to what was asked.
         }
         
         # Get final response
-        final_response = self.client.messages.create(**final_params)
-        return final_response.content[0].text
\ No newline at end of file
+        with metrics.ANTHROPIC_FINAL.time():
+            final_response = self._create(final_params)
+        return final_response.content[0].text
+    
+    def _create(self, api_params: Dict[str, Any]):
+        """Call the Messages API, waiting for admission first if a controller is set"""
+        if self.admission is None:
+            response = self.client.messages.create(**api_params)
+        else:
+            with self.admission.admit(self.estimate_tokens(api_params)) as actual:
+                response = self.client.messages.create(**api_params)
+                usage = getattr(response, "usage", None)
+                if usage is not None:
+                    actual[0] = (usage.input_tokens or 0) + (usage.output_tokens or 0)
+        metrics.record_usage(response)
+        return response
+    
+    @staticmethod
+    def estimate_tokens(api_params: Dict[str, Any]) -> int:
+        """
+        Rough upper estimate of the tokens a call will use, for the admission budget.
+        
+        Counts about four characters per input token, plus max_tokens for the output.
+        """
+        text = json.dumps(
+            [api_params.get("system", ""), api_params["messages"], api_params.get("tools", [])],
+            default=str
+        )
+        return len(text) // 4 + api_params.get("max_tokens", 0)
\ No newline at end of file
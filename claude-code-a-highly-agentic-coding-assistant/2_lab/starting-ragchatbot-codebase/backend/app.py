@@ -1,16 +1,27 @@
 import warnings
 warnings.filterwarnings("ignore", message="resource_tracker: There appear to be.*")
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse, Response, FileResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional
+import anyio
+import hmac
+import json
 import os
+import time
 
 from config import config
 from rag_system import RAGSystem
+from ingestion import BackgroundIngestion
+from docs_watcher import DocsWatcher
+from admission import AdmissionError
+from profiler import ProfileStore, profile_request
+import metrics
 
 # Initialize FastAPI app
 app = FastAPI(title="Course Materials RAG System", root_path="")
@@ -33,6 +44,9 @@ app.add_middleware(
 
 # Initialize RAG system
 rag_system = RAGSystem(config)
+ingestion = BackgroundIngestion(rag_system)
+profiles = ProfileStore(config.PROFILE_DIR, config.PROFILE_MAX_STORED)
+docs_watcher: Optional[DocsWatcher] = None  # Started with the server when DOCS_WATCH is on
 
 # Pydantic models for request/response
 class QueryRequest(BaseModel):
@@ -45,34 +59,102 @@ class QueryResponse(BaseModel):
     answer: str
     sources: List[str]
     session_id: str
+    partial_index: bool = False  # True while startup ingestion is still building the index
+    profile_id: Optional[str] = None  # Set when the request was profiled; fetch it from /api/profiles/{profile_id}
+
+class BatchQueryRequest(BaseModel):
+    """Request model for batch course queries"""
+    queries: List[str]
+    max_concurrency: Optional[int] = None
 
 class CourseStats(BaseModel):
     """Response model for course statistics"""
     total_courses: int
     course_titles: List[str]
 
+def require_profile_token(header_token: Optional[str], query_token: Optional[str]) -> bool:
+    """
+    Check a caller's profiling token.
+    
+    Returns:
+        True if a valid token was sent, False if none was sent
+        
+    Raises:
+        HTTPException: 403 if a token was sent but profiling is off or the token is wrong
+    """
+    token = header_token or query_token
+    if not token:
+        return False
+    if not config.PROFILE_TOKEN or not hmac.compare_digest(token.encode(), config.PROFILE_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid profile token")
+    return True
+
+def profiled_query(query: str, session_id: str, received_at: float):
+    """Run a query under the sampling profiler and store the profile; returns (answer, sources, profile id)"""
+    with profile_request(query, config.PROFILE_INTERVAL_MS / 1000) as profile:
+        answer, sources = rag_system.query(query, session_id, received_at)
+    profiles.save(profile)
+    return answer, sources, profile.profile_id
+
 # API Endpoints
 
 @app.post("/api/query", response_model=QueryResponse)
-async def query_documents(request: QueryRequest):
-    """Process a query and return response with sources"""
+async def query_documents(request: QueryRequest, profile: Optional[str] = None,
+                          x_profile_token: Optional[str] = Header(None)):
+    """Process a query and return response with sources; trusted callers can have it profiled"""
+    received_at = time.monotonic()
+    profiled = require_profile_token(x_profile_token, profile)
     try:
-        # Create session if not provided
-        session_id = request.session_id
-        if not session_id:
-            session_id = rag_system.session_manager.create_session()
+        # Counted here on the event loop, not once a worker thread picks the query up,
+        # so a flood gets 429 at once instead of piling up behind the threadpool
+        with rag_system.admission.request():
+            # Create session if not provided
+            session_id = request.session_id
+            if not session_id:
+                session_id = rag_system.session_manager.create_session()
+            
+            # Process query using RAG system in the threadpool, so concurrent
+            # queries don't block the event loop or each other
+            profile_id = None
+            if profiled:
+                answer, sources, profile_id = await run_in_threadpool(
+                    profiled_query, request.query, session_id, received_at)
+            else:
+                answer, sources = await run_in_threadpool(rag_system.query, request.query, session_id, received_at)
         
-        # Process query using RAG system
-        answer, sources = rag_system.query(request.query, session_id)
-        
-        return QueryResponse(
-            answer=answer,
-            sources=sources,
-            session_id=session_id
+        with metrics.SERIALIZATION.time():
+            body = QueryResponse(
+                answer=answer,
+                sources=sources,
+                session_id=session_id,
+                partial_index=ingestion.is_partial,
+                profile_id=profile_id
+            ).model_dump_json()
+        return Response(content=body, media_type="application/json")
+    except AdmissionError as e:
+        # Overloaded: tell the client to back off instead of failing with a 500
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(int(e.retry_after + 0.999))}
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/query/batch")
+async def query_documents_batch(request: BatchQueryRequest):
+    """Process a list of queries and stream results as NDJSON, one line per completed answer"""
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="queries must not be empty")
+    if request.max_concurrency is not None and request.max_concurrency < 1:
+        raise HTTPException(status_code=400, detail="max_concurrency must be at least 1")
+    
+    def generate_lines():
+        for result in rag_system.query_batch(request.queries, request.max_concurrency):
+            yield json.dumps(result) + "\n"
+    
+    return StreamingResponse(generate_lines(), media_type="application/x-ndjson")
+
 @app.get("/api/courses", response_model=CourseStats)
 async def get_course_stats():
     """Get course analytics and statistics"""
@@ -85,23 +167,97 @@ async def get_course_stats():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/profiles/{profile_id}")
+async def get_profile(profile_id: str, profile: Optional[str] = None,
+                      x_profile_token: Optional[str] = Header(None)):
+    """Per-stage timing breakdown of a profiled query"""
+    if not require_profile_token(x_profile_token, profile):
+        raise HTTPException(status_code=403, detail="Profile token required")
+    summary = profiles.load_summary(profile_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    summary["speedscope_url"] = f"/api/profiles/{profile_id}/speedscope"
+    return summary
+
+@app.get("/api/profiles/{profile_id}/speedscope")
+async def get_profile_speedscope(profile_id: str, profile: Optional[str] = None,
+                                 x_profile_token: Optional[str] = Header(None)):
+    """Flame graph of a profiled query as a speedscope file (open it at https://www.speedscope.app)"""
+    if not require_profile_token(x_profile_token, profile):
+        raise HTTPException(status_code=403, detail="Profile token required")
+    if profiles.load_summary(profile_id) is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(profiles.speedscope_path(profile_id), media_type="application/json",
+                        filename=f"{profile_id}.speedscope.json")
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics: per-stage latency histograms, tool call and token counters"""
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness probe: the process is up and serving requests"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness probe: queries can be answered, possibly from a partially built index"""
+    progress = ingestion.progress
+    if not rag_system.warm.is_set():
+        # Fast-start mode: the embedding model is still loading
+        ready = False
+    elif progress.state in ("idle", "completed"):
+        ready = True
+    elif config.READY_REQUIRES_FULL_INDEX:
+        ready = False
+    else:
+        ready = rag_system.vector_store.get_course_count() > 0
+    
+    body = {
+        "status": "ready" if ready else "not_ready",
+        "model_loaded": rag_system.warm.is_set(),
+        "partial_index": ingestion.is_partial,
+        "ingestion": progress.to_dict()
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
+
 @app.on_event("startup")
 async def startup_event():
-    """Load initial documents on startup"""
+    """Start loading initial documents in the background so the server accepts traffic at once"""
+    global docs_watcher
+    # Every query admission control lets in may hold a worker thread while it waits,
+    # on top of the threads the rest of the app uses
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens += config.LLM_MAX_CONCURRENCY + config.LLM_QUEUE_SIZE
+    
+    if config.FAST_START:
+        rag_system.start_warm_up()
+    
     docs_path = "../docs"
-    if os.path.exists(docs_path):
-        print("Loading initial documents...")
-        try:
-            courses, chunks = rag_system.add_course_folder(docs_path, clear_existing=False)
-            print(f"Loaded {courses} courses with {chunks} chunks")
-        except Exception as e:
-            print(f"Error loading documents: {e}")
+    if config.INGEST_ON_STARTUP and os.path.exists(docs_path):
+        ingestion.start(docs_path, clear_existing=False, snapshot_path=config.SNAPSHOT_PATH)
+    
+    # Re-index courses as their documents change, once startup ingestion is done
+    if config.DOCS_WATCH and os.path.exists(docs_path):
+        docs_watcher = DocsWatcher(rag_system, docs_path, config.DOCS_WATCH_DEBOUNCE, config.DOCS_WATCH_POLL_INTERVAL)
+        docs_watcher.start(wait_for=ingestion.wait)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the docs watcher, so no re-index starts while the server exits"""
+    if docs_watcher is not None:
+        # Off the event loop: the watcher may be mid-sync or still waiting for startup ingestion
+        stopped = await run_in_threadpool(docs_watcher.stop, config.DOCS_WATCH_STOP_TIMEOUT)
+        if not stopped:
+            print(f"Docs watcher still busy after {config.DOCS_WATCH_STOP_TIMEOUT}s; exiting without it")
 
 # Custom static file handler with no-cache headers for development
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 import os
 from pathlib import Path
+from static_assets import ProductionStaticFiles
 
 
 class DevStaticFiles(StaticFiles):
@@ -116,4 +272,7 @@ class DevStaticFiles(StaticFiles):
     
     
 # Serve static files for the frontend
-app.mount("/", StaticFiles(directory="../frontend", html=True), name="static")
\ No newline at end of file
+if config.STATIC_MODE == "dev":
+    app.mount("/", DevStaticFiles(directory="../frontend", html=True), name="static")
+else:
+    app.mount("/", ProductionStaticFiles(directory="../frontend", html=True), name="static")
\ No newline at end of file
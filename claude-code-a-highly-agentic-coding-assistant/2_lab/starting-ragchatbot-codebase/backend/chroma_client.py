@@ -0,0 +1,33 @@
+try:
+    from chromadb.api.shared_system_client import SharedSystemClient
+except ImportError:  # Moved or removed in another Chroma release
+    SharedSystemClient = None
+
+def release_client(chroma_path: str) -> bool:
+    """
+    Stop and forget Chroma's cached system for an index directory.
+
+    Chroma keeps one system per path for the life of the process, in a private
+    class attribute, so a new client for the same path would reuse its open
+    files and loaded index. Releasing it lets the directory be deleted, and the
+    next client reload the index from disk.
+
+    Args:
+        chroma_path: Directory the client was opened on
+
+    Returns:
+        True if a cached system was released; False if there was none, or this
+        Chroma version no longer caches systems where expected (clients are then
+        left as they are)
+    """
+    cache = getattr(SharedSystemClient, "_identifier_to_system", None)
+    if not isinstance(cache, dict):
+        return False
+    system = cache.pop(chroma_path, None)
+    if system is None:
+        return False
+    try:
+        system.stop()
+    except Exception as e:
+        print(f"Error stopping the Chroma client for {chroma_path}: {e}")
+    return True
@@ -14,15 +14,69 @@ class Config:
     
     # Embedding model settings
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
+    EMBEDDING_BATCH_WINDOW_MS: float = 0.0  # Wait this long for concurrent searches to share a model call (0 = off; see README)
+    EMBEDDING_MAX_BATCH: int = 64           # Most query texts per batched model call
+    EMBEDDING_WORKERS: int = 0              # Embed in this many worker processes instead of the API process (0 = in-process)
+    EMBEDDING_DIMENSIONS: int = 0           # Store chunk vectors reduced to this many dimensions, fitted on the corpus (0 = full width)
+    EMBEDDING_REDUCTION: str = "pca"        # "pca", or "truncate" for Matryoshka-trained models
+    EMBEDDING_RESCORE_FACTOR: int = 4       # Re-rank MAX_RESULTS x this many reduced-vector candidates at full width
     
     # Document processing settings
     CHUNK_SIZE: int = 800       # Size of text chunks for vector storage
     CHUNK_OVERLAP: int = 100     # Characters to overlap between chunks
+    NEAR_DUPLICATE_THRESHOLD: float = 0.0  # Store a course's chunks this similar (MinHash Jaccard) once (0 = off)
     MAX_RESULTS: int = 5         # Maximum search results to return
+    HIERARCHICAL_TOP_LESSONS: int = 0  # Search chunks only in the N lessons closest to the query (0 = all chunks)
     MAX_HISTORY: int = 2         # Number of conversation messages to remember
     
+    # Context compression: send Claude only the query-relevant sentences of search results
+    CONTEXT_TOKEN_BUDGET: int = 0    # Estimated tokens of chunk text per search (0 = send whole chunks)
+    INDEX_SENTENCES: bool = True     # Embed each chunk's sentences at ingest when compression is on
+    
+    # Batch query settings
+    BATCH_MAX_CONCURRENCY: int = 8   # Maximum concurrent Anthropic calls per batch (requests can only lower it)
+    BATCH_WINDOW_SIZE: int = 64      # Questions whose searches are embedded and run together
+    
+    # Admission control for Anthropic calls (per process)
+    LLM_MAX_CONCURRENCY: int = 16       # Maximum Anthropic calls in flight
+    LLM_TOKENS_PER_MINUTE: int = 0      # Estimated token budget per minute (0 = unlimited)
+    LLM_QUEUE_SIZE: int = 64            # Calls allowed to wait; beyond this requests get 429
+    LLM_QUEUE_TIMEOUT: float = 30.0     # Seconds a request may spend waiting for admission
+    
+    # Session storage settings
+    SESSION_BACKEND: str = "memory"        # "memory" (per process) or "sqlite" (shared by workers)
+    SESSION_MAX_SESSIONS: int = 10000      # LRU bound for the in-memory store
+    SESSION_TTL_SECONDS: int = 3600        # Idle time before a session expires
+    
+    # Startup settings
+    FAST_START: bool = False         # Load the embedding model in the background after the server starts
+    INGEST_ON_STARTUP: bool = True   # Load ../docs when the app starts (serve.py ingests once before forking instead)
+    READY_REQUIRES_FULL_INDEX: bool = False  # /readyz waits for startup ingestion instead of the first indexed course
+    SNAPSHOT_PATH: str = ""          # Index snapshot to load at startup when the index is empty (see snapshot.py)
+    
+    # Docs folder watcher: re-index a course within seconds of its document changing
+    DOCS_WATCH: bool = False                # Watch ../docs while the server runs (inotify, or polling elsewhere)
+    DOCS_WATCH_DEBOUNCE: float = 1.0        # Seconds a file must be quiet after its last change before it is indexed
+    DOCS_WATCH_POLL_INTERVAL: float = 2.0   # Seconds between folder scans when inotify is unavailable
+    DOCS_WATCH_STOP_TIMEOUT: float = 10.0   # Seconds shutdown waits for the watcher to finish a sync in progress
+    
+    # Per-request profiling of /api/query (see profiler.py)
+    PROFILE_TOKEN: str = os.getenv("PROFILE_TOKEN", "")  # Requests sending it as X-Profile-Token or ?profile= are profiled (empty = off)
+    PROFILE_DIR: str = "./profiles"       # Where profiles are stored
+    PROFILE_INTERVAL_MS: float = 1.0      # Milliseconds between stack samples
+    PROFILE_MAX_STORED: int = 100         # Oldest profiles are deleted beyond this many
+    
+    # Frontend serving: "dev" (no-cache, edits show up at once) or "production" (precompressed, fingerprinted, cached)
+    STATIC_MODE: str = os.getenv("STATIC_MODE", "dev")
+    
     # Database paths
     CHROMA_PATH: str = "./chroma_db"  # ChromaDB storage location
+    INDEX_GENERATIONS: bool = False   # Write to a copy of the index and publish it atomically, so queries never wait for ingestion
+    INDEX_SHARDS: int = 0             # Partition courses over this many shard processes, searched in parallel (0 = one in-process index)
+    SHARD_TIMEOUT_MS: float = 500.0   # Searches merge the results of the shards that answered within this time
+    HNSW_PARAMS_PATH: str = "./hnsw_params.json"  # course_content HNSW settings chosen by hnsw_tuning.py (missing = Chroma defaults)
+    HNSW_RECALL_TARGET: float = 0.95  # Lowest recall@MAX_RESULTS, against exact search, hnsw_tuning.py may choose
+    SESSION_DB_PATH: str = "./sessions.db"  # SQLite session store location
 
 config = Config()
 
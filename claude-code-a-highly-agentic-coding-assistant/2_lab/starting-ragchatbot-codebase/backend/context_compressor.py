@@ -0,0 +1,178 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from document_processor import split_sentences
+from vector_store import VectorStore, SearchResults
+import metrics
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token), as AIGenerator.estimate_tokens uses"""
+    return (len(text) + 3) // 4
+
+@dataclass
+class Compression:
+    """Outcome of compressing one set of search results"""
+    results: SearchResults
+    original_tokens: int
+    compressed_tokens: int
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.original_tokens - self.compressed_tokens
+
+class ContextCompressor:
+    """
+    Extractive compression of search results before they are sent to Claude.
+
+    Every sentence of the retrieved chunks is scored by cosine similarity to the
+    search query's embedding, and the best sentences are kept until the token
+    budget is used up: first the best sentence of each chunk in result order, then
+    the remaining sentences by score. Kept sentences stay in their original order,
+    with "..." marking dropped text; chunks left with no sentence are dropped.
+
+    Sentence embeddings come from the chunk_sentences collection written at
+    ingest. Chunks indexed without them (older indexes, snapshots) are split and
+    embedded on first use and kept in a bounded in-memory cache.
+    """
+
+    GAP = "..."
+
+    def __init__(self, vector_store: VectorStore, token_budget: int, cache_size: int = 4096):
+        """
+        Args:
+            vector_store: Store the search results came from
+            token_budget: Estimated tokens of chunk text to keep per set of search results
+            cache_size: Chunks whose on-the-fly sentence embeddings are kept in memory
+        """
+        self.store = vector_store
+        self.token_budget = token_budget
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[Optional[str], int], Tuple[List[str], np.ndarray]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def compress(self, query: str, results: SearchResults) -> Compression:
+        """
+        Keep the query-relevant sentences of search results within the token budget.
+
+        Args:
+            query: The search query the results were retrieved for
+            results: Search results to compress
+
+        Returns:
+            Compression with the reduced results and token counts before and after
+        """
+        original_tokens = sum(estimate_tokens(document) for document in results.documents)
+        if results.error or original_tokens <= self.token_budget:
+            return Compression(results, original_tokens, original_tokens)
+
+        with metrics.CONTEXT_COMPRESSION.time():
+            compressed = self._compress(query, results)
+        compressed_tokens = sum(estimate_tokens(document) for document in compressed.documents)
+        metrics.CONTEXT_TOKENS_ORIGINAL.inc(original_tokens)
+        metrics.CONTEXT_TOKENS_SENT.inc(compressed_tokens)
+        return Compression(compressed, original_tokens, compressed_tokens)
+
+    def _compress(self, query: str, results: SearchResults) -> SearchResults:
+        sentences = self._sentences(results)
+        query_embedding = results.query_embedding
+        if query_embedding is None:
+            query_embedding = self.store.embed_queries([query])[0]
+        query_vector = _normalize(np.asarray(query_embedding, dtype=np.float32).reshape(1, -1))[0]
+
+        # (score, chunk position, sentence position) for every sentence
+        candidates = []
+        best_per_chunk = []
+        for chunk, (texts, embeddings) in enumerate(sentences):
+            if not texts:
+                continue
+            scores = _normalize(embeddings) @ query_vector
+            candidates.extend((float(score), chunk, position) for position, score in enumerate(scores))
+            best = int(np.argmax(scores))
+            best_per_chunk.append((float(scores[best]), chunk, best))
+
+        # The best sentence of each chunk first (in result order), then everything else by score
+        kept: Dict[int, set] = {}
+        remaining = self.token_budget
+        ordered = best_per_chunk + sorted(candidates, reverse=True)
+        for _, chunk, position in ordered:
+            if position in kept.get(chunk, ()):
+                continue
+            cost = estimate_tokens(sentences[chunk][0][position]) + 1
+            if cost > remaining:
+                continue
+            kept.setdefault(chunk, set()).add(position)
+            remaining -= cost
+
+        documents, metadata, distances, ids = [], [], [], []
+        for chunk in sorted(kept):
+            texts = sentences[chunk][0]
+            documents.append(self._join(texts, sorted(kept[chunk])))
+            metadata.append(results.metadata[chunk])
+            distances.append(results.distances[chunk] if chunk < len(results.distances) else None)
+            ids.append(results.ids[chunk] if chunk < len(results.ids) else None)
+        return SearchResults(documents, metadata, distances, ids=ids, query_embedding=results.query_embedding)
+
+    def _join(self, texts: List[str], positions: List[int]) -> str:
+        """The kept sentences in order, with GAP wherever sentences were dropped"""
+        parts = []
+        previous = -1
+        for position in positions:
+            if position != previous + 1:
+                parts.append(self.GAP)
+            parts.append(texts[position])
+            previous = position
+        if previous != len(texts) - 1:
+            parts.append(self.GAP)
+        return " ".join(parts)
+
+    def _sentences(self, results: SearchResults) -> List[Tuple[List[str], np.ndarray]]:
+        """Sentences and sentence embeddings of each result chunk: from ingest, this cache, or embedded now"""
+        ids = results.ids if len(results.ids) == len(results.documents) else [None] * len(results.documents)
+        cached = self.store.get_sentence_embeddings([chunk_id for chunk_id in ids if chunk_id])
+
+        sentences: List[Optional[Tuple[List[str], np.ndarray]]] = []
+        missing = []
+        keys = [(chunk_id, hash(document)) for chunk_id, document in zip(ids, results.documents)]
+        for position, chunk_id in enumerate(ids):
+            entry = cached.get(chunk_id) or self._cache_get(keys[position])
+            if entry is None:
+                missing.append(position)
+            sentences.append(entry)
+        metrics.SENTENCE_CACHE_HITS.inc(len(results.documents) - len(missing))
+        metrics.SENTENCE_CACHE_MISSES.inc(len(missing))
+
+        if missing:
+            texts = [split_sentences(results.documents[position]) for position in missing]
+            flat = [text for chunk_texts in texts for text in chunk_texts]
+            embeddings = np.asarray(self.store.embed_documents(flat), dtype=np.float32) if flat else None
+            start = 0
+            for position, chunk_texts in zip(missing, texts):
+                end = start + len(chunk_texts)
+                entry = (chunk_texts, embeddings[start:end] if embeddings is not None else np.zeros((0, 0), np.float32))
+                sentences[position] = entry
+                self._cache_put(keys[position], entry)
+                start = end
+        return sentences
+
+    def _cache_get(self, key: Tuple[Optional[str], int]):
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+            return entry
+
+    def _cache_put(self, key: Tuple[Optional[str], int], entry):
+        # Keyed by chunk id and text: a re-ingested course may reuse version 0 ids with new text
+        if self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
@@ -0,0 +1,219 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional, Set, Tuple
+import metrics
+
+# inotify event bits (linux/inotify.h)
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+class InotifyEvents:
+    """Names of files changed in one directory, from Linux inotify"""
+
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    def __init__(self, folder_path: str):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder_path), self.MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {folder_path}")
+
+    def wait(self, timeout: float) -> Set[str]:
+        """Names of files changed within timeout seconds (empty if none)"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        names = set()
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+            start = offset + EVENT_HEADER.size
+            name = data[start:start + length].rstrip(b"\0")
+            if name:
+                names.add(os.fsdecode(name))
+            offset = start + length
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingEvents:
+    """Names of files changed in one directory, by comparing size and mtime every poll interval"""
+
+    def __init__(self, folder_path: str, poll_interval: float):
+        self.folder_path = folder_path
+        self.poll_interval = poll_interval
+        self._snapshot = self._scan()
+        self._next_scan = time.monotonic() + poll_interval
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        try:
+            with os.scandir(self.folder_path) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        snapshot[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            pass
+        return snapshot
+
+    def wait(self, timeout: float) -> Set[str]:
+        remaining = self._next_scan - time.monotonic()
+        if remaining > 0:
+            time.sleep(min(timeout, remaining))
+            if time.monotonic() < self._next_scan:
+                return set()
+        self._next_scan = time.monotonic() + self.poll_interval
+        previous, self._snapshot = self._snapshot, self._scan()
+        return {name for name in previous.keys() | self._snapshot.keys()
+                if previous.get(name) != self._snapshot.get(name)}
+
+    def close(self):
+        pass
+
+class DocsWatcher:
+    """
+    Keeps the index in line with the docs folder while the server runs.
+
+    File events are debounced per file: a file is synced once it has had no
+    events for debounce_seconds, so an editor's save (often several writes and a
+    rename) triggers one re-index. Each sync goes through
+    RAGSystem.sync_course_file, which skips files whose content hash is already
+    indexed and re-embeds only the chunks of the affected course that changed.
+    When started, the watcher first syncs the whole folder, picking up edits and
+    deletions made while the server was down.
+    """
+
+    # Longest a wait blocks, so stop() is noticed promptly
+    MAX_WAIT = 0.5
+
+    def __init__(self, rag_system, folder_path: str, debounce_seconds: float = 1.0, poll_interval: float = 2.0):
+        """
+        Args:
+            rag_system: RAGSystem whose index is kept current
+            folder_path: Folder of course documents to watch
+            debounce_seconds: Quiet time after a file's last event before it is synced
+            poll_interval: Seconds between folder scans when inotify is unavailable
+        """
+        self.rag_system = rag_system
+        self.folder_path = folder_path
+        self.debounce_seconds = debounce_seconds
+        self.poll_interval = poll_interval
+        # File name -> (monotonic time of its first and of its latest unsynced event)
+        self._pending: Dict[str, Tuple[float, float]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, wait_for: Optional[Callable[[], None]] = None) -> threading.Thread:
+        """
+        Watch the folder in a background thread.
+
+        Args:
+            wait_for: Called before the initial sync, e.g. BackgroundIngestion.wait so
+                startup ingestion finishes first; events meanwhile are still recorded
+        """
+        events = self._open_events()
+        self._thread = threading.Thread(target=self._run, args=(events, wait_for), name="docs-watcher", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: Optional[float] = None) -> bool:
+        """
+        Stop watching and wait for the background thread to exit.
+
+        Args:
+            timeout: Longest to wait, in seconds (None = until it exits); the thread
+                finishes the sync in progress, or keeps waiting for wait_for, first
+
+        Returns:
+            True if the thread has exited
+        """
+        self._stop.set()
+        if self._thread is None:
+            return True
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def _open_events(self):
+        if sys.platform.startswith("linux"):
+            try:
+                return InotifyEvents(self.folder_path)
+            except (OSError, AttributeError) as e:
+                print(f"inotify unavailable ({e}), polling {self.folder_path} instead")
+        return PollingEvents(self.folder_path, self.poll_interval)
+
+    def _run(self, events, wait_for: Optional[Callable[[], None]]):
+        try:
+            if wait_for is not None:
+                wait_for()
+            if not self._stop.is_set():
+                self.sync_all()
+            while not self._stop.is_set():
+                for name in events.wait(self._next_timeout()):
+                    if self.rag_system.is_course_file(name):
+                        now = time.monotonic()
+                        first, _ = self._pending.get(name, (now, now))
+                        self._pending[name] = (first, now)
+                metrics.DOCS_PENDING_FILES.set(len(self._pending))
+                self._sync_due()
+        finally:
+            events.close()
+
+    def _next_timeout(self) -> float:
+        """Wait until the next pending file is due, at most MAX_WAIT"""
+        if not self._pending:
+            return self.MAX_WAIT
+        due = min(last for _, last in self._pending.values()) + self.debounce_seconds
+        return max(0.0, min(self.MAX_WAIT, due - time.monotonic()))
+
+    def _sync_due(self):
+        now = time.monotonic()
+        due = [name for name, (_, last) in self._pending.items() if now - last >= self.debounce_seconds]
+        for name in sorted(due):
+            first, _ = self._pending.pop(name)
+            if self._sync(name):
+                metrics.DOCS_INDEX_LAG.observe(time.monotonic() - first)
+        metrics.DOCS_PENDING_FILES.set(len(self._pending))
+
+    def sync_all(self):
+        """Sync every course document in the folder and every indexed course whose document is gone"""
+        names = {name for name in os.listdir(self.folder_path) if self.rag_system.is_course_file(name)}
+        names |= {source["source_file"] for source in self.rag_system.vector_store.get_course_sources().values()}
+        for name in sorted(names):
+            if self._stop.is_set():
+                return
+            self._sync(name)
+
+    def _sync(self, name: str) -> bool:
+        """Sync one file; returns True if the index changed"""
+        try:
+            action = self.rag_system.sync_course_file(os.path.join(self.folder_path, name))
+        except Exception as e:
+            print(f"Error syncing {name}: {e}")
+            return False
+        if action:
+            print(f"Docs watcher: {action} {name}")
+        return action is not None
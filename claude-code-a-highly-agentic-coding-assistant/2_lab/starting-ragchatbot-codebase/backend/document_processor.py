@@ -1,7 +1,25 @@
+import hashlib
 import os
 import re
 from typing import List, Tuple
-from models import Course, Lesson, CourseChunk
+from models import Course, Lesson, ChunkBatch
+
+# Better sentence splitting that handles abbreviations
+# This regex looks for periods followed by whitespace and capital letters
+# but ignores common abbreviations
+SENTENCE_ENDINGS = re.compile(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\!|\?)\s+(?=[A-Z])')
+
+def split_sentences(text: str) -> List[str]:
+    """Split whitespace-normalized text into non-empty sentences"""
+    return [s.strip() for s in SENTENCE_ENDINGS.split(text) if s.strip()]
+
+def file_hash(file_path: str) -> str:
+    """SHA-256 of a file's bytes, to tell whether a course document changed since it was indexed"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
 
 class DocumentProcessor:
     """Processes course documents and extracts structured information"""
@@ -28,14 +46,8 @@ class DocumentProcessor:
         # Clean up the text
         text = re.sub(r'\s+', ' ', text.strip())  # Normalize whitespace
         
-        # Better sentence splitting that handles abbreviations
-        # This regex looks for periods followed by whitespace and capital letters
-        # but ignores common abbreviations
-        sentence_endings = re.compile(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\!|\?)\s+(?=[A-Z])')
-        sentences = sentence_endings.split(text)
-        
-        # Clean sentences
-        sentences = [s.strip() for s in sentences if s.strip()]
+        # Split into clean sentences
+        sentences = split_sentences(text)
         
         chunks = []
         i = 0
@@ -94,13 +106,15 @@ class DocumentProcessor:
 
 
     
-    def process_course_document(self, file_path: str) -> Tuple[Course, List[CourseChunk]]:
+    def process_course_document(self, file_path: str) -> Tuple[Course, ChunkBatch]:
         """
         Process a course document with expected format:
         Line 1: Course Title: [title]
         Line 2: Course Link: [url]
         Line 3: Course Instructor: [instructor]
         Following lines: Lesson markers and content
+        
+        Chunks are returned as one columnar ChunkBatch rather than an object per chunk.
         """
         content = self.read_file(file_path)
         filename = os.path.basename(file_path)
@@ -146,7 +160,7 @@ class DocumentProcessor:
         )
         
         # Process lessons and create chunks
-        course_chunks = []
+        course_chunks = ChunkBatch()
         current_lesson = None
         lesson_title = None
         lesson_link = None
@@ -187,13 +201,7 @@ class DocumentProcessor:
                             else:
                                 chunk_with_context = chunk
                             
-                            course_chunk = CourseChunk(
-                                content=chunk_with_context,
-                                course_title=course.title,
-                                lesson_number=current_lesson,
-                                chunk_index=chunk_counter
-                            )
-                            course_chunks.append(course_chunk)
+                            course_chunks.append(chunk_with_context, course.title, current_lesson, chunk_counter)
                             chunk_counter += 1
                 
                 # Start new lesson
@@ -233,13 +241,7 @@ class DocumentProcessor:
                   
                     chunk_with_context = f"Course {course_title} Lesson {current_lesson} content: {chunk}"
                     
-                    course_chunk = CourseChunk(
-                        content=chunk_with_context,
-                        course_title=course.title,
-                        lesson_number=current_lesson,
-                        chunk_index=chunk_counter
-                    )
-                    course_chunks.append(course_chunk)
+                    course_chunks.append(chunk_with_context, course.title, current_lesson, chunk_counter)
                     chunk_counter += 1
         
         # If no lessons found, treat entire content as one document
@@ -248,12 +250,7 @@ class DocumentProcessor:
             if remaining_content:
                 chunks = self.chunk_text(remaining_content)
                 for chunk in chunks:
-                    course_chunk = CourseChunk(
-                        content=chunk,
-                        course_title=course.title,
-                        chunk_index=chunk_counter
-                    )
-                    course_chunks.append(course_chunk)
+                    course_chunks.append(chunk, course.title, None, chunk_counter)
                     chunk_counter += 1
         
         return course, course_chunks
@@ -0,0 +1,100 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+import metrics
+
+@dataclass
+class _Request:
+    texts: List[str]
+    future: Future = field(default_factory=Future)
+
+class EmbeddingBatcher:
+    """
+    Coalesces embedding calls from concurrent callers into batched forward passes.
+
+    The first request to arrive opens a window of max_wait_ms; every request that
+    arrives within it (up to max_batch_size texts) is embedded in the same model
+    call, and each caller gets back the vectors for its own texts. Under light load
+    a request waits at most max_wait_ms; under heavy load batches fill up at once.
+    """
+
+    def __init__(self, embed: Callable[[List[str]], list], max_batch_size: int = 64,
+                 max_wait_ms: float = 2.0):
+        """
+        Args:
+            embed: Function embedding a list of texts, e.g. the collection's embedding function
+            max_batch_size: Most texts embedded in one call
+            max_wait_ms: How long the first request of a batch waits for others to join
+        """
+        self.embed_function = embed
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[queue.SimpleQueue] = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Started lazily and per process, so a batcher created before fork() works in the children
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._queue = queue.SimpleQueue()
+                threading.Thread(target=self._run, args=(self._queue,),
+                                 name="embedding-batcher", daemon=True).start()
+                self._pid = os.getpid()
+
+    def embed(self, texts: List[str]) -> list:
+        """
+        Embed texts as part of the next batch, blocking until its vectors are ready.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            One embedding per text, in order
+        """
+        if not texts:
+            return []
+        self._ensure_started()
+        request = _Request(list(texts))
+        self._queue.put(request)
+        return request.future.result()
+
+    def __call__(self, texts: List[str]) -> list:
+        return self.embed(texts)
+
+    def _run(self, requests: queue.SimpleQueue):
+        while True:
+            batch = [requests.get()]
+            size = len(batch[0].texts)
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                try:
+                    # Take whatever is already queued, then wait out the rest of the window
+                    remaining = deadline - time.monotonic()
+                    request = requests.get(timeout=remaining) if remaining > 0 else requests.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request.texts)
+            self._process(batch, size)
+
+    def _process(self, batch: List[_Request], size: int):
+        metrics.EMBEDDING_BATCH_SIZE.observe(size)
+        try:
+            vectors = self.embed_function([text for request in batch for text in request.texts])
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        start = 0
+        for request in batch:
+            end = start + len(request.texts)
+            request.future.set_result(vectors[start:end])
+            start = end
@@ -0,0 +1,240 @@
+import itertools
+import math
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import numpy as np
+import metrics
+
+class EmbeddingWorkerError(Exception):
+    """An embedding job failed in a worker process, or its worker crashed twice"""
+
+def _worker_main(model_name: str, device: str, threads: int, conn):
+    """Body of an embedding worker process: load the model once, then embed jobs from the pipe"""
+    # Ctrl+C goes to the whole process group; let the parent decide when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    load_error = None
+    try:
+        from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+        embedding_function = SentenceTransformerEmbeddingFunction(model_name=model_name, device=device)
+        try:
+            import torch
+            torch.set_num_threads(threads)
+        except ImportError:
+            pass
+    except Exception as e:
+        # Report the failure on every job instead of crashing into a restart loop
+        load_error = f"Embedding worker could not load {model_name}: {e}"
+
+    while True:
+        try:
+            job_id, texts = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            if load_error:
+                raise RuntimeError(load_error)
+            vectors = np.asarray(embedding_function(texts), dtype=np.float32)
+            conn.send((job_id, None, vectors.shape, vectors.tobytes()))
+        except Exception as e:
+            conn.send((job_id, str(e), None, None))
+
+@dataclass
+class _Job:
+    id: int
+    texts: List[str]
+    future: Future = field(default_factory=Future)
+    attempts: int = 0
+
+@dataclass
+class _Worker:
+    index: int
+    process: Optional[multiprocessing.Process] = None
+    conn: Optional[object] = None
+    started_at: float = 0.0
+    pending: Dict[int, _Job] = field(default_factory=dict)
+    send_lock: threading.Lock = field(default_factory=threading.Lock)
+
+    @property
+    def queued_texts(self) -> int:
+        return sum(len(job.texts) for job in self.pending.values())
+
+class EmbeddingPool:
+    """
+    Embeds texts in separate worker processes, keeping transformer work off the API process.
+
+    Each worker loads the model once and receives jobs over its own pipe. Jobs go
+    to the worker with the fewest texts queued; large inputs (ingestion) are split
+    into chunks so all workers embed them in parallel. A worker that dies is
+    restarted and its unfinished jobs are retried once on the pool.
+    """
+
+    MAX_ATTEMPTS = 2
+
+    def __init__(self, model_name: str, workers: int, device: str = "cpu", max_chunk: int = 256):
+        """
+        Args:
+            model_name: SentenceTransformer model each worker loads
+            workers: Number of worker processes
+            device: Torch device for the workers
+            max_chunk: Most texts sent to a worker in one job
+        """
+        self.model_name = model_name
+        self.device = device
+        self.max_chunk = max_chunk
+        # Split the cores between workers so their torch thread pools don't oversubscribe
+        self.threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+
+        # Spawn rather than fork: the parent may already hold torch threads or a Chroma client
+        self._context = multiprocessing.get_context("spawn")
+        self._job_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._workers = [_Worker(index) for index in range(workers)]
+        for worker in self._workers:
+            self._start(worker)
+
+    def _start(self, worker: _Worker):
+        """Spawn a worker's process, outside the pool lock, and then make it routable"""
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(self.model_name, self.device, self.threads_per_worker, child_conn),
+            name=f"embedding-worker-{worker.index}",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                worker.process, worker.conn, worker.started_at = process, parent_conn, time.monotonic()
+        if closed:
+            # The pool was closed while the process started
+            parent_conn.close()
+            process.terminate()
+            process.join(timeout=5)
+            return
+        threading.Thread(
+            target=self._read_results,
+            args=(worker, parent_conn),
+            name=f"embedding-worker-{worker.index}-results",
+            daemon=True
+        ).start()
+
+    def _read_results(self, worker: _Worker, conn):
+        while True:
+            try:
+                job_id, error, shape, data = conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                job = worker.pending.pop(job_id, None)
+            if job is None:
+                continue
+            if error:
+                job.future.set_exception(EmbeddingWorkerError(error))
+            else:
+                job.future.set_result(np.frombuffer(data, dtype=np.float32).reshape(shape))
+        self._handle_exit(worker, conn)
+
+    def _handle_exit(self, worker: _Worker, conn):
+        """Restart a dead worker and retry its unfinished jobs"""
+        with self._lock:
+            orphaned = list(worker.pending.values())
+            worker.pending = {}
+            worker.conn = None  # Not routable until restarted
+            closed = self._closed
+
+        if not closed:
+            worker.process.join(timeout=5)
+            exit_code = worker.process.exitcode
+            print(f"Embedding worker {worker.index} exited (code {exit_code}), restarting")
+            metrics.EMBEDDING_WORKER_RESTARTS.inc()
+            # Back off if the worker keeps dying right after starting
+            if time.monotonic() - worker.started_at < 5:
+                time.sleep(1)
+            self._start(worker)
+
+        for job in orphaned:
+            if job.attempts >= self.MAX_ATTEMPTS:
+                job.future.set_exception(EmbeddingWorkerError(
+                    f"Embedding worker crashed while embedding {len(job.texts)} texts"
+                ))
+            else:
+                self._dispatch(job)
+
+    def _dispatch(self, job: _Job):
+        while True:
+            with self._lock:
+                if self._closed:
+                    job.future.set_exception(EmbeddingWorkerError("Embedding pool is closed"))
+                    return
+                available = [worker for worker in self._workers if worker.conn is not None]
+                if available:
+                    # Route by queue length: the worker with the fewest texts waiting
+                    worker = min(available, key=lambda w: w.queued_texts)
+                    worker.pending[job.id] = job
+                    job.attempts += 1
+                    conn = worker.conn
+                    break
+            # Every worker is restarting
+            time.sleep(0.05)
+        try:
+            with worker.send_lock:
+                conn.send((job.id, job.texts))
+        except (OSError, EOFError):
+            # The worker is gone; its results thread re-dispatches the job
+            pass
+
+    def embed(self, texts: List[str]) -> list:
+        """
+        Embed texts in the worker processes, blocking until all vectors are back.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            One float32 vector per text, in order
+        """
+        if not texts:
+            return []
+        texts = list(texts)
+        # Small inputs go to one worker; large ones are spread over all of them
+        chunk = min(self.max_chunk, max(1, math.ceil(len(texts) / len(self._workers))))
+        jobs = [_Job(next(self._job_ids), texts[start:start + chunk]) for start in range(0, len(texts), chunk)]
+        for job in jobs:
+            self._dispatch(job)
+        return [vector for job in jobs for vector in job.future.result()]
+
+    def __call__(self, texts: List[str]) -> list:
+        return self.embed(texts)
+
+    def warm_up(self):
+        """Wait until every worker has loaded the model and embedded a text"""
+        jobs = [_Job(next(self._job_ids), ["warm-up query"]) for _ in self._workers]
+        for job in jobs:
+            self._dispatch(job)
+        for job in jobs:
+            job.future.result()
+
+    def close(self):
+        """Stop all workers; pending jobs fail"""
+        with self._lock:
+            self._closed = True
+            workers = list(self._workers)
+        for worker in workers:
+            if worker.conn is not None:
+                try:
+                    worker.conn.close()
+                except OSError:
+                    pass
+            worker.process.terminate()
+        for worker in workers:
+            worker.process.join(timeout=5)
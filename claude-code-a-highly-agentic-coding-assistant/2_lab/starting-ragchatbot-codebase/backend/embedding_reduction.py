@@ -0,0 +1,102 @@
+import base64
+import os
+from typing import List, Sequence
+import numpy as np
+
+# Metadata key holding a chunk's full-width embedding when course_content stores reduced vectors
+FULL_EMBEDDING_KEY = "full_embedding"
+
+class EmbeddingReducer:
+    """
+    Linear map from full-width embeddings to fewer dimensions: (x - mean) @ components.T.
+
+    PCA keeps the directions of largest variance in the corpus, so distances
+    between reduced vectors approximate the full-width ones. Truncation keeps the
+    first dimensions as they are, which suits models trained for it (Matryoshka
+    embeddings) but loses far more with others such as all-MiniLM-L6-v2.
+    """
+
+    FILE_NAME = "embedding_reduction.npz"
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray, method: str):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.asarray(components, dtype=np.float32)  # dimensions x full width
+        self.method = method
+
+    @property
+    def dimensions(self) -> int:
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, dimensions: int, method: str = "pca",
+            max_samples: int = 50000, seed: int = 0) -> 'EmbeddingReducer':
+        """
+        Fit a reducer on full-width vectors.
+
+        Args:
+            vectors: Corpus embeddings, one per row
+            dimensions: Dimensions to keep
+            method: "pca" or "truncate"
+            max_samples: Rows PCA is fitted on at most (a random sample beyond that)
+
+        Returns:
+            The fitted reducer
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        width = vectors.shape[1]
+        if not 0 < dimensions < width:
+            raise ValueError(f"Cannot reduce {width}-dimensional embeddings to {dimensions} dimensions")
+        if method == "truncate":
+            return cls(np.zeros(width, dtype=np.float32), np.eye(width, dtype=np.float32)[:dimensions], method)
+        if method != "pca":
+            raise ValueError(f"Unknown embedding reduction {method!r}")
+        if len(vectors) > max_samples:
+            vectors = vectors[np.random.default_rng(seed).choice(len(vectors), max_samples, replace=False)]
+        mean = vectors.mean(axis=0)
+        _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        return cls(mean, vt[:dimensions], method)
+
+    def transform(self, vectors) -> np.ndarray:
+        """Reduce embeddings (one per row)"""
+        return (np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components.T
+
+    def save(self, directory: str):
+        path = os.path.join(directory, self.FILE_NAME)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, mean=self.mean, components=self.components, method=np.array(self.method))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, directory: str):
+        """The reducer saved in an index directory, or None"""
+        path = os.path.join(directory, cls.FILE_NAME)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as saved:
+            return cls(saved["mean"], saved["components"], str(saved["method"]))
+
+    @classmethod
+    def remove(cls, directory: str):
+        try:
+            os.remove(os.path.join(directory, cls.FILE_NAME))
+        except FileNotFoundError:
+            pass
+
+def encode_embedding(embedding) -> str:
+    """A full-width embedding as a metadata string (float16, base64): 1 KB for 384 dimensions"""
+    return base64.b64encode(np.asarray(embedding, dtype="<f2").tobytes()).decode("ascii")
+
+def decode_embeddings(encoded: Sequence[str]) -> np.ndarray:
+    """Embeddings stored with encode_embedding, one per row"""
+    rows: List[np.ndarray] = [np.frombuffer(base64.b64decode(text), dtype="<f2") for text in encoded]
+    return np.asarray(rows, dtype=np.float32)
+
+def distances(queries: np.ndarray, vectors: np.ndarray, space: str) -> np.ndarray:
+    """Distance of every vector from every query (queries x vectors), in Chroma's distance space"""
+    if space == "l2":
+        return (queries ** 2).sum(axis=1)[:, None] - 2 * queries @ vectors.T + (vectors ** 2).sum(axis=1)[None, :]
+    if space == "cosine":
+        normed = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        query_normed = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        return 1 - query_normed @ normed.T
+    return 1 - queries @ vectors.T  # ip
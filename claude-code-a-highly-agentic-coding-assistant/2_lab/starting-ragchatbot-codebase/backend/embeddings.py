@@ -0,0 +1,51 @@
+import threading
+from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+
+class LazySentenceTransformerEmbeddingFunction(SentenceTransformerEmbeddingFunction):
+    """
+    ChromaDB's SentenceTransformer embedding function, but sentence_transformers
+    (and torch) are only imported, and the model only loaded, on first use.
+
+    It reports the same name and config as the parent class, so collections
+    created with either one stay interchangeable.
+    """
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", device: str = "cpu",
+                 normalize_embeddings: bool = False):
+        self.model_name = model_name
+        self.device = device
+        self.normalize_embeddings = normalize_embeddings
+        self.kwargs = {}
+        self._model = None
+        self._load_lock = threading.Lock()
+
+    @staticmethod
+    def build_from_config(config):
+        # ChromaDB rebuilds embedding functions from config while creating
+        # collections; stay lazy there too instead of loading the model
+        return LazySentenceTransformerEmbeddingFunction(
+            model_name=config.get("model_name"),
+            device=config.get("device"),
+            normalize_embeddings=config.get("normalize_embeddings")
+        )
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
+
+    def load(self):
+        """Import sentence_transformers and load the model if not done yet (thread-safe)"""
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    # Reuses chromadb's process-wide model cache, e.g. a model preloaded before fork
+                    SentenceTransformerEmbeddingFunction.__init__(
+                        self,
+                        model_name=self.model_name,
+                        device=self.device,
+                        normalize_embeddings=self.normalize_embeddings
+                    )
+
+    def __call__(self, input):
+        self.load()
+        return super().__call__(input)
@@ -0,0 +1,248 @@
+"""
+HNSW parameter tuning for the course_content collection.
+
+Chroma searches course_content with an HNSW graph, trading recall for speed
+through three settings: max_neighbors (M, edges per node) and ef_construction
+(candidates considered while inserting) shape the graph, and ef_search
+(candidates considered per query) is applied when the index is loaded.
+
+The tuner reads every active chunk vector from the index and computes the exact
+k-th nearest distance of a set of query vectors by brute force; a search result
+counts towards recall@k if it is no farther than that (so a result tied with
+an exact neighbour, e.g. a near-duplicate chunk, is not a miss). It then builds a
+scratch copy of course_content for every (max_neighbors, ef_construction) pair,
+measures recall@k against the exact neighbours and per-query latency for every
+ef_search, and picks the fastest setting (median latency) whose recall meets
+the target. The choice is saved to HNSW_PARAMS_PATH, which VectorStore applies
+to course_content, and with --apply the live index is rebuilt with it.
+
+Queries are the questions of benchmarks/retrieval_questions.json plus the first
+sentence of randomly sampled chunks, embedded with the index's model; searches
+use the same active-version filter as VectorStore.search.
+
+Usage (from the backend directory):
+    uv run python hnsw_tuning.py --apply
+    uv run python hnsw_tuning.py --recall-target 0.99 --max-neighbors 16 32 --ef-search 20 40 80 160
+    uv run python hnsw_tuning.py --show
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import chromadb
+import numpy as np
+from chromadb.config import Settings
+
+from chroma_client import release_client
+from document_processor import split_sentences
+from embedding_reduction import distances
+
+PARAM_NAMES = ("max_neighbors", "ef_construction", "ef_search")
+DEFAULT_QUESTIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks",
+                                 "retrieval_questions.json")
+
+
+def load_params(path: str) -> Optional[Dict[str, int]]:
+    """HNSW settings saved by the tuner, or None if it has not been run"""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        saved = json.load(f)
+    return {name: int(saved[name]) for name in PARAM_NAMES if name in saved}
+
+
+def save_params(path: str, result: Dict[str, Any]):
+    """Atomically write a tuning result (settings plus the recall and latency that chose them)"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def kth_distances(queries: np.ndarray, vectors: np.ndarray, k: int, space: str, block: int = 64) -> np.ndarray:
+    """Exact distance of each query's k-th nearest vector, by brute force a block of queries at a time"""
+    kth = np.empty(len(queries), dtype=np.float32)
+    for start in range(0, len(queries), block):
+        block_distances = distances(queries[start:start + block], vectors, space)
+        kth[start:start + block] = np.partition(block_distances, k - 1, axis=1)[:, k - 1]
+    return kth
+
+
+def query_texts(store, ids: List[str], questions_path: Optional[str], sample_queries: int,
+                seed: int = 0) -> List[str]:
+    """Benchmark questions plus the first sentence of sample_queries random chunks among ids"""
+    texts = []
+    if questions_path and os.path.exists(questions_path):
+        with open(questions_path, encoding="utf-8") as f:
+            texts.extend(item["question"] for item in json.load(f)["questions"])
+    if sample_queries > 0:
+        sampled = random.Random(seed).sample(ids, min(sample_queries, len(ids)))
+        documents = store.course_content.get(ids=sampled, include=["documents"])["documents"]
+        texts.extend(next(iter(split_sentences(document)), document) for document in documents)
+    return texts
+
+
+def _measure(chroma_path: str, params: Dict[str, int], queries: np.ndarray, where: Dict, k: int,
+             vectors: np.ndarray, rows: Dict[str, int], kth: np.ndarray, space: str) -> Dict[str, Any]:
+    """Open the scratch index with the given ef_search and time one search per query"""
+    client = chromadb.PersistentClient(path=chroma_path, settings=Settings(anonymized_telemetry=False))
+    try:
+        collection = client.get_collection("course_content")
+        # ef_search takes effect when the index is loaded, i.e. at the first query below
+        collection.modify(configuration={"hnsw": {"ef_search": params["ef_search"]}})
+        collection.query(query_embeddings=queries[:1], n_results=k, where=where)
+        latencies = []
+        recalls = []
+        for query, kth_distance in zip(queries, kth):
+            start = time.perf_counter()
+            found = collection.query(query_embeddings=query[None, :], n_results=k, where=where, include=[])["ids"][0]
+            latencies.append(time.perf_counter() - start)
+            found_distances = distances(query[None, :], vectors[[rows[chunk_id] for chunk_id in found]], space)[0]
+            # Tolerance for float32 rounding in both distance computations
+            recalls.append(int((found_distances <= kth_distance + 1e-5).sum()) / k)
+    finally:
+        release_client(chroma_path)
+    latencies.sort()
+    return {
+        **params,
+        "recall_at_k": round(float(np.mean(recalls)), 4),
+        "search_p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "search_p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 3),
+    }
+
+
+def tune(store, k: int, recall_target: float, max_neighbors: Sequence[int], ef_construction: Sequence[int],
+         ef_search: Sequence[int], questions_path: Optional[str] = DEFAULT_QUESTIONS,
+         sample_queries: int = 200, report=print) -> Dict[str, Any]:
+    """
+    Measure every HNSW setting of the grid on a copy of the store's chunk vectors.
+
+    Args:
+        store: VectorStore whose course_content is tuned (not modified)
+        k: Results per search, as in MAX_RESULTS
+        recall_target: Lowest acceptable mean recall@k against exact search
+        max_neighbors, ef_construction, ef_search: Values to try for each setting
+        questions_path: JSON file of benchmark questions used as queries, if it exists
+        sample_queries: Random chunks whose first sentence is used as a query as well
+        report: Called with each measured setting
+
+    Returns:
+        Dict with "best" (the fastest setting meeting the target, or None) and "results"
+    """
+    where = store._build_filter(None, None)
+    records = store.course_content.get(where=where, include=["metadatas", "embeddings"])
+    if not records["ids"]:
+        raise ValueError("The index has no chunks to tune on")
+    vectors = np.asarray(records["embeddings"], dtype=np.float32)
+    texts = query_texts(store, records["ids"], questions_path, sample_queries)
+    queries = np.asarray(store.embed_queries(texts), dtype=np.float32)
+    if store.reducer is not None:
+        # Tuned in the space course_content is searched in
+        queries = store.reducer.transform(queries)
+    space = store.hnsw_configuration().get("space", "l2")
+    k = min(k, len(records["ids"]))
+    kth = kth_distances(queries, vectors, k, space)
+    rows = {chunk_id: row for row, chunk_id in enumerate(records["ids"])}
+
+    results = []
+    for neighbors in max_neighbors:
+        for construction in ef_construction:
+            scratch = tempfile.mkdtemp(prefix="hnsw_tuning_")
+            try:
+                client = chromadb.PersistentClient(path=scratch, settings=Settings(anonymized_telemetry=False))
+                collection = client.create_collection("course_content", configuration={"hnsw": {
+                    "space": space, "max_neighbors": neighbors, "ef_construction": construction
+                }}, embedding_function=None)
+                batch_size = client.get_max_batch_size()
+                build_start = time.perf_counter()
+                for start in range(0, len(records["ids"]), batch_size):
+                    end = start + batch_size
+                    collection.add(ids=records["ids"][start:end], embeddings=vectors[start:end],
+                                   metadatas=records["metadatas"][start:end])
+                build_seconds = time.perf_counter() - build_start
+                # The index built above stays loaded, with the default ef_search, until the client is dropped
+                release_client(scratch)
+                for search in ef_search:
+                    params = {"max_neighbors": neighbors, "ef_construction": construction, "ef_search": search}
+                    result = _measure(scratch, params, queries, where, k, vectors, rows, kth, space)
+                    result["build_seconds"] = round(build_seconds, 2)
+                    results.append(result)
+                    report(result)
+            finally:
+                release_client(scratch)
+                shutil.rmtree(scratch, ignore_errors=True)
+
+    passing = [result for result in results if result["recall_at_k"] >= recall_target]
+    best = min(passing, key=lambda result: (result["search_p50_ms"], result["search_p99_ms"]), default=None)
+    if best is not None:
+        best = {
+            **best,
+            "k": k,
+            "recall_target": recall_target,
+            "space": space,
+            "chunks": len(records["ids"]),
+            "queries": len(texts),
+            "tuned_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+    return {"best": best, "results": results}
+
+
+def main():
+    from config import config
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recall-target", type=float, default=config.HNSW_RECALL_TARGET)
+    parser.add_argument("--k", type=int, default=config.MAX_RESULTS, help="Results per search")
+    parser.add_argument("--max-neighbors", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--ef-construction", type=int, nargs="+", default=[50, 100, 200])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[10, 20, 40, 80, 160])
+    parser.add_argument("--questions", default=DEFAULT_QUESTIONS, help="Benchmark questions used as queries")
+    parser.add_argument("--sample-queries", type=int, default=200, help="Chunks whose first sentence is a query")
+    parser.add_argument("--apply", action="store_true", help="Also rebuild the index at CHROMA_PATH with the choice")
+    parser.add_argument("--show", action="store_true", help="Print the saved settings and the index's, then exit")
+    args = parser.parse_args()
+
+    from rag_system import RAGSystem
+    rag_system = RAGSystem(config)
+
+    if args.show:
+        print(json.dumps({
+            "saved": load_params(config.HNSW_PARAMS_PATH),
+            "index": rag_system.vector_store.hnsw_configuration()
+        }, indent=2))
+        return 0
+
+    outcome = rag_system.tune_hnsw(
+        k=args.k, recall_target=args.recall_target, max_neighbors=args.max_neighbors,
+        ef_construction=args.ef_construction, ef_search=args.ef_search,
+        questions_path=args.questions, sample_queries=args.sample_queries,
+        report=lambda result: print(json.dumps(result), flush=True)
+    )
+    best = outcome["best"]
+    if best is None:
+        top = max(outcome["results"], key=lambda result: result["recall_at_k"])
+        print(f"No setting reached recall@{args.k} {args.recall_target} (best {top['recall_at_k']}); "
+              f"widen the grid. Nothing saved.", file=sys.stderr)
+        return 1
+
+    params = {name: best[name] for name in PARAM_NAMES}
+    if args.apply:
+        start = time.perf_counter()
+        rag_system.apply_hnsw_params(params)
+        print(f"Rebuilt course_content with {params} in {time.perf_counter() - start:.1f}s; "
+              f"servers pick them up when they reopen the index")
+    # Saved after the rebuild, so stores opened meanwhile still match the index
+    save_params(config.HNSW_PARAMS_PATH, best)
+    print(f"Saved {params} (recall@{best['k']} {best['recall_at_k']}, p50 {best['search_p50_ms']} ms) "
+          f"to {config.HNSW_PARAMS_PATH}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,404 @@
+import os
+import re
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from ingest_lock import IngestLock
+from vector_store import VectorStore
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory file locks, readers are only tracked within this process
+    fcntl = None
+
+CURRENT_FILE = "CURRENT"  # Names the committed generation
+READERS_FILE = ".readers"  # Every process reading a generation holds a shared flock on it
+GENERATION_PATTERN = re.compile(r"^gen-(\d{6})$")
+
+class _Generation:
+    """A generation this process has open: its store, readers in this process, and its readers lock"""
+
+    def __init__(self, name: str, store: VectorStore, readers_file):
+        self.name = name
+        self.store = store
+        self.readers_file = readers_file
+        self.readers = 0
+
+class IndexGenerations:
+    """
+    Versioned copies of the index, so queries never read an index that is being written.
+
+    Each generation is a complete Chroma index in its own directory
+    (CHROMA_PATH/gen-000001, gen-000002, ...) and the CURRENT file names the
+    committed one. A write copies the committed generation into the next
+    directory, applies its changes there and then publishes it by atomically
+    replacing CURRENT. Readers pin the committed generation for a whole query,
+    so they see either the old or the new index, never a half-written one, and
+    never wait for ingestion.
+
+    Readers open generations without writing to them (repair_on_open off): index
+    repairs such as the version migration or missing lesson centroids run on
+    the copy inside write(), and at startup through a write of their own.
+
+    A process holds a shared flock on a generation's .readers file while it has
+    the generation open. Older generations are deleted once no process holds
+    that lock; generations newer than CURRENT belong to a write in progress
+    (or one that crashed, cleaned up by the next write).
+    """
+
+    def __init__(self, root: str, create_store: Callable[[str], VectorStore], ingest_lock: IngestLock):
+        """
+        Args:
+            root: Directory holding the generations (CHROMA_PATH)
+            create_store: Opens the first generation, without repairing it (repair_on_open=False);
+                          later ones reuse its embedding model via at_path()
+            ingest_lock: Lock serializing writers, held while the first generation is created or repaired
+        """
+        self.root = root
+        self.create_store = create_store
+        self._template: Optional[VectorStore] = None
+        self._lock = threading.Lock()
+        self._switch_lock = threading.Lock()  # Held by the one thread opening a newly published generation
+        self._open: Dict[str, _Generation] = {}
+        self._current: Optional[_Generation] = None
+        self._current_stat: Optional[Tuple[int, int, int]] = None
+        # (store, writable) pinned by read() or write() in this thread or task
+        self._pinned: ContextVar[Optional[Tuple[VectorStore, bool]]] = ContextVar(
+            f"index_generation_{id(self)}", default=None
+        )
+
+        os.makedirs(root, exist_ok=True)
+        with ingest_lock:
+            if self._read_current() is None:
+                self._create_first_generation()
+        with self._switch_lock:
+            self._switch()
+        if self._current.store.needs_repair():
+            with ingest_lock:
+                # Another process may have repaired it while this one waited for the lock
+                with self.read() as store:
+                    needs_repair = store.needs_repair()
+                if needs_repair:
+                    print(f"Repairing index generation {self.current_name()} in a new generation")
+                    with self.write():
+                        pass
+
+    @contextmanager
+    def read(self) -> Iterator[VectorStore]:
+        """Pin the committed generation for the block; nested reads share the pin"""
+        pinned = self._pinned.get()
+        if pinned is not None:
+            yield pinned[0]
+            return
+        generation = self._acquire()
+        token = self._pinned.set((generation.store, False))
+        try:
+            yield generation.store
+        finally:
+            self._pinned.reset(token)
+            self._release(generation)
+
+    @contextmanager
+    def write(self) -> Iterator[VectorStore]:
+        """
+        Write a new generation, published when the block exits without error.
+
+        The block gets a VectorStore over a copy of the committed generation, already
+        repaired (VectorStore.repair_index); reads inside the block see its changes,
+        while other queries keep reading the committed generation. On an exception
+        the copy is deleted and the committed generation stays current. The caller
+        must hold the ingest lock.
+        """
+        if self._pinned.get() is not None:
+            raise RuntimeError("Cannot start an index write inside a read or another write")
+
+        self._remove_abandoned()
+        base = self._acquire()
+        try:
+            name = self._generation_name(self._generation_number(base.name) + 1)
+            path = os.path.join(self.root, name)
+            start = time.perf_counter()
+            shutil.copytree(os.path.join(self.root, base.name), path,
+                            ignore=shutil.ignore_patterns(READERS_FILE))
+            metrics.INDEX_GENERATION_COPY.observe(time.perf_counter() - start)
+        finally:
+            self._release(base)
+
+        store = self._open_store(path)
+        token = self._pinned.set((store, True))
+        try:
+            store.repair_index()
+            yield store
+        except BaseException:
+            self._pinned.reset(token)
+            store.close()
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+        self._pinned.reset(token)
+
+        # Readers reopen the generation from disk, so everything is flushed before it is published
+        store.close()
+        with open(os.path.join(path, READERS_FILE), "a"):
+            pass
+        self._publish(name)
+        with self._switch_lock:
+            self._switch()
+        self.collect_garbage()
+
+    def pinned(self) -> Optional[Tuple[VectorStore, bool]]:
+        """The (store, writable) pinned by read() or write() in this context, if any"""
+        return self._pinned.get()
+
+    def current_name(self) -> Optional[str]:
+        """Name of the committed generation"""
+        return self._read_current()
+
+    def collect_garbage(self) -> List[str]:
+        """
+        Delete generations older than the committed one that no process is reading.
+
+        Returns:
+            Names of the deleted generations
+        """
+        current = self._read_current()
+        if current is None:
+            return []
+        removed = []
+        for name in self._generation_names():
+            if name >= current:
+                continue  # Committed, or being written
+            with self._lock:
+                if name in self._open:
+                    continue
+            path = os.path.join(self.root, name)
+            readers_file = self._lock_readers(path, exclusive=True)
+            if readers_file is None:
+                continue  # Still read by another process
+            try:
+                shutil.rmtree(path)
+                removed.append(name)
+                metrics.INDEX_GENERATIONS_COLLECTED.inc()
+            except OSError as e:
+                print(f"Could not delete index generation {name}: {e}")
+            finally:
+                readers_file.close()
+        return removed
+
+    def _acquire(self) -> _Generation:
+        if self._stat_current() != self._current_stat:
+            # One thread opens the newly published generation; the others keep
+            # reading the previous one instead of waiting for it
+            if self._switch_lock.acquire(blocking=False):
+                try:
+                    if self._stat_current() != self._current_stat:
+                        self._switch()
+                finally:
+                    self._switch_lock.release()
+        with self._lock:
+            generation = self._current
+            generation.readers += 1
+            return generation
+
+    def _release(self, generation: _Generation):
+        with self._lock:
+            generation.readers -= 1
+            if generation.readers > 0 or generation is self._current:
+                return
+            self._forget(generation)
+        self._close(generation)
+        self.collect_garbage()
+
+    def _switch(self):
+        """Open the generation named in CURRENT and make it current; the caller holds _switch_lock"""
+        while True:
+            stat = self._stat_current()
+            name = self._read_current()
+            with self._lock:
+                generation = self._open.get(name)
+            if generation is None:
+                generation = self._open_generation(name)
+            if generation is not None:
+                break
+            # Garbage collected between reading CURRENT and locking it: CURRENT has moved on
+
+        if self._current is not None and generation is not self._current:
+            # Readers stay on the previous generation until this one has loaded its vector index
+            generation.store.warm_index()
+
+        with self._lock:
+            previous, self._current, self._current_stat = self._current, generation, stat
+            retired = previous is not None and previous is not generation and previous.readers == 0
+            if retired:
+                self._forget(previous)
+        if retired:
+            self._close(previous)
+
+    def _open_generation(self, name: str) -> Optional[_Generation]:
+        path = os.path.join(self.root, name)
+        readers_file = self._lock_readers(path, exclusive=False)
+        if readers_file is None:
+            return None
+        generation = _Generation(name, self._open_store(path), readers_file)
+        with self._lock:
+            self._open[name] = generation
+            metrics.INDEX_GENERATIONS_OPEN.set(len(self._open))
+        return generation
+
+    def _forget(self, generation: _Generation):
+        """Drop a generation nobody in this process reads anymore; the caller holds _lock"""
+        del self._open[generation.name]
+        metrics.INDEX_GENERATIONS_OPEN.set(len(self._open))
+
+    def _close(self, generation: _Generation):
+        generation.store.close()
+        generation.readers_file.close()  # Releases the flock
+
+    def _open_store(self, path: str) -> VectorStore:
+        if self._template is None:
+            self._template = self.create_store(path)
+            return self._template
+        return self._template.at_path(path)
+
+    def _lock_readers(self, path: str, exclusive: bool):
+        """
+        Lock a generation's readers file: shared to read it, exclusive (without
+        waiting) to delete it. Returns the open file holding the lock, or None if
+        the generation is gone or, for exclusive, still read somewhere.
+        """
+        lock_path = os.path.join(path, READERS_FILE)
+        try:
+            readers_file = open(lock_path, "r")
+        except FileNotFoundError:
+            return None
+        if fcntl is None:
+            return readers_file
+
+        try:
+            fcntl.flock(readers_file, fcntl.LOCK_EX | fcntl.LOCK_NB if exclusive else fcntl.LOCK_SH)
+        except BlockingIOError:
+            readers_file.close()
+            return None
+        # The generation may have been deleted between open() and flock()
+        try:
+            if os.stat(lock_path).st_ino == os.fstat(readers_file.fileno()).st_ino:
+                return readers_file
+        except FileNotFoundError:
+            pass
+        readers_file.close()
+        return None
+
+    def _create_first_generation(self):
+        """Create and publish gen-000001, moving in an index that predates generations"""
+        name = self._generation_name(1)
+        path = os.path.join(self.root, name)
+        shutil.rmtree(path, ignore_errors=True)
+        if os.path.exists(os.path.join(self.root, "chroma.sqlite3")):
+            shutil.copytree(self.root, path, ignore=self._ignore_at_root)
+            print(f"Copied the index at {self.root} into generation {name}; "
+                  f"the files outside the gen-* directories are no longer used")
+        else:
+            os.makedirs(path)
+        with open(os.path.join(path, READERS_FILE), "a"):
+            pass
+        self._publish(name)
+
+    def _ignore_at_root(self, directory: str, names: List[str]) -> List[str]:
+        if os.path.abspath(directory) != os.path.abspath(self.root):
+            return []
+        return [name for name in names
+                if name in (CURRENT_FILE, IngestLock.LOCK_FILE)
+                or name.startswith(CURRENT_FILE + ".")
+                or GENERATION_PATTERN.match(name)]
+
+    def _remove_abandoned(self):
+        """Delete generations newer than CURRENT: left by writes that crashed (writers are serialized)"""
+        current = self._read_current()
+        for name in self._generation_names():
+            if name > current:
+                print(f"Removing unpublished index generation {name}")
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def _publish(self, name: str):
+        """Atomically point CURRENT at a generation"""
+        current_path = os.path.join(self.root, CURRENT_FILE)
+        tmp_path = f"{current_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(name + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, current_path)
+        if hasattr(os, "O_DIRECTORY"):
+            # Make the rename itself durable
+            directory = os.open(self.root, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+
+    def _read_current(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE), encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _stat_current(self) -> Optional[Tuple[int, int, int]]:
+        """Identity of the CURRENT file, which changes whenever a generation is published"""
+        try:
+            stat = os.stat(os.path.join(self.root, CURRENT_FILE))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _generation_names(self) -> List[str]:
+        return sorted(name for name in os.listdir(self.root)
+                      if GENERATION_PATTERN.match(name) and os.path.isdir(os.path.join(self.root, name)))
+
+    @staticmethod
+    def _generation_name(number: int) -> str:
+        return f"gen-{number:06d}"
+
+    @staticmethod
+    def _generation_number(name: str) -> int:
+        return int(GENERATION_PATTERN.match(name).group(1))
+
+class GenerationalVectorStore:
+    """
+    Stands in for a VectorStore, delegating to the generation pinned in the
+    current context: the one being written inside IndexGenerations.write(), the
+    one pinned by read(), or otherwise the committed generation for the length of
+    a single call. Write methods only work inside write().
+    """
+
+    WRITE_METHODS = frozenset({
+        "replace_course", "delete_course", "add_course_metadata", "add_course_content",
+        "add_sentence_embeddings", "build_missing_lesson_centroids", "clear_all_data",
+        "set_hnsw_params", "update_embedding_reduction", "repair_index",
+    })
+
+    def __init__(self, generations: IndexGenerations):
+        self._generations = generations
+
+    def __getattr__(self, name: str):
+        pinned = self._generations.pinned()
+        if pinned is not None:
+            store, writable = pinned
+            if name in self.WRITE_METHODS and not writable:
+                raise RuntimeError(f"VectorStore.{name} needs an index write, not a read")
+            return getattr(store, name)
+        if name in self.WRITE_METHODS:
+            raise RuntimeError(f"VectorStore.{name} must run inside IndexGenerations.write()")
+
+        with self._generations.read() as store:
+            attribute = getattr(store, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            with self._generations.read() as store:
+                return getattr(store, name)(*args, **kwargs)
+        return call
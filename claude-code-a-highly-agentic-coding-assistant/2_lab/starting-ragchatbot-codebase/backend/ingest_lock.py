@@ -0,0 +1,56 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory file locks, fall back to a process-local lock
+    fcntl = None
+
+class IngestLock:
+    """
+    Exclusive lock that serializes index writers across threads and processes.
+
+    ChromaDB's persistent client is not safe for concurrent writers, so every
+    worker process that may ingest takes this lock (an flock on a file next to
+    the index) before writing.
+    """
+
+    LOCK_FILE = ".ingest.lock"
+
+    def __init__(self, index_path: str):
+        os.makedirs(index_path, exist_ok=True)
+        self.lock_path = os.path.join(index_path, self.LOCK_FILE)
+        self._thread_lock = threading.Lock()
+        self._file = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Take the lock; with blocking=False return False instead of waiting"""
+        if not self._thread_lock.acquire(blocking):
+            return False
+        if fcntl is None:
+            return True
+
+        self._file = open(self.lock_path, "a")
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(self._file, flags)
+        except BlockingIOError:
+            self._file.close()
+            self._file = None
+            self._thread_lock.release()
+            return False
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
@@ -0,0 +1,78 @@
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional
+
+@dataclass
+class IngestionProgress:
+    """Progress of a folder ingestion, updated as each file is processed"""
+    state: str = "idle"              # idle, running, completed or failed
+    files_total: int = 0
+    files_done: int = 0
+    courses_added: int = 0
+    chunks_added: int = 0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    snapshot: Optional[str] = None   # Snapshot file the index was seeded from, if any
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+class BackgroundIngestion:
+    """Runs RAGSystem.add_course_folder in a background thread so the server can start serving at once"""
+
+    def __init__(self, rag_system):
+        self.rag_system = rag_system
+        self.progress = IngestionProgress()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, folder_path: str, clear_existing: bool = False, snapshot_path: Optional[str] = None):
+        """
+        Start ingesting folder_path unless an ingestion is already running.
+        
+        If snapshot_path is given and the index is empty, the snapshot is loaded
+        first, so only documents missing from it are embedded.
+        """
+        if self.is_running:
+            return
+        self.progress = IngestionProgress(state="running", started_at=time.time())
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(folder_path, clear_existing, snapshot_path, self.progress),
+            name="startup-ingestion",
+            daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, folder_path: str, clear_existing: bool, snapshot_path: Optional[str],
+             progress: IngestionProgress):
+        print("Loading initial documents...")
+        try:
+            if not clear_existing and snapshot_path and self.rag_system.load_snapshot_if_empty(snapshot_path):
+                progress.snapshot = snapshot_path
+            courses, chunks = self.rag_system.add_course_folder(
+                folder_path, clear_existing=clear_existing, progress=progress
+            )
+            progress.state = "completed"
+            print(f"Loaded {courses} courses with {chunks} chunks")
+        except Exception as e:
+            progress.error = str(e)
+            progress.state = "failed"
+            print(f"Error loading documents: {e}")
+        finally:
+            progress.finished_at = time.time()
+
+    @property
+    def is_running(self) -> bool:
+        return self.progress.state == "running"
+
+    @property
+    def is_partial(self) -> bool:
+        """True while the index is missing content that ingestion was meant to add"""
+        return self.progress.state in ("running", "failed")
+
+    def wait(self, timeout: Optional[float] = None):
+        """Block until the current ingestion finishes (mainly for scripts)"""
+        if self._thread is not None:
+            self._thread.join(timeout)
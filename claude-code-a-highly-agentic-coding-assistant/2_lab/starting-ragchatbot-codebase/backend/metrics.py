@@ -0,0 +1,309 @@
+import bisect
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from sub-millisecond Chroma lookups to slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# While a request is profiled, every timed block also appends (name, start, seconds) here;
+# None otherwise, so unprofiled requests pay one context variable lookup per timed block
+STAGE_TIMINGS: ContextVar[Optional[List[Tuple[str, float, float]]]] = ContextVar("stage_timings", default=None)
+
+def _format_labels(labelnames: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric(ABC):
+    """Base class for metrics with optional labels, rendered in Prometheus text format"""
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._new_child(())
+        REGISTRY.register(self)
+
+    @abstractmethod
+    def _new_child(self, values: Tuple[str, ...]):
+        """Create the child metric holding the value for one set of label values"""
+        pass
+
+    def labels(self, *values: str):
+        """Return the child metric for these label values, creating it on first use"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child(key))
+        return child
+
+    def _samples(self) -> List[Tuple[Tuple[str, ...], object]]:
+        if not self.labelnames:
+            return [((), self._default)]
+        return sorted(self._children.items())
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for values, child in self._samples():
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+class _CounterChild:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def render(self, name, labelnames, values):
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(self._value)}"]
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    type_name = "counter"
+
+    def _new_child(self, values):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self._default.inc(amount)
+
+class _GaugeChild:
+    def __init__(self):
+        self._value = 0.0
+
+    def set(self, value: float):
+        self._value = value
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def render(self, name, labelnames, values):
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(self._value)}"]
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+    type_name = "gauge"
+
+    def _new_child(self, values):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default.set(value)
+
+class _HistogramChild:
+    def __init__(self, buckets: Tuple[float, ...], timing_name: str):
+        self._buckets = buckets
+        self._timing_name = timing_name  # Name of time() blocks in profiled requests
+        self._counts = [0] * (len(buckets) + 1)  # Last slot is the +Inf bucket
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @contextmanager
+    def time(self):
+        """Observe the wall time of the with-block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(elapsed)
+            timings = STAGE_TIMINGS.get()
+            if timings is not None:
+                timings.append((self._timing_name, start, elapsed))
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    def render(self, name, labelnames, values):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self._buckets + (float("inf"),), counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{name}_bucket{_format_labels(labelnames, values, le)} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {cumulative}")
+        return lines
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets"""
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self, values):
+        # Stage histograms are named by their label, others by the metric
+        return _HistogramChild(self.buckets, ",".join(values) or self.name)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+class Registry:
+    """Collection of metrics exposed on /metrics"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Query pipeline metrics
+STAGE_SECONDS = Histogram(
+    "rag_stage_duration_seconds",
+    "Time spent in each stage of query processing",
+    labelnames=("stage",)
+)
+QUERY_SECONDS = Histogram("rag_query_duration_seconds", "End-to-end time of a query (RAGSystem.query, or one query of a batch)")
+TOOL_CALLS_PER_QUERY = Histogram(
+    "rag_tool_calls_per_query",
+    "Number of tool calls Claude made while answering one query",
+    buckets=(0, 1, 2, 3, 5, 10)
+)
+EMBEDDING_BATCH_SIZE = Histogram(
+    "rag_embedding_batch_size",
+    "Query texts embedded per model call by the embedding micro-batcher",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+EMBEDDING_WORKER_RESTARTS = Counter(
+    "rag_embedding_worker_restarts_total",
+    "Embedding worker processes restarted after exiting"
+)
+TOOL_CALLS = Counter("rag_tool_calls_total", "Tool calls executed", labelnames=("tool",))
+LLM_TOKENS = Counter("rag_llm_tokens_total", "Anthropic API tokens", labelnames=("direction",))
+CONTEXT_TOKENS = Counter(
+    "rag_context_tokens_total",
+    "Estimated tokens of search result text compressed by the context compressor, before and after",
+    labelnames=("stage",)
+)
+SENTENCE_CACHE = Counter(
+    "rag_sentence_cache_lookups_total",
+    "Result chunks whose sentence embeddings were cached (hit) or had to be embedded (miss)",
+    labelnames=("result",)
+)
+
+# Admission control metrics
+ADMISSION_QUEUE_DEPTH = Gauge("rag_admission_queue_depth", "LLM calls waiting for admission")
+ADMISSION_IN_FLIGHT = Gauge("rag_admission_in_flight", "LLM calls admitted and not yet finished")
+ADMISSION_WAIT = Histogram("rag_admission_wait_seconds", "Time LLM calls waited for admission")
+ADMISSION_REJECTIONS = Counter(
+    "rag_admission_rejections_total",
+    "LLM calls rejected because the queue was full or the deadline passed",
+    labelnames=("reason",)
+)
+
+# Ingestion metrics
+EMBEDDINGS_REUSED = Counter(
+    "rag_ingest_embeddings_reused_total",
+    "Chunk and sentence texts of a re-indexed course that kept their previous embedding instead of being embedded"
+)
+NEAR_DUPLICATE_CHUNKS = Counter(
+    "rag_ingest_near_duplicate_chunks_total",
+    "Chunks not stored or embedded because a near-identical chunk of the same course was"
+)
+DOCS_INDEX_LAG = Histogram(
+    "rag_docs_index_lag_seconds",
+    "Time from a change to a docs folder file until its course is re-indexed",
+    buckets=(0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600)
+)
+DOCS_PENDING_FILES = Gauge("rag_docs_pending_files", "Changed docs folder files waiting to be re-indexed")
+
+# Index generation metrics
+INDEX_GENERATIONS_OPEN = Gauge("rag_index_generations_open", "Index generations this process has open")
+INDEX_GENERATION_COPY = Histogram(
+    "rag_index_generation_copy_seconds",
+    "Time to copy the committed index generation into a new one before a write",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+INDEX_GENERATIONS_COLLECTED = Counter(
+    "rag_index_generations_collected_total",
+    "Old index generations deleted once no process was reading them"
+)
+
+# Sharded index metrics
+SHARD_SEARCH = Histogram(
+    "rag_shard_search_seconds",
+    "Round-trip time of the searches sent to one index shard process",
+    labelnames=("shard",)
+)
+SHARD_TIMEOUTS = Counter(
+    "rag_shard_timeouts_total",
+    "Shard searches left out of a merged result because they missed the deadline",
+    labelnames=("shard",)
+)
+SHARD_RESTARTS = Counter("rag_shard_restarts_total", "Index shard processes restarted after exiting")
+
+# Stage children are resolved once so the hot path skips the label lookup
+QUERY_EMBEDDING = STAGE_SECONDS.labels("query_embedding")
+COURSE_RESOLUTION = STAGE_SECONDS.labels("course_resolution")
+CHROMA_QUERY = STAGE_SECONDS.labels("chroma_query")
+ANTHROPIC_INITIAL = STAGE_SECONDS.labels("anthropic_initial_call")
+ANTHROPIC_FINAL = STAGE_SECONDS.labels("anthropic_final_call")
+TOOL_EXECUTION = STAGE_SECONDS.labels("tool_execution")
+SERIALIZATION = STAGE_SECONDS.labels("response_serialization")
+CONTEXT_COMPRESSION = STAGE_SECONDS.labels("context_compression")
+LESSON_SELECTION = STAGE_SECONDS.labels("lesson_selection")
+FULL_WIDTH_RESCORE = STAGE_SECONDS.labels("full_width_rescore")
+INPUT_TOKENS = LLM_TOKENS.labels("input")
+OUTPUT_TOKENS = LLM_TOKENS.labels("output")
+CONTEXT_TOKENS_ORIGINAL = CONTEXT_TOKENS.labels("original")
+CONTEXT_TOKENS_SENT = CONTEXT_TOKENS.labels("sent")
+SENTENCE_CACHE_HITS = SENTENCE_CACHE.labels("hit")
+SENTENCE_CACHE_MISSES = SENTENCE_CACHE.labels("miss")
+
+def record_usage(response):
+    """Count input and output tokens reported on an Anthropic response"""
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        INPUT_TOKENS.inc(getattr(usage, "input_tokens", 0) or 0)
+        OUTPUT_TOKENS.inc(getattr(usage, "output_tokens", 0) or 0)
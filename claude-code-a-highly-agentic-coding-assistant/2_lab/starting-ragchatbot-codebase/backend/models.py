@@ -1,4 +1,5 @@
-from typing import List, Dict, Optional
+from array import array
+from typing import List, Dict, Iterable, Optional
 from pydantic import BaseModel
 
 class Lesson(BaseModel):
@@ -19,4 +20,75 @@ class CourseChunk(BaseModel):
     content: str                        # The actual text content
     course_title: str                   # Which course this chunk belongs to
     lesson_number: Optional[int] = None # Which lesson this chunk is from
-    chunk_index: int                    # Position of this chunk in the document
\ No newline at end of file
+    chunk_index: int                    # Position of this chunk in the document
+
+class ChunkBatch:
+    """
+    Columnar table of course chunks, used for ingestion instead of CourseChunk objects.
+
+    All chunk texts live in one UTF-8 buffer, addressed by an offsets array; lesson
+    numbers and chunk indexes are int arrays, and course titles are stored once
+    and referenced by index. Consumers read a range of rows at a time, so no
+    per-chunk Python objects exist beyond the rows being written.
+    """
+    NO_LESSON = -1  # lesson_numbers value for chunks that belong to no lesson
+
+    def __init__(self):
+        self.text = bytearray()            # UTF-8 texts of all rows, back to back
+        self.offsets = array("q", [0])     # Row i's text is text[offsets[i]:offsets[i + 1]]
+        self.lesson_numbers = array("q")
+        self.chunk_indexes = array("q")
+        self.title_ids = array("l")        # Index into titles
+        self.titles: List[str] = []
+        self._title_ids: Dict[str, int] = {}
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[CourseChunk]) -> 'ChunkBatch':
+        """Build a batch from CourseChunk objects"""
+        batch = cls()
+        for chunk in chunks:
+            batch.append(chunk.content, chunk.course_title, chunk.lesson_number, chunk.chunk_index)
+        return batch
+
+    def append(self, content: str, course_title: str, lesson_number: Optional[int], chunk_index: int):
+        """Add one chunk as a new row"""
+        title_id = self._title_ids.get(course_title)
+        if title_id is None:
+            title_id = self._title_ids[course_title] = len(self.titles)
+            self.titles.append(course_title)
+        self.text += content.encode("utf-8")
+        self.offsets.append(len(self.text))
+        self.lesson_numbers.append(self.NO_LESSON if lesson_number is None else lesson_number)
+        self.chunk_indexes.append(chunk_index)
+        self.title_ids.append(title_id)
+
+    def __len__(self) -> int:
+        return len(self.chunk_indexes)
+
+    def content(self, index: int) -> str:
+        return self.text[self.offsets[index]:self.offsets[index + 1]].decode("utf-8")
+
+    def contents(self, start: int, end: int) -> List[str]:
+        """Texts of rows start..end-1"""
+        with memoryview(self.text) as text:
+            offsets = self.offsets
+            return [str(text[offsets[i]:offsets[i + 1]], "utf-8") for i in range(start, end)]
+
+    def course_title(self, index: int) -> str:
+        return self.titles[self.title_ids[index]]
+
+    def lesson_number(self, index: int) -> Optional[int]:
+        lesson_number = self.lesson_numbers[index]
+        return None if lesson_number == self.NO_LESSON else lesson_number
+
+    def to_chunks(self) -> List[CourseChunk]:
+        """Materialize every row as a CourseChunk"""
+        return [
+            CourseChunk(
+                content=self.content(i),
+                course_title=self.course_title(i),
+                lesson_number=self.lesson_number(i),
+                chunk_index=self.chunk_indexes[i]
+            )
+            for i in range(len(self))
+        ]
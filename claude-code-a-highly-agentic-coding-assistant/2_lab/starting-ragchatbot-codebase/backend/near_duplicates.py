@@ -0,0 +1,91 @@
+import re
+import zlib
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+WORD = re.compile(r"\w+")
+
+class MinHashDeduplicator:
+    """
+    Finds near-duplicate texts with MinHash signatures and locality-sensitive hashing.
+
+    Each text is reduced to its set of word shingles (runs of shingle_words
+    lowercased words) and summarized by num_perm MinHash values; the fraction of
+    equal values between two signatures estimates the Jaccard similarity of their
+    shingle sets. Signatures are split into bands, and only texts that share a
+    band exactly are compared, so finding duplicates stays close to linear in the
+    number of texts. With the defaults (16 bands of 8 rows) pairs above about 0.7
+    similarity are almost always compared.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 128, bands: int = 16,
+                 shingle_words: int = 5, seed: int = 1):
+        """
+        Args:
+            threshold: Estimated Jaccard similarity at which a text counts as a duplicate
+            num_perm: MinHash values per signature
+            bands: LSH bands; num_perm must be a multiple of it
+            shingle_words: Words per shingle
+            seed: Seed of the hash functions (signatures are only comparable with the same seed)
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_words = shingle_words
+        rng = np.random.default_rng(seed)
+        # Hash family h(x) = (a*x + b) mod 2^64, keeping the high 32 bits; a is odd
+        self._a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> List[int]:
+        """32-bit hashes of the text's word shingles"""
+        words = WORD.findall(text.lower())
+        n = self.shingle_words
+        if len(words) <= n:
+            return [zlib.crc32(" ".join(words).encode("utf-8"))]
+        return list({zlib.crc32(" ".join(words[i:i + n]).encode("utf-8")) for i in range(len(words) - n + 1)})
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of a text: num_perm uint32 values"""
+        hashes = np.asarray(self.shingles(text), dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            permuted = (np.outer(hashes, self._a) + self._b) >> np.uint64(32)
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def find_duplicates(self, texts: Sequence[str], groups: Optional[Sequence[int]] = None) -> Dict[int, int]:
+        """
+        Find texts that nearly duplicate an earlier one.
+
+        Args:
+            texts: Texts in order; the first of each set of near-duplicates is kept
+            groups: Optional group of each text; texts are only matched within their group
+
+        Returns:
+            Position of each duplicate -> position of the kept text it duplicates
+        """
+        duplicates: Dict[int, int] = {}
+        buckets: Dict[tuple, List[int]] = {}
+        signatures: List[np.ndarray] = []
+        for position, text in enumerate(texts):
+            signature = self.signature(text)
+            signatures.append(signature)
+            group = groups[position] if groups is not None else 0
+            keys = [(group, band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                    for band in range(self.bands)]
+
+            # Compare with kept texts sharing any band; keep the most similar match
+            candidates = {kept for key in keys for kept in buckets.get(key, ())}
+            best, best_similarity = None, self.threshold
+            for kept in candidates:
+                similarity = float(np.mean(signatures[kept] == signature))
+                if similarity >= best_similarity:
+                    best, best_similarity = kept, similarity
+            if best is not None:
+                duplicates[position] = best
+                continue
+            for key in keys:
+                buckets.setdefault(key, []).append(position)
+        return duplicates
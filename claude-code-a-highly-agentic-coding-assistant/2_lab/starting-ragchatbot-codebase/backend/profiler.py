@@ -0,0 +1,195 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import metrics
+
+# Profile ids are uuid4 hex strings; anything else is rejected before touching the filesystem
+PROFILE_ID = re.compile(r"[0-9a-f]{32}")
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler for one thread.
+
+    A background thread reads the profiled thread's stack every interval with
+    sys._current_frames(), so the profiled code runs unmodified: no tracing
+    hooks, and time spent waiting (on the Anthropic API, a lock, admission
+    control) shows up like time spent computing. Each sample is weighted by the
+    wall time since the previous one, so a late sample does not skew the profile.
+    """
+
+    def __init__(self, interval: float = 0.001):
+        """
+        Args:
+            interval: Seconds between samples
+        """
+        self.interval = interval
+        self.frames: List[Dict[str, Any]] = []          # speedscope frame table
+        self._frame_ids: Dict[Tuple[str, str, int], int] = {}
+        self.samples: List[List[int]] = []              # Frame ids, outermost first
+        self.weights: List[float] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, thread_id: int):
+        """Start sampling the thread with the given threading.get_ident()"""
+        self._thread = threading.Thread(target=self._run, args=(thread_id,), name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self, thread_id: int):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                break
+            self.samples.append(self._stack(frame))
+            self.weights.append(now - last)
+            last = now
+
+    def _stack(self, frame) -> List[int]:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            key = (code.co_name, code.co_filename, code.co_firstlineno)
+            frame_id = self._frame_ids.get(key)
+            if frame_id is None:
+                frame_id = self._frame_ids[key] = len(self.frames)
+                self.frames.append({"name": code.co_name, "file": code.co_filename, "line": code.co_firstlineno})
+            stack.append(frame_id)
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def speedscope(self, name: str) -> Dict[str, Any]:
+        """The samples as a speedscope file (https://www.speedscope.app)"""
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "ragchatbot profiler",
+            "shared": {"frames": self.frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(self.weights),
+                "samples": self.samples,
+                "weights": self.weights
+            }]
+        }
+
+@dataclass
+class RequestProfile:
+    """Result of one profiled request: its stage timings and sampled stacks"""
+    profile_id: str
+    name: str
+    started_at: float                      # Wall clock, for listing
+    seconds: float = 0.0
+    stage_timings: List[Tuple[str, float, float]] = field(default_factory=list)  # (stage, start, seconds)
+    profiler: Optional[SamplingProfiler] = None
+    _start: float = 0.0                    # perf_counter at the start, for stage offsets
+
+    def summary(self) -> Dict[str, Any]:
+        """Per-stage breakdown; stages nest (tool_execution includes chroma_query), so totals overlap"""
+        stages: Dict[str, Dict[str, float]] = {}
+        for stage, _, seconds in self.stage_timings:
+            totals = stages.setdefault(stage, {"calls": 0, "ms": 0.0})
+            totals["calls"] += 1
+            totals["ms"] += seconds * 1000
+        return {
+            "profile_id": self.profile_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "total_ms": round(self.seconds * 1000, 2),
+            "stages": {stage: {"calls": totals["calls"], "ms": round(totals["ms"], 2)}
+                       for stage, totals in sorted(stages.items(), key=lambda item: -item[1]["ms"])},
+            "timeline": [{"stage": stage, "start_ms": round((start - self._start) * 1000, 2),
+                          "ms": round(seconds * 1000, 2)}
+                         for stage, start, seconds in self.stage_timings],
+            "samples": len(self.profiler.samples) if self.profiler else 0
+        }
+
+@contextmanager
+def profile_request(name: str, interval: float = 0.001) -> Iterator[RequestProfile]:
+    """
+    Profile the with-block, which must run in one thread.
+
+    Samples the calling thread's stack and collects the time of every
+    metrics histogram time() block run in this context.
+
+    Args:
+        name: Label of the profile, e.g. the query
+        interval: Seconds between stack samples
+
+    Yields:
+        The RequestProfile, complete once the block exits
+    """
+    profile = RequestProfile(uuid.uuid4().hex, name, time.time(), profiler=SamplingProfiler(interval))
+    token = metrics.STAGE_TIMINGS.set(profile.stage_timings)
+    profile._start = time.perf_counter()
+    profile.profiler.start(threading.get_ident())
+    try:
+        yield profile
+    finally:
+        profile.seconds = time.perf_counter() - profile._start
+        profile.profiler.stop()
+        metrics.STAGE_TIMINGS.reset(token)
+
+class ProfileStore:
+    """Profiles on disk: <id>.json (stage breakdown) and <id>.speedscope.json, keeping the newest max_profiles"""
+
+    def __init__(self, directory: str, max_profiles: int = 100):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+
+    def save(self, profile: RequestProfile):
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, profile.profile_id)
+        with open(base + ".speedscope.json", "w", encoding="utf-8") as f:
+            json.dump(profile.profiler.speedscope(profile.name), f)
+        # Written last, so a listed profile always has its flame graph
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(profile.summary(), f)
+        self._prune()
+
+    def _prune(self):
+        with self._lock:
+            summaries = [entry for entry in os.scandir(self.directory)
+                         if entry.name.endswith(".json") and not entry.name.endswith(".speedscope.json")]
+            summaries.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in summaries[:max(0, len(summaries) - self.max_profiles)]:
+                profile_id = entry.name[:-len(".json")]
+                for path in (self.summary_path(profile_id), self.speedscope_path(profile_id)):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+
+    def summary_path(self, profile_id: str) -> str:
+        return os.path.join(self.directory, profile_id + ".json")
+
+    def speedscope_path(self, profile_id: str) -> str:
+        return os.path.join(self.directory, profile_id + ".speedscope.json")
+
+    def load_summary(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        """Stage breakdown of a stored profile, or None if there is none with this id"""
+        if not PROFILE_ID.fullmatch(profile_id):
+            return None
+        try:
+            with open(self.summary_path(profile_id), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
@@ -1,32 +1,149 @@
-from typing import List, Tuple, Optional, Dict
+from typing import List, Tuple, Optional, Dict, Any, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
 import os
-from document_processor import DocumentProcessor
+import threading
+import time
+from document_processor import DocumentProcessor, file_hash
 from vector_store import VectorStore
 from ai_generator import AIGenerator
+from admission import AdmissionController, request_deadline
 from session_manager import SessionManager
+from session_store import create_session_store
+from ingest_lock import IngestLock
+from index_generations import IndexGenerations, GenerationalVectorStore
+from sharding import ShardedVectorStore
+from ingestion import IngestionProgress
+import snapshot
+import hnsw_tuning
 from search_tools import ToolManager, CourseSearchTool
+from context_compressor import ContextCompressor
+from tool_context import tool_context
 from models import Course, Lesson, CourseChunk
+import metrics
 
 class RAGSystem:
     """Main orchestrator for the Retrieval-Augmented Generation system"""
     
+    # File types read as course documents
+    COURSE_FILE_EXTENSIONS = ('.pdf', '.docx', '.txt')
+    
     def __init__(self, config):
         self.config = config
         
         # Initialize core components
         self.document_processor = DocumentProcessor(config.CHUNK_SIZE, config.CHUNK_OVERLAP)
-        self.vector_store = VectorStore(config.CHROMA_PATH, config.EMBEDDING_MODEL, config.MAX_RESULTS)
-        self.ai_generator = AIGenerator(config.ANTHROPIC_API_KEY, config.ANTHROPIC_MODEL)
-        self.session_manager = SessionManager(config.MAX_HISTORY)
+        
+        # Only one thread or worker process may write to the index at a time
+        self.ingest_lock = IngestLock(config.CHROMA_PATH)
+        
+        # With index generations, writes go to a copy of the index that is published
+        # when complete, and every query reads one committed generation throughout.
+        # With shards, courses are spread over several index processes instead
+        self.generations = None
+        if config.INDEX_SHARDS > 0:
+            if config.INDEX_GENERATIONS:
+                raise ValueError("INDEX_SHARDS and INDEX_GENERATIONS cannot be combined")
+            self.vector_store = ShardedVectorStore(
+                config.CHROMA_PATH,
+                config.INDEX_SHARDS,
+                timeout=config.SHARD_TIMEOUT_MS / 1000,
+                ingest_lock=self.ingest_lock,
+                **self._vector_store_settings()
+            )
+        elif config.INDEX_GENERATIONS:
+            # Generations are opened read-only; IndexGenerations repairs them in writes
+            self.generations = IndexGenerations(
+                config.CHROMA_PATH,
+                lambda chroma_path: self._create_vector_store(chroma_path, repair_on_open=False),
+                self.ingest_lock
+            )
+            self.vector_store = GenerationalVectorStore(self.generations)
+        else:
+            self.vector_store = self._create_vector_store(config.CHROMA_PATH)
+        self.admission = AdmissionController.from_config(config)
+        self.ai_generator = AIGenerator(config.ANTHROPIC_API_KEY, config.ANTHROPIC_MODEL, self.admission)
+        self.session_manager = SessionManager(config.MAX_HISTORY, create_session_store(config))
         
         # Initialize search tools
         self.tool_manager = ToolManager()
-        self.search_tool = CourseSearchTool(self.vector_store)
+        self.compressor = None
+        if config.CONTEXT_TOKEN_BUDGET > 0:
+            self.compressor = ContextCompressor(self.vector_store, config.CONTEXT_TOKEN_BUDGET)
+        self.search_tool = CourseSearchTool(self.vector_store, self.compressor)
         self.tool_manager.register_tool(self.search_tool)
+        
+        # Set once the embedding model is loaded and exercised
+        self.warm = threading.Event()
+        if not config.FAST_START:
+            self.warm_up()
+    
+    def _create_vector_store(self, chroma_path: str, repair_on_open: bool = True) -> VectorStore:
+        return VectorStore(chroma_path, repair_on_open=repair_on_open, **self._vector_store_settings())
+    
+    def _vector_store_settings(self) -> Dict[str, Any]:
+        """VectorStore keyword arguments from the config"""
+        return dict(
+            embedding_model=self.config.EMBEDDING_MODEL,
+            max_results=self.config.MAX_RESULTS,
+            embedding_batch_window_ms=self.config.EMBEDDING_BATCH_WINDOW_MS,
+            embedding_max_batch=self.config.EMBEDDING_MAX_BATCH,
+            embedding_workers=self.config.EMBEDDING_WORKERS,
+            index_sentences=self.config.CONTEXT_TOKEN_BUDGET > 0 and self.config.INDEX_SENTENCES,
+            hierarchical_lessons=self.config.HIERARCHICAL_TOP_LESSONS,
+            near_duplicate_threshold=self.config.NEAR_DUPLICATE_THRESHOLD,
+            hnsw_params=hnsw_tuning.load_params(self.config.HNSW_PARAMS_PATH),
+            embedding_dimensions=self.config.EMBEDDING_DIMENSIONS,
+            embedding_reduction=self.config.EMBEDDING_REDUCTION,
+            rescore_factor=self.config.EMBEDDING_RESCORE_FACTOR
+        )
+    
+    def _require_single_index(self, operation: str):
+        """Operations that read or write Chroma collections directly only work on an unsharded index"""
+        if isinstance(self.vector_store, ShardedVectorStore):
+            raise ValueError(f"{operation} is not supported with INDEX_SHARDS")
+    
+    @contextmanager
+    def _index_write(self):
+        """
+        Hold the ingest lock for an index write. With index generations the block
+        writes a new generation, published only if the block completes.
+        """
+        with self.ingest_lock, self._generation_write():
+            yield
+    
+    def _generation_write(self):
+        """A new index generation for the block (a no-op without generations); the caller holds the ingest lock"""
+        return self.generations.write() if self.generations is not None else nullcontext()
+    
+    def _index_read(self):
+        """Pin one index generation for a block of reads (a no-op without generations)"""
+        return self.generations.read() if self.generations is not None else nullcontext()
+    
+    def warm_up(self):
+        """Load the embedding model, run a warm-up embedding and create the API client"""
+        start = time.perf_counter()
+        self.vector_store.warm_up()
+        self.ai_generator.client
+        self.warm.set()
+        print(f"Warm-up finished in {time.perf_counter() - start:.1f}s")
+    
+    def start_warm_up(self) -> threading.Thread:
+        """Run warm_up() in a background thread so the server can answer health checks meanwhile"""
+        def run():
+            try:
+                self.warm_up()
+            except Exception as e:
+                print(f"Warm-up failed: {e}")
+        
+        thread = threading.Thread(target=run, name="warm-up", daemon=True)
+        thread.start()
+        return thread
     
     def add_course_document(self, file_path: str) -> Tuple[Course, int]:
         """
-        Add a single course document to the knowledge base.
+        Add a single course document to the knowledge base, replacing the
+        indexed version of the course if it already exists.
         
         Args:
             file_path: Path to the course document
@@ -38,28 +155,180 @@ class RAGSystem:
             # Process the document
             course, course_chunks = self.document_processor.process_course_document(file_path)
             
-            # Add course metadata to vector store for semantic search
-            self.vector_store.add_course_metadata(course)
-            
-            # Add course content chunks to vector store
-            self.vector_store.add_course_content(course_chunks)
+            source_hash = file_hash(file_path)
+            with self._index_write():
+                # Add the course, or swap in the new version if it is already indexed
+                self.vector_store.replace_course(course, course_chunks, os.path.basename(file_path), source_hash)
             
             return course, len(course_chunks)
         except Exception as e:
             print(f"Error processing course document {file_path}: {e}")
             return None, 0
     
-    def add_course_folder(self, folder_path: str, clear_existing: bool = False) -> Tuple[int, int]:
+    def delete_course(self, course_title: str) -> bool:
+        """
+        Remove a course and its content from the knowledge base.
+        
+        Args:
+            course_title: Exact title of the course
+            
+        Returns:
+            True if the course existed
+        """
+        if self.generations is not None and self.vector_store.get_course_version(course_title) is None:
+            return False  # Nothing to delete; skip copying the index
+        with self._index_write():
+            return self.vector_store.delete_course(course_title)
+    
+    def export_snapshot(self, path: str) -> Dict[str, Any]:
+        """
+        Write the current index to a snapshot file (see snapshot.py).
+        
+        Args:
+            path: Destination file
+            
+        Returns:
+            The snapshot header
+        """
+        self._require_single_index("Exporting a snapshot")
+        with self.ingest_lock, self._index_read():
+            return snapshot.write_snapshot(path, self.vector_store, self.config)
+    
+    def load_snapshot(self, path: str) -> int:
+        """
+        Replace the index with the contents of a snapshot file, without re-embedding.
+        
+        Args:
+            path: Snapshot file built with the same embedding model and chunking settings
+            
+        Returns:
+            Number of chunks loaded
+            
+        Raises:
+            snapshot.SnapshotError: The file is corrupt or incompatible
+        """
+        self._require_single_index("Loading a snapshot")
+        with self._index_write():
+            return snapshot.load_snapshot(path, self.vector_store, self.config)
+    
+    def tune_hnsw(self, **tuning_args) -> Dict[str, Any]:
+        """Measure HNSW settings on a copy of the index's chunk vectors (see hnsw_tuning.tune)"""
+        self._require_single_index("HNSW tuning")
+        with self._index_read():
+            return hnsw_tuning.tune(self.vector_store, **tuning_args)
+    
+    def apply_hnsw_params(self, hnsw_params: Dict[str, int]):
+        """Rebuild course_content with the given HNSW settings"""
+        self._require_single_index("Applying HNSW settings")
+        with self._index_write():
+            self.vector_store.set_hnsw_params(hnsw_params)
+    
+    def load_snapshot_if_empty(self, path: str) -> bool:
+        """
+        Load a snapshot if the index has no courses yet; returns True if it was loaded.
+        
+        A sharded index skips the snapshot (with a warning) and is built from the documents instead.
+        """
+        if not path or not os.path.exists(path) or self.vector_store.get_course_count() > 0:
+            return False
+        if isinstance(self.vector_store, ShardedVectorStore):
+            print(f"Skipping snapshot {path}: loading a snapshot is not supported with INDEX_SHARDS")
+            return False
+        chunks = self.load_snapshot(path)
+        print(f"Loaded snapshot {path} with {chunks} chunks")
+        return True
+    
+    def add_course_folder(self, folder_path: str, clear_existing: bool = False,
+                          progress: Optional[IngestionProgress] = None) -> Tuple[int, int]:
         """
         Add all course documents from a folder.
         
         Args:
             folder_path: Path to folder containing course documents
             clear_existing: Whether to clear existing data first
+            progress: Optional progress record updated after each file
             
         Returns:
             Tuple of (total courses added, total chunks created)
         """
+        progress = progress or IngestionProgress()
+        with self.ingest_lock:
+            # One generation for the whole folder, and none at all when nothing in it is new
+            # (and the embedding reduction needs no refit)
+            if self.generations is not None and (clear_existing or self._has_new_courses(folder_path)
+                                                 or self.vector_store.embedding_reduction_outdated()):
+                with self.generations.write():
+                    return self._add_course_folder(folder_path, clear_existing, progress)
+            return self._add_course_folder(folder_path, clear_existing, progress)
+    
+    @classmethod
+    def is_course_file(cls, file_name: str) -> bool:
+        """Whether a file name looks like a course document (hidden and editor temp files are not)"""
+        return not file_name.startswith('.') and file_name.lower().endswith(cls.COURSE_FILE_EXTENSIONS)
+    
+    def _course_files(self, folder_path: str) -> List[str]:
+        """Course documents in a folder, sorted by name"""
+        return [
+            file_name for file_name in sorted(os.listdir(folder_path))
+            if os.path.isfile(os.path.join(folder_path, file_name)) and self.is_course_file(file_name)
+        ]
+    
+    def sync_course_file(self, file_path: str) -> Optional[str]:
+        """
+        Bring the index in line with one course document: index its course if the
+        file is new or changed since it was indexed, or remove the course if the
+        file is gone. If an edit renamed the course, the old title is removed.
+        
+        Args:
+            file_path: Path of the course document
+            
+        Returns:
+            "added", "updated" or "deleted", or None if the index was already current
+        """
+        file_name = os.path.basename(file_path)
+        with self.ingest_lock:
+            indexed = {
+                source["source_file"]: (title, source["source_hash"])
+                for title, source in self.vector_store.get_course_sources().items()
+            }
+            previous = indexed.get(file_name)
+            
+            if not os.path.exists(file_path):
+                if previous is None:
+                    return None
+                with self._generation_write():
+                    self.vector_store.delete_course(previous[0])
+                return "deleted"
+            
+            source_hash = file_hash(file_path)
+            if previous is not None and previous[1] == source_hash:
+                return None
+            course, course_chunks = self.document_processor.process_course_document(file_path)
+            if previous is None and course.title in self.vector_store.get_existing_course_titles():
+                previous = (course.title, None)  # Indexed before sources were recorded
+            with self._generation_write():
+                self.vector_store.replace_course(course, course_chunks, file_name, source_hash)
+                if previous is not None and previous[0] != course.title:
+                    self.vector_store.delete_course(previous[0])
+            return "added" if previous is None else "updated"
+    
+    def _has_new_courses(self, folder_path: str) -> bool:
+        """Whether any document in the folder is a course the index does not have yet"""
+        if not os.path.exists(folder_path):
+            return False
+        existing_course_titles = set(self.vector_store.get_existing_course_titles())
+        for file_name in self._course_files(folder_path):
+            try:
+                course, _ = self.document_processor.process_course_document(os.path.join(folder_path, file_name))
+            except Exception:
+                continue  # Reported when the folder is ingested
+            if course and course.title not in existing_course_titles:
+                return True
+        return False
+    
+    def _add_course_folder(self, folder_path: str, clear_existing: bool,
+                           progress: IngestionProgress) -> Tuple[int, int]:
+        """Add all course documents from a folder; the caller holds the ingest lock"""
         total_courses = 0
         total_chunks = 0
         
@@ -75,41 +344,61 @@ class RAGSystem:
         # Get existing course titles to avoid re-processing
         existing_course_titles = set(self.vector_store.get_existing_course_titles())
         
+        # Find course documents up front so progress has a total
+        file_names = self._course_files(folder_path)
+        progress.files_total = len(file_names)
+        
         # Process each file in the folder
-        for file_name in os.listdir(folder_path):
+        for file_name in file_names:
             file_path = os.path.join(folder_path, file_name)
-            if os.path.isfile(file_path) and file_name.lower().endswith(('.pdf', '.docx', '.txt')):
-                try:
-                    # Check if this course might already exist
-                    # We'll process the document to get the course ID, but only add if new
-                    course, course_chunks = self.document_processor.process_course_document(file_path)
-                    
-                    if course and course.title not in existing_course_titles:
-                        # This is a new course - add it to the vector store
-                        self.vector_store.add_course_metadata(course)
-                        self.vector_store.add_course_content(course_chunks)
-                        total_courses += 1
-                        total_chunks += len(course_chunks)
-                        print(f"Added new course: {course.title} ({len(course_chunks)} chunks)")
-                        existing_course_titles.add(course.title)
-                    elif course:
-                        print(f"Course already exists: {course.title} - skipping")
-                except Exception as e:
-                    print(f"Error processing {file_name}: {e}")
+            try:
+                # Check if this course might already exist
+                # We'll process the document to get the course ID, but only add if new
+                course, course_chunks = self.document_processor.process_course_document(file_path)
+                
+                if course and course.title not in existing_course_titles:
+                    # This is a new course - add its content first; searches
+                    # within the course find it once its catalog entry is written
+                    self.vector_store.add_course_content(course_chunks)
+                    self.vector_store.add_course_metadata(course, 0, file_name, file_hash(file_path))
+                    total_courses += 1
+                    total_chunks += len(course_chunks)
+                    progress.courses_added = total_courses
+                    progress.chunks_added = total_chunks
+                    print(f"Added new course: {course.title} ({len(course_chunks)} chunks)")
+                    existing_course_titles.add(course.title)
+                elif course:
+                    print(f"Course already exists: {course.title} - skipping")
+            except Exception as e:
+                print(f"Error processing {file_name}: {e}")
+            progress.files_done += 1
+        
+        # Fit the embedding reduction once the corpus is in (or drop it when it was turned off)
+        if self.vector_store.embedding_reduction_outdated():
+            self.vector_store.update_embedding_reduction()
         
         return total_courses, total_chunks
     
-    def query(self, query: str, session_id: Optional[str] = None) -> Tuple[str, List[str]]:
+    def query(self, query: str, session_id: Optional[str] = None,
+              received_at: Optional[float] = None) -> Tuple[str, List[str]]:
         """
         Process a user query using the RAG system with tool-based search.
         
         Args:
             query: User's question
             session_id: Optional session ID for conversation context
+            received_at: time.monotonic() when the request arrived; its LLM_QUEUE_TIMEOUT
+                counts from then, including time spent waiting for a worker thread
             
         Returns:
             Tuple of (response, sources list - empty for tool-based approach)
         """
+        deadline = request_deadline(self.config.LLM_QUEUE_TIMEOUT, received_at)
+        with metrics.QUERY_SECONDS.time(), deadline, self._index_read():
+            return self._query(query, session_id)
+    
+    def _query(self, query: str, session_id: Optional[str]) -> Tuple[str, List[str]]:
+        """Answer one query; see query()"""
         # Create prompt for the AI with clear instructions
         prompt = f"""Answer this question about course materials: {query}"""
         
@@ -118,19 +407,16 @@ class RAGSystem:
         if session_id:
             history = self.session_manager.get_conversation_history(session_id)
         
-        # Generate response using AI with tools
-        response = self.ai_generator.generate_response(
-            query=prompt,
-            conversation_history=history,
-            tools=self.tool_manager.get_tool_definitions(),
-            tool_manager=self.tool_manager
-        )
-        
-        # Get sources from the search tool
-        sources = self.tool_manager.get_last_sources()
-
-        # Reset sources after retrieving them
-        self.tool_manager.reset_sources()
+        # Generate response using AI with tools; sources are collected in a
+        # context private to this query, so concurrent queries stay separate
+        with tool_context() as context:
+            response = self.ai_generator.generate_response(
+                query=prompt,
+                conversation_history=history,
+                tools=self.tool_manager.get_tool_definitions(),
+                tool_manager=self.tool_manager
+            )
+        sources = context.sources
         
         # Update conversation history
         if session_id:
@@ -139,9 +425,137 @@ class RAGSystem:
         # Return response with sources from tool searches
         return response, sources
     
+    def query_batch(self, queries: List[str], max_concurrency: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Process many independent queries, yielding each result as soon as it completes.
+        
+        Queries are handled in windows of BATCH_WINDOW_SIZE: the first Anthropic call
+        for every query in a window fans out over a bounded thread pool, all requested
+        searches in the window run as one batched embedding pass, and the final
+        Anthropic calls fan out again. Batch queries have no conversation history.
+        
+        As with query(), each query gets LLM_QUEUE_TIMEOUT of admission wait and is
+        timed in QUERY_SECONDS, both from the start of its window, and a window's
+        searches all read one index generation.
+        
+        Args:
+            queries: User questions to answer
+            max_concurrency: Maximum concurrent Anthropic calls (defaults to, and is capped
+                at, BATCH_MAX_CONCURRENCY)
+            
+        Yields:
+            Dicts with index, query, answer, sources and error (None on success),
+            in completion order rather than input order
+        """
+        concurrency = min(max_concurrency or self.config.BATCH_MAX_CONCURRENCY, self.config.BATCH_MAX_CONCURRENCY)
+        window_size = max(1, self.config.BATCH_WINDOW_SIZE)
+        tools = self.tool_manager.get_tool_definitions()
+        
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for start in range(0, len(queries), window_size):
+                window = list(enumerate(queries[start:start + window_size], start))
+                yield from self._query_window(executor, window, tools)
+    
+    def _query_window(self, executor: ThreadPoolExecutor, window: List[Tuple[int, str]],
+                      tools: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Answer one window of batch queries, batching the tool calls they request"""
+        queries = dict(window)
+        started = time.monotonic()
+        deadline = started + self.config.LLM_QUEUE_TIMEOUT
+        
+        def call(func, *args):
+            # Pool threads do not inherit the caller's context, so the deadline is set in each
+            with request_deadline(deadline - time.monotonic()):
+                return func(*args)
+        
+        def result(index: int, answer: Optional[str] = None, sources: Optional[List[str]] = None,
+                   error: Optional[str] = None) -> Dict[str, Any]:
+            metrics.QUERY_SECONDS.observe(time.monotonic() - started)
+            return {
+                "index": index,
+                "query": queries[index],
+                "answer": answer,
+                "sources": sources or [],
+                "error": error
+            }
+        
+        # Phase 1: first Anthropic call for every query
+        first_calls = {
+            executor.submit(
+                call,
+                self.ai_generator.start_response,
+                f"""Answer this question about course materials: {query}""",
+                None,
+                tools
+            ): index
+            for index, query in window
+        }
+        
+        needs_tools = []  # (index, response, api_params, tool use blocks)
+        for future in as_completed(first_calls):
+            index = first_calls[future]
+            try:
+                response, api_params = future.result()
+            except Exception as e:
+                yield result(index, error=str(e))
+                continue
+            
+            tool_calls = self.ai_generator.get_tool_calls(response)
+            metrics.TOOL_CALLS_PER_QUERY.observe(len(tool_calls))
+            if tool_calls:
+                needs_tools.append((index, response, api_params, tool_calls))
+            else:
+                yield result(index, answer=response.content[0].text)
+        
+        if not needs_tools:
+            return
+        
+        # Phase 2: execute every requested tool call in the window together, on one
+        # index generation (contexts are not held across the yields of this generator,
+        # whose consumer may resume it from another thread)
+        flat_calls = [(block.name, block.input) for _, _, _, blocks in needs_tools for block in blocks]
+        try:
+            with self._index_read(), tool_context():
+                outputs = iter(self.tool_manager.execute_tools_batch(flat_calls))
+        except Exception as e:
+            for index, _, _, _ in needs_tools:
+                yield result(index, error=f"Tool execution failed: {e}")
+            return
+        
+        # Phase 3: final Anthropic call with the tool results
+        final_calls = {}
+        for index, response, api_params, blocks in needs_tools:
+            tool_results = []
+            sources = []
+            for block in blocks:
+                content, block_sources = next(outputs)
+                tool_results.append({
+                    "type": "tool_result",
+                    "tool_use_id": block.id,
+                    "content": content
+                })
+                sources.extend(block_sources)
+            
+            future = executor.submit(
+                call,
+                self.ai_generator.complete_with_tool_results,
+                response,
+                api_params,
+                tool_results
+            )
+            final_calls[future] = (index, sources)
+        
+        for future in as_completed(final_calls):
+            index, sources = final_calls[future]
+            try:
+                yield result(index, answer=future.result(), sources=sources)
+            except Exception as e:
+                yield result(index, error=str(e))
+    
     def get_course_analytics(self) -> Dict:
         """Get analytics about the course catalog"""
-        return {
-            "total_courses": self.vector_store.get_course_count(),
-            "course_titles": self.vector_store.get_existing_course_titles()
-        }
\ No newline at end of file
+        with self._index_read():
+            return {
+                "total_courses": self.vector_store.get_course_count(),
+                "course_titles": self.vector_store.get_existing_course_titles()
+            }
\ No newline at end of file
@@ -1,6 +1,9 @@
-from typing import Dict, Any, Optional, Protocol
+from typing import Dict, Any, List, Optional, Protocol, Tuple
 from abc import ABC, abstractmethod
 from vector_store import VectorStore, SearchResults
+from context_compressor import ContextCompressor
+from tool_context import current_context, timed_call
+import metrics
 
 
 class Tool(ABC):
@@ -20,9 +23,10 @@ class Tool(ABC):
 class CourseSearchTool(Tool):
     """Tool for searching course content with semantic course name matching"""
     
-    def __init__(self, vector_store: VectorStore):
+    def __init__(self, vector_store: VectorStore, compressor: Optional[ContextCompressor] = None):
         self.store = vector_store
-        self.last_sources = []  # Track sources from last search
+        # Trims results to their query-relevant sentences before they reach Claude
+        self.compressor = compressor
     
     def get_tool_definition(self) -> Dict[str, Any]:
         """Return Anthropic tool definition for this tool"""
@@ -69,9 +73,54 @@ class CourseSearchTool(Tool):
             lesson_number=lesson_number
         )
         
+        if self.compressor is not None:
+            # Savings are counted in rag_context_tokens_total, as for batched searches
+            results = self.compressor.compress(query, results).results
+        
+        formatted, sources = self._render(results, course_name, lesson_number)
+        
+        # Sources go to the calling query's context, never to shared state
+        context = current_context()
+        if context is not None:
+            context.add_sources(sources)
+        return formatted
+    
+    def execute_batch(self, calls: List[Dict[str, Any]]) -> List[Tuple[str, List[str]]]:
+        """
+        Execute many searches at once using the vector store's batched search.
+        
+        Unlike execute(), this does not touch the tool context; each call's
+        sources are returned alongside its formatted result.
+        
+        Args:
+            calls: Keyword arguments for each search (query, course_name, lesson_number)
+            
+        Returns:
+            List of (formatted result, sources) tuples in call order
+        """
+        requests = [{
+            "query": call.get("query", ""),
+            "course_name": call.get("course_name"),
+            "lesson_number": call.get("lesson_number")
+        } for call in calls]
+        
+        all_results = self.store.search_batch(requests)
+        if self.compressor is not None:
+            all_results = [
+                self.compressor.compress(req["query"], results).results
+                for results, req in zip(all_results, requests)
+            ]
+        return [
+            self._render(results, req["course_name"], req["lesson_number"])
+            for results, req in zip(all_results, requests)
+        ]
+    
+    def _render(self, results: SearchResults, course_name: Optional[str],
+                lesson_number: Optional[int]) -> Tuple[str, List[str]]:
+        """Turn search results into the tool result text and its UI sources"""
         # Handle errors
         if results.error:
-            return results.error
+            return results.error, []
         
         # Handle empty results
         if results.is_empty():
@@ -80,12 +129,12 @@ class CourseSearchTool(Tool):
                 filter_info += f" in course '{course_name}'"
             if lesson_number:
                 filter_info += f" in lesson {lesson_number}"
-            return f"No relevant content found{filter_info}."
+            return f"No relevant content found{filter_info}.", []
         
         # Format and return results
         return self._format_results(results)
     
-    def _format_results(self, results: SearchResults) -> str:
+    def _format_results(self, results: SearchResults) -> Tuple[str, List[str]]:
         """Format search results with course and lesson context"""
         formatted = []
         sources = []  # Track sources for the UI
@@ -93,11 +142,15 @@ class CourseSearchTool(Tool):
         for doc, meta in zip(results.documents, results.metadata):
             course_title = meta.get('course_title', 'unknown')
             lesson_num = meta.get('lesson_number')
+            # Lessons of near-duplicate chunks stored as this one
+            other_lessons = [int(n) for n in meta['duplicate_lessons'].split(',')] if meta.get('duplicate_lessons') else []
             
             # Build context header
             header = f"[{course_title}"
             if lesson_num is not None:
                 header += f" - Lesson {lesson_num}"
+            if other_lessons:
+                header += f" (also lesson{'s' if len(other_lessons) > 1 else ''} {', '.join(map(str, other_lessons))})"
             header += "]"
             
             # Track source for the UI
@@ -105,13 +158,11 @@ class CourseSearchTool(Tool):
             if lesson_num is not None:
                 source += f" - Lesson {lesson_num}"
             sources.append(source)
+            sources.extend(f"{course_title} - Lesson {n}" for n in other_lessons)
             
             formatted.append(f"{header}\n{doc}")
         
-        # Store sources for retrieval
-        self.last_sources = sources
-        
-        return "\n\n".join(formatted)
+        return "\n\n".join(formatted), sources
 
 class ToolManager:
     """Manages available tools for the AI"""
@@ -137,18 +188,44 @@ class ToolManager:
         if tool_name not in self.tools:
             return f"Tool '{tool_name}' not found"
         
-        return self.tools[tool_name].execute(**kwargs)
+        metrics.TOOL_CALLS.labels(tool_name).inc()
+        with metrics.TOOL_EXECUTION.time(), timed_call(tool_name, kwargs) as call:
+            call["result"] = self.tools[tool_name].execute(**kwargs)
+        return call["result"]
     
-    def get_last_sources(self) -> list:
-        """Get sources from the last search operation"""
-        # Check all tools for last_sources attribute
-        for tool in self.tools.values():
-            if hasattr(tool, 'last_sources') and tool.last_sources:
-                return tool.last_sources
-        return []
-
-    def reset_sources(self):
-        """Reset sources from all tools that track sources"""
-        for tool in self.tools.values():
-            if hasattr(tool, 'last_sources'):
-                tool.last_sources = []
\ No newline at end of file
+    def execute_tools_batch(self, calls: List[Tuple[str, Dict[str, Any]]]) -> List[Tuple[str, List[str]]]:
+        """
+        Execute many tool calls, batching those whose tool supports execute_batch.
+        
+        Args:
+            calls: (tool name, tool input) pairs
+            
+        Returns:
+            List of (tool result, sources) tuples in call order
+        """
+        with metrics.TOOL_EXECUTION.time():
+            return self._execute_tools_batch(calls)
+    
+    def _execute_tools_batch(self, calls: List[Tuple[str, Dict[str, Any]]]) -> List[Tuple[str, List[str]]]:
+        outputs: List[Optional[Tuple[str, List[str]]]] = [None] * len(calls)
+        
+        # Group calls by tool so each batch-capable tool runs once
+        by_tool: Dict[str, List[int]] = {}
+        for i, (tool_name, _) in enumerate(calls):
+            if tool_name not in self.tools:
+                outputs[i] = (f"Tool '{tool_name}' not found", [])
+            else:
+                by_tool.setdefault(tool_name, []).append(i)
+        
+        for tool_name, indices in by_tool.items():
+            tool = self.tools[tool_name]
+            metrics.TOOL_CALLS.labels(tool_name).inc(len(indices))
+            if hasattr(tool, 'execute_batch'):
+                batch_outputs = tool.execute_batch([calls[i][1] for i in indices])
+                for i, output in zip(indices, batch_outputs):
+                    outputs[i] = output
+            else:
+                for i in indices:
+                    outputs[i] = (tool.execute(**calls[i][1]), [])
+        
+        return outputs
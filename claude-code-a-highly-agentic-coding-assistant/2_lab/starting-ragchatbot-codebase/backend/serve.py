@@ -0,0 +1,166 @@
+"""
+Pre-fork multi-worker server for the RAG backend (Unix only).
+
+The parent process loads the SentenceTransformer model once, ingests ../docs
+in a single short-lived writer process, and then forks the HTTP workers. The
+model weights are inherited copy-on-write, so N workers share one copy of
+those pages instead of each loading their own.
+
+ChromaDB's client cannot be carried across fork(), so every worker opens its
+own client on the already-built index after forking.
+
+Usage (from the backend directory):
+    uv run python serve.py --workers 4 --port 8000
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+from config import config
+
+DOCS_PATH = "../docs"
+
+
+def preload_embedding_model(model_name: str):
+    """Load the embedding model into chromadb's process-wide model cache before forking"""
+    from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+    SentenceTransformerEmbeddingFunction(model_name=model_name)
+
+
+def run_in_child(target) -> int:
+    """Run target() in a forked child and return its exit status"""
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            target()
+            code = 0
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    return os.waitstatus_to_exitcode(status)
+
+
+def ingest_documents():
+    """Single-writer startup ingestion, run before any worker opens the index"""
+    from rag_system import RAGSystem
+
+    rag_system = RAGSystem(config)
+    rag_system.load_snapshot_if_empty(config.SNAPSHOT_PATH)
+    if not os.path.exists(DOCS_PATH):
+        return
+    print("Loading initial documents...")
+    courses, chunks = rag_system.add_course_folder(DOCS_PATH, clear_existing=False)
+    print(f"Loaded {courses} courses with {chunks} chunks")
+
+
+def serve_worker(sock: socket.socket, log_level: str):
+    """Worker body: build the app (and its own Chroma client) and serve on the shared socket"""
+    import uvicorn
+
+    # Documents were already ingested by the parent's writer process
+    config.INGEST_ON_STARTUP = False
+    from app import app
+
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level))
+    server.run(sockets=[sock])
+
+
+class PreforkServer:
+    """Forks and supervises HTTP workers that share one listening socket"""
+
+    def __init__(self, sock: socket.socket, workers: int, log_level: str):
+        self.sock = sock
+        self.workers = workers
+        self.log_level = log_level
+        self.children = set()
+        self.stopping = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            # Let uvicorn install its own signal handlers in the worker
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            code = 0
+            try:
+                serve_worker(self.sock, self.log_level)
+            except BaseException as e:
+                print(f"Worker {os.getpid()} failed: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        self.children.add(pid)
+
+    def stop(self, signum, frame):
+        self.stopping = True
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+
+        for _ in range(self.workers):
+            self.spawn()
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            self.children.discard(pid)
+            if not self.stopping:
+                print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+                time.sleep(1)
+                self.spawn()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the RAG backend with pre-forked workers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    if args.workers > 1 and config.SESSION_BACKEND == "memory":
+        print("Warning: in-memory sessions are per worker; set SESSION_BACKEND = \"sqlite\" to share them")
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    if config.EMBEDDING_WORKERS > 0:
+        # The model lives in each worker's embedding processes instead
+        print(f"Embedding in {config.EMBEDDING_WORKERS} processes per worker; not preloading the model")
+    else:
+        print(f"Preloading embedding model {config.EMBEDDING_MODEL}...")
+        preload_embedding_model(config.EMBEDDING_MODEL)
+
+    if config.INGEST_ON_STARTUP and run_in_child(ingest_documents) != 0:
+        print("Error loading documents")
+
+    # Move everything allocated so far out of the GC's reach so collections in
+    # the workers do not write to (and un-share) the inherited pages
+    gc.collect()
+    gc.freeze()
+
+    print(f"Starting {args.workers} workers on http://{args.host}:{args.port}")
+    PreforkServer(sock, args.workers, args.log_level).run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+import itertools
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import List, Optional, Tuple
+
+@dataclass
+class Message:
+    """Represents a single message in a conversation"""
+    role: str     # "user" or "assistant"
+    content: str  # The message content
+
+class SessionStore(ABC):
+    """Abstract storage backend for conversation sessions"""
+
+    @abstractmethod
+    def create(self, session_id: str):
+        """Create an empty session"""
+        pass
+
+    @abstractmethod
+    def get_messages(self, session_id: str) -> Optional[List[Message]]:
+        """Return the session's messages, or None if it does not exist or has expired"""
+        pass
+
+    @abstractmethod
+    def append_messages(self, session_id: str, messages: List[Message], max_messages: int):
+        """Append messages to a session (creating it if needed), keeping only the newest max_messages"""
+        pass
+
+    @abstractmethod
+    def clear(self, session_id: str):
+        """Remove all messages from a session without deleting it"""
+        pass
+
+class InMemorySessionStore(SessionStore):
+    """Process-local session store with LRU eviction and idle expiry"""
+
+    def __init__(self, max_sessions: int = 10000, ttl_seconds: float = 3600):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        # Ordered from least to most recently used: session_id -> (last access time, messages)
+        self._sessions: "OrderedDict[str, Tuple[float, List[Message]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _purge_expired(self, now: float):
+        """Drop idle sessions; LRU order means expired entries are always at the front"""
+        while self._sessions:
+            session_id, (last_access, _) = next(iter(self._sessions.items()))
+            if now - last_access <= self.ttl_seconds:
+                break
+            del self._sessions[session_id]
+
+    def _touch(self, session_id: str, messages: List[Message], now: float):
+        """Store messages as the most recently used session and enforce the size bound"""
+        self._sessions[session_id] = (now, messages)
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def create(self, session_id: str):
+        now = time.monotonic()
+        with self._lock:
+            self._purge_expired(now)
+            self._touch(session_id, [], now)
+
+    def get_messages(self, session_id: str) -> Optional[List[Message]]:
+        now = time.monotonic()
+        with self._lock:
+            self._purge_expired(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            messages = entry[1]
+            self._touch(session_id, messages, now)
+            return list(messages)
+
+    def append_messages(self, session_id: str, messages: List[Message], max_messages: int):
+        now = time.monotonic()
+        with self._lock:
+            self._purge_expired(now)
+            entry = self._sessions.get(session_id)
+            existing = entry[1] if entry else []
+            self._touch(session_id, (existing + messages)[-max_messages:], now)
+
+    def clear(self, session_id: str):
+        now = time.monotonic()
+        with self._lock:
+            if session_id in self._sessions:
+                self._touch(session_id, [], now)
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Session store backed by a SQLite database in WAL mode.
+
+    All uvicorn workers pointing at the same database file share sessions, so
+    a conversation keeps its history whichever worker serves the next request.
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: float = 3600, purge_interval: int = 1000):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.purge_interval = purge_interval  # Writes between expired-session sweeps
+        self._writes = itertools.count(1)  # next() is atomic, so concurrent writers each get their own number
+        self._local = threading.local()
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " messages TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode; write transactions are opened explicitly with BEGIN IMMEDIATE
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _encode(messages: List[Message]) -> str:
+        return json.dumps([asdict(message) for message in messages])
+
+    @staticmethod
+    def _decode(data: str) -> List[Message]:
+        return [Message(**message) for message in json.loads(data)]
+
+    def _after_write(self, conn: sqlite3.Connection, now: float):
+        """Periodically delete expired sessions so the database stays bounded"""
+        if next(self._writes) % self.purge_interval == 0:
+            conn.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl_seconds,))
+
+    def create(self, session_id: str):
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (session_id, messages, updated_at) VALUES (?, '[]', ?)",
+            (session_id, now)
+        )
+        self._after_write(conn, now)
+
+    def get_messages(self, session_id: str) -> Optional[List[Message]]:
+        row = self._connection().execute(
+            "SELECT messages, updated_at FROM sessions WHERE session_id = ?",
+            (session_id,)
+        ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            return None
+        return self._decode(row[0])
+
+    def append_messages(self, session_id: str, messages: List[Message], max_messages: int):
+        now = time.time()
+        conn = self._connection()
+        # Read-modify-write under a write lock so concurrent workers cannot lose messages
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT messages, updated_at FROM sessions WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+            existing = []
+            if row is not None and now - row[1] <= self.ttl_seconds:
+                existing = self._decode(row[0])
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, messages, updated_at) VALUES (?, ?, ?)",
+                (session_id, self._encode((existing + messages)[-max_messages:]), now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._after_write(conn, now)
+
+    def clear(self, session_id: str):
+        self._connection().execute(
+            "UPDATE sessions SET messages = '[]', updated_at = ? WHERE session_id = ?",
+            (time.time(), session_id)
+        )
+
+def create_session_store(config) -> SessionStore:
+    """Build the session store selected by config.SESSION_BACKEND"""
+    if config.SESSION_BACKEND == "memory":
+        return InMemorySessionStore(config.SESSION_MAX_SESSIONS, config.SESSION_TTL_SECONDS)
+    if config.SESSION_BACKEND == "sqlite":
+        return SQLiteSessionStore(config.SESSION_DB_PATH, config.SESSION_TTL_SECONDS)
+    raise ValueError(f"Unknown session backend: {config.SESSION_BACKEND}")
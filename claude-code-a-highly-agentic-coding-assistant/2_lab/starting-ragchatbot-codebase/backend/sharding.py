@@ -0,0 +1,464 @@
+import itertools
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import zlib
+from concurrent.futures import Future, wait
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple, Union
+from ingest_lock import IngestLock
+from models import Course, CourseChunk, ChunkBatch
+from vector_store import VectorStore, SearchFrontend, SearchResults
+import metrics
+
+class ShardError(Exception):
+    """A call failed in an index shard process, or its shard exited while running it"""
+
+def shard_for(course_title: str, shards: int) -> int:
+    """Shard holding a course: a hash of its title that, unlike hash(), is the same in every process"""
+    return zlib.crc32(course_title.encode("utf-8")) % shards
+
+def shard_path(chroma_path: str, shard: int) -> str:
+    """Index directory of one shard"""
+    return os.path.join(chroma_path, f"shard-{shard:02d}")
+
+def merge_results(results: List[SearchResults], limit: int, query_embedding: Optional[Any] = None,
+                  error: Optional[str] = None) -> SearchResults:
+    """
+    Merge the results of one search on several shards.
+
+    Args:
+        results: Each shard's results
+        limit: Maximum results to keep, the closest first
+        query_embedding: Embedding the search was run with
+        error: Why a shard's results are missing, if one is
+
+    Returns:
+        The closest results of all shards; an error only when there are none
+    """
+    rows = [row for result in results if not result.error
+            for row in zip(result.distances, result.documents, result.metadata,
+                           result.ids or [""] * len(result.documents))]
+    if not rows:
+        errors = [result.error for result in results if result.error] + ([error] if error else [])
+        if errors:
+            return SearchResults.empty(errors[0])
+    rows.sort(key=lambda row: row[0])
+    rows = rows[:limit]
+    return SearchResults(
+        documents=[document for _, document, _, _ in rows],
+        metadata=[metadata for _, _, metadata, _ in rows],
+        distances=[distance for distance, _, _, _ in rows],
+        ids=[chunk_id for _, _, _, chunk_id in rows],
+        query_embedding=query_embedding
+    )
+
+def _shard_main(chroma_path: str, store_settings: Dict[str, Any], conn):
+    """Body of a shard process: open the shard's VectorStore, then run method calls from the pipe"""
+    # Ctrl+C goes to the whole process group; let the parent decide when shards stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    store = None
+    open_error = None
+    try:
+        store = VectorStore(chroma_path, **store_settings)
+    except Exception as e:
+        # Report the failure on every call instead of crashing into a restart loop
+        open_error = f"could not open {chroma_path}: {e}"
+
+    while True:
+        try:
+            call_id, method, args = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            if open_error:
+                raise RuntimeError(open_error)
+            conn.send((call_id, None, getattr(store, method)(*args)))
+        except Exception as e:
+            conn.send((call_id, f"{type(e).__name__}: {e}", None))
+
+@dataclass
+class _Call:
+    id: int
+    method: str
+    future: Future = field(default_factory=Future)
+    sent_at: float = 0.0
+
+@dataclass
+class _Shard:
+    index: int
+    path: str
+    process: Optional[multiprocessing.Process] = None
+    conn: Optional[object] = None
+    started_at: float = 0.0
+    pending: Dict[int, _Call] = field(default_factory=dict)
+    send_lock: threading.Lock = field(default_factory=threading.Lock)
+
+class ShardedVectorStore(SearchFrontend):
+    """
+    Stands in for a VectorStore whose courses are partitioned over shard processes.
+
+    Each course lives in one shard, chosen by a hash of its title, and each shard
+    process owns a VectorStore over its own index directory, so every process
+    holds only its share of the index and shards search on their own cores.
+    Queries are embedded once, here. A search within one course goes to that
+    course's shard; any other search goes to every shard at once, and their
+    results are merged by distance. Shards that have not answered within the
+    timeout are left out of the merged result, so a slow shard costs that search
+    some recall rather than latency. Writes and catalog reads wait for their
+    shards however long they take.
+
+    A shard process that exits is restarted and reopens its index from disk;
+    the calls it was running fail.
+
+    Shards open their indexes without repairing them (repair_on_open off), since
+    every process running a ShardedVectorStore, e.g. each serve.py worker, starts
+    its own shards over the same directories. Repairs are writes, so they run
+    once at startup under the ingest lock, on the shards that need them.
+    """
+
+    def __init__(self, chroma_path: str, shards: int, timeout: float = 0.5,
+                 ingest_lock: Optional[IngestLock] = None, **store_settings):
+        """
+        Args:
+            chroma_path: Directory holding the shards' index directories
+            shards: Number of shard processes
+            timeout: Seconds a search waits for the shards before merging the results it has
+            ingest_lock: Lock serializing index writers, held while shards are repaired
+                (default: the lock of chroma_path)
+            store_settings: VectorStore keyword arguments (embedding_model, max_results, ...)
+        """
+        self.chroma_path = chroma_path
+        self.timeout = timeout
+        self.max_results = store_settings.get("max_results", 5)
+
+        # Queries are embedded here; shards only embed the documents they ingest
+        self._init_embedders(
+            store_settings["embedding_model"],
+            embedding_workers=store_settings.get("embedding_workers", 0),
+            embedding_batch_window_ms=store_settings.get("embedding_batch_window_ms", 0.0),
+            embedding_max_batch=store_settings.get("embedding_max_batch", 64)
+        )
+        self._store_settings = {**store_settings, "embedding_workers": 0, "embedding_batch_window_ms": 0.0,
+                                "repair_on_open": False}
+
+        # Spawn rather than fork: the parent may already hold torch threads or a Chroma client
+        self._context = multiprocessing.get_context("spawn")
+        self._call_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._shards = [_Shard(index, shard_path(chroma_path, index)) for index in range(shards)]
+        for shard in self._shards:
+            self._start(shard)
+        self._repair_shards(ingest_lock or IngestLock(chroma_path))
+
+    def _repair_shards(self, ingest_lock: IngestLock):
+        """Run repair_index() on the shards that need it, holding the ingest lock"""
+        if not self._shards_needing_repair():
+            return
+        with ingest_lock:
+            # Another process may have repaired them while this one waited for the lock
+            indexes = self._shards_needing_repair()
+            futures = [self._call(index, "repair_index") for index in indexes]
+            for index, future in zip(indexes, futures):
+                print(f"Repairing index shard {index}")
+                try:
+                    future.result()
+                except ShardError as e:
+                    print(f"Could not repair index shard {index}: {e}")
+
+    def _shards_needing_repair(self) -> List[int]:
+        futures = [self._call(index, "needs_repair") for index in range(len(self._shards))]
+        indexes = []
+        for index, future in enumerate(futures):
+            try:
+                if future.result():
+                    indexes.append(index)
+            except ShardError as e:
+                # A shard that could not open its index reports that on every call
+                print(f"Could not check index shard {index}: {e}")
+        return indexes
+
+    def _start(self, shard: _Shard):
+        """Spawn a shard's process, outside the store lock, and then route calls to it"""
+        os.makedirs(shard.path, exist_ok=True)
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_shard_main,
+            args=(shard.path, self._store_settings, child_conn),
+            name=f"index-shard-{shard.index}",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                shard.process, shard.conn, shard.started_at = process, parent_conn, time.monotonic()
+        if closed:
+            # The store was closed while the process started
+            parent_conn.close()
+            process.terminate()
+            process.join(timeout=5)
+            return
+        threading.Thread(
+            target=self._read_results,
+            args=(shard, parent_conn),
+            name=f"index-shard-{shard.index}-results",
+            daemon=True
+        ).start()
+
+    def _read_results(self, shard: _Shard, conn):
+        while True:
+            try:
+                call_id, error, result = conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                call = shard.pending.pop(call_id, None)
+            if call is None:
+                continue
+            if call.method == "search_embedded_batch":
+                metrics.SHARD_SEARCH.labels(shard.index).observe(time.perf_counter() - call.sent_at)
+            if error:
+                call.future.set_exception(ShardError(f"Index shard {shard.index}: {error}"))
+            else:
+                call.future.set_result(result)
+        self._handle_exit(shard)
+
+    def _handle_exit(self, shard: _Shard):
+        """Fail the calls of a dead shard and restart it"""
+        with self._lock:
+            orphaned = list(shard.pending.values())
+            shard.pending = {}
+            shard.conn = None  # Calls fail at once until restarted
+            closed = self._closed
+        for call in orphaned:
+            call.future.set_exception(ShardError(f"Index shard {shard.index} exited while running {call.method}"))
+        if closed:
+            return
+
+        shard.process.join(timeout=5)
+        print(f"Index shard {shard.index} exited (code {shard.process.exitcode}), restarting")
+        metrics.SHARD_RESTARTS.inc()
+        # Back off if the shard keeps dying right after starting
+        if time.monotonic() - shard.started_at < 5:
+            time.sleep(1)
+        self._start(shard)
+
+    def _call(self, index: int, method: str, *args) -> Future:
+        """Call a VectorStore method in a shard process; the future fails with ShardError"""
+        shard = self._shards[index]
+        call = _Call(next(self._call_ids), method)
+        with self._lock:
+            if self._closed or shard.conn is None:
+                state = "closed" if self._closed else "restarting"
+                call.future.set_exception(ShardError(f"Index shard {index} is {state}"))
+                return call.future
+            shard.pending[call.id] = call
+            conn = shard.conn
+        call.sent_at = time.perf_counter()
+        try:
+            with shard.send_lock:
+                conn.send((call.id, method, args))
+        except Exception as e:
+            # The call never reached the shard (if the shard died, its results thread may have failed it already)
+            with self._lock:
+                unsent = shard.pending.pop(call.id, None)
+            if unsent is not None:
+                call.future.set_exception(ShardError(f"Index shard {index}: could not send {method}: {e}"))
+        return call.future
+
+    def _on_all(self, method: str, *args) -> List[Any]:
+        """Call a method on every shard at once and wait for all of their results"""
+        futures = [self._call(index, method, *args) for index in range(len(self._shards))]
+        return [future.result() for future in futures]
+
+    def _on_course(self, course_title: str, method: str, *args) -> Any:
+        """Call a method on the shard holding a course and wait for its result"""
+        return self._call(self.shard_for(course_title), method, *args).result()
+
+    def shard_for(self, course_title: str) -> int:
+        return shard_for(course_title, len(self._shards))
+
+    def search_embedded_batch(self, requests: List[Dict[str, Any]]) -> List[SearchResults]:
+        """
+        Run many searches with embedded queries on the shards holding their courses.
+
+        Args:
+            requests: Dicts with the keyword arguments accepted by search_embedded()
+                      (query_embedding, and optionally course_title, lesson_number, limit)
+
+        Returns:
+            SearchResults for each request, in request order, merged over the shards
+            that answered within the timeout
+        """
+        # A search within one course goes to its shard, any other search to every shard;
+        # each shard gets all of its searches in one call
+        by_shard: Dict[int, List[int]] = {}
+        for i, req in enumerate(requests):
+            course_title = req.get("course_title")
+            for index in ([self.shard_for(course_title)] if course_title else range(len(self._shards))):
+                by_shard.setdefault(index, []).append(i)
+
+        with metrics.CHROMA_QUERY.time():
+            futures = {
+                index: self._call(index, "search_embedded_batch", [requests[i] for i in indices])
+                for index, indices in by_shard.items()
+            }
+            done, _ = wait(futures.values(), timeout=self.timeout)
+
+        answers: Dict[int, List[SearchResults]] = {i: [] for i in range(len(requests))}
+        errors: Dict[int, str] = {}
+        for index, future in futures.items():
+            indices = by_shard[index]
+            if future not in done:
+                metrics.SHARD_TIMEOUTS.labels(index).inc()
+                for i in indices:
+                    errors.setdefault(i, f"Search error: index shard {index} did not answer in time")
+                continue
+            try:
+                shard_results = future.result()
+            except ShardError as e:
+                print(f"Search failed: {e}")
+                for i in indices:
+                    errors.setdefault(i, f"Search error: {e}")
+                continue
+            for i, result in zip(indices, shard_results):
+                answers[i].append(result)
+
+        return [
+            merge_results(answers[i], req.get("limit") or self.max_results, req["query_embedding"], errors.get(i))
+            for i, req in enumerate(requests)
+        ]
+
+    def _resolve_course_names(self, course_names: List[str]) -> Dict[str, str]:
+        """Resolve course names against every shard's catalog, mapping each name to the closest title"""
+        if not course_names:
+            return {}
+        try:
+            name_embeddings = self.embedder(course_names)
+        except Exception as e:
+            print(f"Error resolving course names: {e}")
+            return {}
+
+        futures = [self._call(index, "match_course_names", name_embeddings) for index in range(len(self._shards))]
+        done, _ = wait(futures, timeout=self.timeout)
+        best: Dict[str, Tuple[str, float]] = {}
+        for index, future in enumerate(futures):
+            if future not in done:
+                metrics.SHARD_TIMEOUTS.labels(index).inc()
+                continue
+            try:
+                matches = future.result()
+            except ShardError as e:
+                print(f"Error resolving course names: {e}")
+                continue
+            for course_name, match in zip(course_names, matches):
+                if match is not None and (course_name not in best or match[1] < best[course_name][1]):
+                    best[course_name] = match
+        return {course_name: match[0] for course_name, match in best.items()}
+
+    def replace_course(self, course: Course, chunks: Union[ChunkBatch, List[CourseChunk]],
+                       source_file: Optional[str] = None, source_hash: Optional[str] = None) -> int:
+        """Add or replace a course in its shard (see VectorStore.replace_course)"""
+        return self._on_course(course.title, "replace_course", course, chunks, source_file, source_hash)
+
+    def delete_course(self, course_title: str) -> bool:
+        return self._on_course(course_title, "delete_course", course_title)
+
+    def add_course_metadata(self, course: Course, version: int = 0,
+                            source_file: Optional[str] = None, source_hash: Optional[str] = None):
+        self._on_course(course.title, "add_course_metadata", course, version, source_file, source_hash)
+
+    def add_course_content(self, chunks: Union[ChunkBatch, List[CourseChunk]], version: int = 0,
+                           known_embeddings: Optional[Dict[str, Any]] = None, active: bool = True):
+        """Add chunks to the shards of their courses, each shard's part in parallel"""
+        if not isinstance(chunks, ChunkBatch):
+            chunks = ChunkBatch.from_chunks(chunks)
+        title_shards = [self.shard_for(title) for title in chunks.titles]
+        by_shard: Dict[int, ChunkBatch] = {}
+        if len(set(title_shards)) == 1:
+            by_shard[title_shards[0]] = chunks
+        else:
+            for i in range(len(chunks)):
+                by_shard.setdefault(title_shards[chunks.title_ids[i]], ChunkBatch()).append(
+                    chunks.content(i), chunks.course_title(i), chunks.lesson_number(i), chunks.chunk_indexes[i]
+                )
+        futures = [self._call(index, "add_course_content", batch, version, known_embeddings, active)
+                   for index, batch in by_shard.items()]
+        for future in futures:
+            future.result()
+
+    def clear_all_data(self):
+        self._on_all("clear_all_data")
+
+    def build_missing_lesson_centroids(self):
+        self._on_all("build_missing_lesson_centroids")
+
+    def warm_index(self):
+        self._on_all("warm_index")
+
+    def embedding_reduction_outdated(self) -> bool:
+        return any(self._on_all("embedding_reduction_outdated"))
+
+    def update_embedding_reduction(self):
+        """Fit each shard's embedding reduction on its own chunks, where it is outdated"""
+        outdated = [index for index, stale in enumerate(self._on_all("embedding_reduction_outdated")) if stale]
+        futures = [self._call(index, "update_embedding_reduction") for index in outdated]
+        for future in futures:
+            future.result()
+
+    def get_sentence_embeddings(self, chunk_ids: List[str]) -> Dict[str, Tuple[List[str], Any]]:
+        # Chunk ids do not name their course unambiguously, so every shard is asked
+        cached = {}
+        for shard_cached in self._on_all("get_sentence_embeddings", list(chunk_ids)):
+            cached.update(shard_cached)
+        return cached
+
+    def get_course_version(self, course_title: str) -> Optional[int]:
+        return self._on_course(course_title, "get_course_version", course_title)
+
+    def get_existing_course_titles(self) -> List[str]:
+        return [title for titles in self._on_all("get_existing_course_titles") for title in titles]
+
+    def get_course_count(self) -> int:
+        return sum(self._on_all("get_course_count"))
+
+    def get_all_courses_metadata(self) -> List[Dict[str, Any]]:
+        return [metadata for metadatas in self._on_all("get_all_courses_metadata") for metadata in metadatas]
+
+    def get_course_sources(self) -> Dict[str, Dict[str, str]]:
+        sources = {}
+        for shard_sources in self._on_all("get_course_sources"):
+            sources.update(shard_sources)
+        return sources
+
+    def get_course_link(self, course_title: str) -> Optional[str]:
+        return self._on_course(course_title, "get_course_link", course_title)
+
+    def get_lesson_link(self, course_title: str, lesson_number: int) -> Optional[str]:
+        return self._on_course(course_title, "get_lesson_link", course_title, lesson_number)
+
+    def shard_pids(self) -> List[Optional[int]]:
+        """Process id of every shard, in shard order"""
+        return [shard.process.pid if shard.process is not None else None for shard in self._shards]
+
+    def close(self):
+        """Stop every shard process; pending calls fail. The embedding model and worker pool are left running."""
+        with self._lock:
+            self._closed = True
+            shards = list(self._shards)
+        for shard in shards:
+            if shard.conn is not None:
+                try:
+                    shard.conn.close()
+                except OSError:
+                    pass
+        for shard in shards:
+            shard.process.join(timeout=5)
+            if shard.process.is_alive():
+                shard.process.terminate()
@@ -0,0 +1,403 @@
+"""
+Index snapshots: the whole retrieval state in one file.
+
+A snapshot holds the course catalog, every active chunk's text, id and
+metadata, the sentences of those chunks (for context compression), and the
+embedding vectors of all three, so a new server can load a snapshot built
+elsewhere (e.g. in CI) instead of re-embedding docs/.
+
+File layout (little-endian):
+    prefix   magic "RAGSNAP\\0", format version (u32), flags (u32),
+             header length (u64), SHA-256 of the header (32 bytes)
+    header   UTF-8 JSON: build settings, catalog, chunk ids and metadata,
+             and a table of sections with offset, dtype, shape and SHA-256
+    sections raw arrays, each 64-byte aligned so they can be used in place
+             from a memory map: catalog_vectors, content_vectors and
+             sentence_vectors (float32), content_text and sentence_text
+             (UTF-8 bytes), content_text_offsets and sentence_text_offsets (u64)
+
+Usage (from the backend directory):
+    uv run python snapshot.py export index.snap --docs ../docs
+    uv run python snapshot.py info index.snap
+    uv run python snapshot.py import index.snap
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+MAGIC = b"RAGSNAP\x00"
+FORMAT_VERSION = 1
+PREFIX = struct.Struct("<8sIIQ32s")
+ALIGNMENT = 64
+
+# Build settings that must match the server's config for a snapshot to be usable
+COMPATIBILITY_FIELDS = ("embedding_model", "chunk_size", "chunk_overlap")
+
+
+class SnapshotError(Exception):
+    """A snapshot file is corrupt, of an unknown format, or incompatible with this server"""
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _read_collection(collection, page_size: int = 1000) -> Dict[str, list]:
+    """Read every record of a collection, a page at a time"""
+    records = {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+    offset = 0
+    while True:
+        page = collection.get(
+            include=["documents", "metadatas", "embeddings"],
+            limit=page_size,
+            offset=offset
+        )
+        if not page["ids"]:
+            break
+        records["ids"].extend(page["ids"])
+        records["documents"].extend(page["documents"])
+        records["metadatas"].extend(page["metadatas"])
+        records["embeddings"].extend(page["embeddings"])
+        offset += len(page["ids"])
+    return records
+
+
+def _vectors(embeddings: list, dim: int) -> np.ndarray:
+    if not len(embeddings):
+        return np.zeros((0, dim), dtype="<f4")
+    return np.asarray(embeddings, dtype="<f4").reshape(len(embeddings), -1)
+
+
+def _text_arrays(texts: List[str]):
+    """UTF-8 bytes of texts back to back, and the offsets array that splits them"""
+    encoded = [text.encode("utf-8") for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    offsets[1:] = np.cumsum([len(text) for text in encoded], dtype="<u8")
+    return np.frombuffer(b"".join(encoded), dtype="u1"), offsets
+
+
+def write_snapshot(path: str, vector_store, config) -> Dict[str, Any]:
+    """
+    Write the active contents of a vector store to a snapshot file.
+
+    Only active course versions are included; leftovers of replaced versions are not.
+    Sentence embeddings are included when the store has them (INDEX_SENTENCES).
+    The file is written to a temporary name and renamed, so readers never see a partial file.
+
+    Args:
+        path: Destination file
+        vector_store: VectorStore to export
+        config: Config whose embedding and chunking settings the snapshot records
+
+    Returns:
+        The snapshot header
+    """
+    catalog = _read_collection(vector_store.course_catalog)
+    content = _read_collection(vector_store.course_content)
+    sentences = _read_collection(vector_store.chunk_sentences)
+
+    active = {
+        vector_store.version_key(title, metadata.get("version", 0))
+        for title, metadata in zip(catalog["ids"], catalog["metadatas"])
+    }
+    keep = [i for i, metadata in enumerate(content["metadatas"]) if metadata.get("course_version") in active]
+    keep_sentences = [i for i, metadata in enumerate(sentences["metadatas"])
+                      if metadata.get("course_version") in active]
+
+    catalog_vectors = _vectors(catalog["embeddings"], 0)
+    # Full-width vectors, so a snapshot loads into an index with any embedding reduction
+    full_vectors = vector_store.full_embeddings(content["embeddings"], content["metadatas"])
+    content_vectors = _vectors([full_vectors[i] for i in keep], catalog_vectors.shape[1])
+    content_text, content_text_offsets = _text_arrays([content["documents"][i] for i in keep])
+    sentence_vectors = _vectors([sentences["embeddings"][i] for i in keep_sentences], catalog_vectors.shape[1])
+    sentence_text, sentence_text_offsets = _text_arrays([sentences["documents"][i] for i in keep_sentences])
+
+    arrays = {
+        "catalog_vectors": catalog_vectors,
+        "content_vectors": content_vectors,
+        "content_text": content_text,
+        "content_text_offsets": content_text_offsets,
+        "sentence_vectors": sentence_vectors,
+        "sentence_text": sentence_text,
+        "sentence_text_offsets": sentence_text_offsets,
+    }
+
+    sections = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = _align(offset)
+        data = array.tobytes()
+        sections[name] = {
+            "offset": offset,  # Relative to the start of the data area
+            "length": len(data),
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "sha256": hashlib.sha256(data).hexdigest()
+        }
+        offset += len(data)
+
+    header = {
+        "format_version": FORMAT_VERSION,
+        "created_at": time.time(),
+        "embedding_model": config.EMBEDDING_MODEL,
+        "embedding_dim": int(catalog_vectors.shape[1]) if catalog_vectors.size else 0,
+        "chunk_size": config.CHUNK_SIZE,
+        "chunk_overlap": config.CHUNK_OVERLAP,
+        "catalog": {
+            "ids": catalog["ids"],
+            "documents": catalog["documents"],
+            "metadatas": catalog["metadatas"]
+        },
+        "content": {
+            "ids": [content["ids"][i] for i in keep],
+            "metadatas": [content["metadatas"][i] for i in keep]
+        },
+        "sentences": {
+            "ids": [sentences["ids"][i] for i in keep_sentences],
+            "metadatas": [sentences["metadatas"][i] for i in keep_sentences]
+        },
+        "sections": sections
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = _align(PREFIX.size + len(header_bytes))
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(PREFIX.pack(MAGIC, FORMAT_VERSION, 0, len(header_bytes),
+                            hashlib.sha256(header_bytes).digest()))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(data_start + sections[name]["offset"])
+            f.write(array.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    return header
+
+
+class Snapshot:
+    """A snapshot file opened read-only through a memory map; sections are numpy views into it"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            if len(self._mmap) < PREFIX.size:
+                raise SnapshotError(f"{path} is too short to be a snapshot")
+            magic, version, _, header_length, header_sha256 = PREFIX.unpack_from(self._mmap, 0)
+            if magic != MAGIC:
+                raise SnapshotError(f"{path} is not a snapshot file")
+            if version != FORMAT_VERSION:
+                raise SnapshotError(f"Unsupported snapshot format version {version} (expected {FORMAT_VERSION})")
+
+            header_bytes = self._mmap[PREFIX.size:PREFIX.size + header_length]
+            if hashlib.sha256(header_bytes).digest() != header_sha256:
+                raise SnapshotError(f"{path} has a corrupt header")
+        except SnapshotError:
+            self.close()
+            raise
+        self.header: Dict[str, Any] = json.loads(header_bytes)
+        self._data_start = _align(PREFIX.size + header_length)
+
+    def close(self):
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Arrays returned by section() still use the map; it is unmapped once they are released
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def section(self, name: str) -> np.ndarray:
+        """Zero-copy view of a section"""
+        info = self.header["sections"][name]
+        dtype = np.dtype(info["dtype"])
+        count = info["length"] // dtype.itemsize
+        start = self._data_start + info["offset"]
+        if start + info["length"] > len(self._mmap):
+            raise SnapshotError(f"{self.path} is truncated")
+        return np.frombuffer(self._mmap, dtype=dtype, count=count, offset=start).reshape(info["shape"])
+
+    def verify(self):
+        """Check every section against its recorded SHA-256"""
+        for name, info in self.header["sections"].items():
+            start = self._data_start + info["offset"]
+            if hashlib.sha256(self._mmap[start:start + info["length"]]).hexdigest() != info["sha256"]:
+                raise SnapshotError(f"{self.path}: section {name} is corrupt")
+
+    def check_compatible(self, config):
+        """Raise SnapshotError unless the snapshot was built with this config's embedding and chunking settings"""
+        expected = {
+            "embedding_model": config.EMBEDDING_MODEL,
+            "chunk_size": config.CHUNK_SIZE,
+            "chunk_overlap": config.CHUNK_OVERLAP
+        }
+        mismatched = [
+            f"{field}={self.header.get(field)!r} (server uses {expected[field]!r})"
+            for field in COMPATIBILITY_FIELDS
+            if self.header.get(field) != expected[field]
+        ]
+        if mismatched:
+            raise SnapshotError(f"Snapshot is incompatible: {', '.join(mismatched)}")
+
+    @property
+    def chunk_count(self) -> int:
+        return len(self.header["content"]["ids"])
+
+    @property
+    def sentence_count(self) -> int:
+        # Snapshots written before sentences were exported have no "sentences" entry
+        return len(self.header.get("sentences", {}).get("ids", []))
+
+    def texts(self) -> List[str]:
+        """Decode every chunk text"""
+        return self._decode_texts("content_text", self.chunk_count)
+
+    def sentence_texts(self) -> List[str]:
+        """Decode every sentence text"""
+        return self._decode_texts("sentence_text", self.sentence_count)
+
+    def _decode_texts(self, name: str, count: int) -> List[str]:
+        blob = self.section(name)
+        offsets = self.section(f"{name}_offsets")
+        return [bytes(blob[offsets[i]:offsets[i + 1]]).decode("utf-8") for i in range(count)]
+
+
+def load_snapshot(path: str, vector_store, config, verify: bool = True) -> int:
+    """
+    Replace the contents of a vector store with a snapshot's.
+
+    Vectors are added as stored, so nothing is re-embedded. Chunks are added
+    before the catalog, which is what makes courses visible to searches. When
+    the store indexes sentences and the snapshot has none (it predates them, or
+    was exported without INDEX_SENTENCES), they are embedded from the chunks here
+    rather than on every compressed search.
+
+    Args:
+        path: Snapshot file
+        vector_store: VectorStore to load into (its existing data is cleared)
+        config: Server config to check the snapshot against
+        verify: Check section checksums before loading
+
+    Returns:
+        Number of chunks loaded
+
+    Raises:
+        SnapshotError: The file is corrupt or was built with different settings
+    """
+    with Snapshot(path) as snapshot:
+        snapshot.check_compatible(config)
+        if verify:
+            snapshot.verify()
+
+        vector_store.clear_all_data()
+        batch_size = vector_store.client.get_max_batch_size()
+
+        content = snapshot.header["content"]
+        vectors = snapshot.section("content_vectors")
+        texts = snapshot.texts()
+        for start in range(0, snapshot.chunk_count, batch_size):
+            end = start + batch_size
+            vector_store.course_content.add(
+                ids=content["ids"][start:end],
+                embeddings=vectors[start:end],
+                documents=texts[start:end],
+                # Only active chunks are exported; older snapshots predate the flag
+                metadatas=[{**metadata, "active": True} for metadata in content["metadatas"][start:end]]
+            )
+
+        if snapshot.sentence_count:
+            sentences = snapshot.header["sentences"]
+            sentence_vectors = snapshot.section("sentence_vectors")
+            sentence_texts = snapshot.sentence_texts()
+            for start in range(0, snapshot.sentence_count, batch_size):
+                end = start + batch_size
+                vector_store.chunk_sentences.add(
+                    ids=sentences["ids"][start:end],
+                    embeddings=sentence_vectors[start:end],
+                    documents=sentence_texts[start:end],
+                    metadatas=sentences["metadatas"][start:end]
+                )
+        elif vector_store.index_sentences:
+            for start in range(0, snapshot.chunk_count, batch_size):
+                end = start + batch_size
+                vector_store.add_sentence_embeddings(content["ids"][start:end], texts[start:end],
+                                                     content["metadatas"][start:end])
+
+        catalog = snapshot.header["catalog"]
+        if catalog["ids"]:
+            vector_store.course_catalog.add(
+                ids=catalog["ids"],
+                embeddings=snapshot.section("catalog_vectors"),
+                documents=catalog["documents"],
+                metadatas=catalog["metadatas"]
+            )
+        # Lesson centroids are not part of the snapshot; they are cheap to rebuild from the chunk vectors
+        vector_store.build_missing_lesson_centroids()
+        # Vectors are loaded at full width; a configured reduction is fitted on them
+        if vector_store.embedding_reduction_outdated():
+            vector_store.update_embedding_reduction()
+        return snapshot.chunk_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export, inspect and load index snapshots")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="Write the index at CHROMA_PATH to a snapshot")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--docs", help="Ingest this folder into the index first")
+    info_parser = commands.add_parser("info", help="Verify a snapshot and print its settings")
+    info_parser.add_argument("path")
+    import_parser = commands.add_parser("import", help="Replace the index at CHROMA_PATH with a snapshot")
+    import_parser.add_argument("path")
+    args = parser.parse_args()
+
+    from config import config
+
+    if args.command == "info":
+        with Snapshot(args.path) as snapshot:
+            snapshot.verify()
+            header = snapshot.header
+            print(json.dumps({
+                "format_version": header["format_version"],
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(header["created_at"])),
+                **{field: header[field] for field in COMPATIBILITY_FIELDS},
+                "embedding_dim": header["embedding_dim"],
+                "courses": len(header["catalog"]["ids"]),
+                "chunks": snapshot.chunk_count,
+                "sentences": snapshot.sentence_count,
+                "size_bytes": os.path.getsize(args.path)
+            }, indent=2))
+        return 0
+
+    from rag_system import RAGSystem
+    rag_system = RAGSystem(config)
+    start = time.perf_counter()
+    if args.command == "export":
+        if args.docs:
+            rag_system.add_course_folder(args.docs)
+        header = rag_system.export_snapshot(args.path)
+        print(f"Wrote {len(header['content']['ids'])} chunks of {len(header['catalog']['ids'])} courses "
+              f"to {args.path} in {time.perf_counter() - start:.1f}s")
+    else:
+        chunks = rag_system.load_snapshot(args.path)
+        print(f"Loaded {chunks} chunks from {args.path} in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
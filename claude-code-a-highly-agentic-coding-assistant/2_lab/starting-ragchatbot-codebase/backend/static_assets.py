@@ -0,0 +1,178 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+from fastapi.staticfiles import StaticFiles
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # Optional: without it assets are served gzip-compressed only
+    brotli = None
+
+# Assets at least this large are precompressed; smaller ones gain nothing
+MIN_COMPRESS_SIZE = 256
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+# src="..." and href="..." attributes pointing at a local file, with an optional ?query
+ASSET_REFERENCE = re.compile(r'(?P<attr>(?:src|href)=")(?P<path>[^":?#]+)(?:\?[^"]*)?(?P<end>")')
+
+@dataclass
+class StaticAsset:
+    """One frontend file held in memory with its precompressed variants"""
+    content_type: str
+    etag: str                                   # Content hash, quoted per RFC 9110
+    cache_control: str
+    bodies: Dict[str, bytes] = field(default_factory=dict)  # Content-Encoding ("identity", "gzip", "br") -> body
+
+    def select(self, accept_encoding: str) -> Tuple[str, bytes]:
+        """Pick the smallest encoding the client accepts"""
+        accepted = _parse_accept_encoding(accept_encoding)
+        for encoding in ("br", "gzip"):
+            if encoding in self.bodies and accepted.get(encoding, accepted.get("*", 0)) > 0:
+                return encoding, self.bodies[encoding]
+        return "identity", self.bodies["identity"]
+
+def _parse_accept_encoding(header: str) -> Dict[str, float]:
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison, as If-None-Match requires"""
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+class ProductionStaticFiles(StaticFiles):
+    """
+    Serves the frontend from memory with precompressed, fingerprinted assets.
+
+    At startup every file is read once and gzip- (and, when the brotli package is
+    installed, brotli-) compressed. Assets referenced from HTML pages are also
+    served under a fingerprinted name (script.<hash>.js) with a one-year immutable
+    Cache-Control, and the HTML is rewritten to use those names. HTML pages and the
+    original names are served with no-cache, so browsers revalidate them and get
+    304 Not Modified when their strong ETag still matches.
+
+    Files added after startup are not picked up; use DevStaticFiles while editing.
+    """
+
+    def __init__(self, directory: str, html: bool = True):
+        super().__init__(directory=directory, html=html)
+        self.assets: Dict[str, StaticAsset] = {}
+        self.fingerprinted: Dict[str, str] = {}  # Original path -> fingerprinted path
+        self._load(directory)
+
+    def _load(self, directory: str):
+        files = {}
+        for root, _, names in os.walk(directory):
+            for name in names:
+                full_path = os.path.join(root, name)
+                rel_path = os.path.relpath(full_path, directory).replace(os.sep, "/")
+                with open(full_path, "rb") as f:
+                    files[rel_path] = f.read()
+
+        # Fingerprint everything except HTML pages, which keep stable URLs
+        for rel_path, data in files.items():
+            if rel_path.endswith(".html"):
+                continue
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            stem, ext = os.path.splitext(rel_path)
+            fingerprinted_path = f"{stem}.{digest}{ext}"
+            self.fingerprinted[rel_path] = fingerprinted_path
+            self.assets[fingerprinted_path] = self._build(fingerprinted_path, data, IMMUTABLE_CACHE)
+
+        for rel_path, data in files.items():
+            if rel_path.endswith(".html"):
+                data = self._rewrite_references(rel_path, data)
+            self.assets[rel_path] = self._build(rel_path, data, REVALIDATE_CACHE)
+
+    def _rewrite_references(self, page_path: str, html: bytes) -> bytes:
+        """Point src/href attributes of a page at the fingerprinted asset names"""
+        page_dir = posixpath.dirname(page_path)
+
+        def replace(match: re.Match) -> str:
+            path = match.group("path")
+            target = posixpath.normpath(posixpath.join(page_dir, path))
+            if path.startswith("/") or target not in self.fingerprinted:
+                return match.group(0)
+            new_path = posixpath.join(posixpath.dirname(path), posixpath.basename(self.fingerprinted[target]))
+            return f"{match.group('attr')}{new_path}{match.group('end')}"
+
+        return ASSET_REFERENCE.sub(replace, html.decode("utf-8")).encode("utf-8")
+
+    @staticmethod
+    def _build(path: str, data: bytes, cache_control: str) -> StaticAsset:
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type == "application/javascript":
+            content_type += "; charset=utf-8"
+        asset = StaticAsset(
+            content_type=content_type,
+            etag='"' + hashlib.sha256(data).hexdigest()[:32] + '"',
+            cache_control=cache_control,
+            bodies={"identity": data}
+        )
+        if len(data) >= MIN_COMPRESS_SIZE and content_type.startswith(COMPRESSIBLE_TYPES):
+            gzipped = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(gzipped) < len(data):
+                asset.bodies["gzip"] = gzipped
+            if brotli is not None:
+                compressed = brotli.compress(data, quality=11)
+                if len(compressed) < len(data):
+                    asset.bodies["br"] = compressed
+        return asset
+
+    def _lookup(self, path: str) -> Optional[StaticAsset]:
+        # StaticFiles passes a normalized OS path, "." for the mount root
+        path = path.replace(os.sep, "/").strip("/")
+        if path == ".":
+            path = ""
+        if path in self.assets:
+            return self.assets[path]
+        if self.html:
+            return self.assets.get(f"{path}/index.html".lstrip("/"))
+        return None
+
+    async def get_response(self, path: str, scope):
+        asset = self._lookup(path)
+        if asset is None or scope["method"] not in ("GET", "HEAD"):
+            return await super().get_response(path, scope)
+
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        encoding, body = asset.select(headers.get("accept-encoding", ""))
+        # Each encoding is a different representation, so it gets its own strong ETag
+        etag = asset.etag if encoding == "identity" else f'{asset.etag[:-1]}-{encoding}"'
+        response_headers = {
+            "ETag": etag,
+            "Cache-Control": asset.cache_control,
+            "Vary": "Accept-Encoding"
+        }
+
+        if _etag_matches(headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers=response_headers)
+
+        if encoding != "identity":
+            response_headers["Content-Encoding"] = encoding
+        if scope["method"] == "HEAD":
+            response_headers["Content-Length"] = str(len(body))
+            body = b""
+        return Response(content=body, headers=response_headers, media_type=asset.content_type)
@@ -0,0 +1,35 @@
+import hashlib
+import re
+
+import numpy as np
+import pytest
+
+from embeddings import LazySentenceTransformerEmbeddingFunction
+
+DIMENSIONS = 64
+
+def hashed_embeddings(texts):
+    """Bag-of-words vectors from hashed tokens: similar texts get similar vectors, no model needed"""
+    vectors = np.zeros((len(texts), DIMENSIONS), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in re.findall(r"\w+", text.lower()):
+            vectors[row, int(hashlib.md5(word.encode()).hexdigest(), 16) % DIMENSIONS] += 1.0
+        norm = np.linalg.norm(vectors[row])
+        if norm:
+            vectors[row] /= norm
+    return list(vectors)
+
+def use_hashed_embeddings(monkeypatch):
+    """Make the embedding model return hashed_embeddings, so nothing is downloaded or loaded"""
+    monkeypatch.setattr(LazySentenceTransformerEmbeddingFunction, "__call__",
+                        lambda self, input: hashed_embeddings(input))
+
+@pytest.fixture
+def vector_store(tmp_path, monkeypatch):
+    """A VectorStore in a temporary directory that embeds with hashed_embeddings instead of a model"""
+    from vector_store import VectorStore
+
+    use_hashed_embeddings(monkeypatch)
+    store = VectorStore(str(tmp_path / "chroma_db"), "all-MiniLM-L6-v2", max_results=5)
+    yield store
+    store.close()
@@ -0,0 +1,107 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected, AdmissionTimeout, request_deadline
+
+def hold_slot(controller, release, admitted):
+    with controller.admit(10):
+        admitted.set()
+        release.wait(5)
+
+@pytest.fixture
+def busy_controller():
+    """A controller with its single slot held by another thread until the test ends"""
+    controller = AdmissionController(max_concurrent=1, max_queue=1, default_timeout=5)
+    release, admitted = threading.Event(), threading.Event()
+    holder = threading.Thread(target=hold_slot, args=(controller, release, admitted))
+    holder.start()
+    admitted.wait(5)
+    yield controller
+    release.set()
+    holder.join()
+
+def test_admits_up_to_max_concurrent():
+    controller = AdmissionController(max_concurrent=2)
+    with controller.admit(10), controller.admit(10):
+        assert controller.in_flight == 2
+    assert controller.in_flight == 0
+
+def test_times_out_at_request_deadline(busy_controller):
+    start = time.monotonic()
+    with request_deadline(0.2), pytest.raises(AdmissionTimeout) as raised:
+        with busy_controller.admit(10):
+            pass
+    assert 0.2 <= time.monotonic() - start < 2
+    assert raised.value.status_code == 503
+    assert raised.value.retry_after >= 1
+    assert busy_controller.queue_depth == 0
+
+def test_rejects_when_queue_is_full(busy_controller):
+    errors = []
+
+    def wait_in_queue():
+        try:
+            admit_with_deadline(busy_controller, 1.0)
+        except AdmissionTimeout as e:
+            errors.append(e)
+
+    waiter = threading.Thread(target=wait_in_queue)
+    waiter.start()
+    deadline = time.monotonic() + 5
+    while busy_controller.queue_depth < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    start = time.monotonic()
+    with pytest.raises(AdmissionRejected) as raised:
+        admit_with_deadline(busy_controller, 5)
+    # Rejected at once instead of waiting for the deadline
+    assert time.monotonic() - start < 0.5
+    assert raised.value.status_code == 429
+    waiter.join()
+    assert len(errors) == 1
+
+def test_waiter_is_admitted_when_slot_frees():
+    controller = AdmissionController(max_concurrent=1)
+    release, admitted = threading.Event(), threading.Event()
+    holder = threading.Thread(target=hold_slot, args=(controller, release, admitted))
+    holder.start()
+    admitted.wait(5)
+    threading.Timer(0.1, release.set).start()
+    with request_deadline(5):
+        with controller.admit(10):
+            assert controller.in_flight == 1
+    holder.join()
+
+def test_token_budget_delays_calls():
+    controller = AdmissionController(max_concurrent=10, tokens_per_minute=100)
+    with controller.admit(100):
+        pass
+    with request_deadline(0.1), pytest.raises(AdmissionTimeout) as raised:
+        with controller.admit(50):
+            pass
+    # The budget frees up when the first call leaves the 60s window
+    assert raised.value.retry_after > 50
+
+def test_deadline_counts_from_arrival(busy_controller):
+    # A request that arrived 5s ago has used up its 5s budget before asking for admission
+    start = time.monotonic()
+    with request_deadline(5, start=start - 5), pytest.raises(AdmissionTimeout):
+        with busy_controller.admit(10):
+            pass
+    assert time.monotonic() - start < 0.5
+
+def test_pending_requests_are_bounded():
+    controller = AdmissionController(max_concurrent=1, max_queue=1)
+    with controller.request(), controller.request():
+        with pytest.raises(AdmissionRejected):
+            with controller.request():
+                pass
+        assert controller.pending_requests == 2
+    assert controller.pending_requests == 0
+
+def admit_with_deadline(controller, seconds):
+    with request_deadline(seconds):
+        with controller.admit(10):
+            pass
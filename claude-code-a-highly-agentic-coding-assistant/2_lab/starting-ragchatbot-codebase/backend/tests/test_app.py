@@ -0,0 +1,54 @@
+import importlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+from admission import AdmissionController
+from conftest import use_hashed_embeddings
+
+@pytest.fixture(scope="module")
+def app_module(tmp_path_factory):
+    """The app module, imported with its relative paths (index, ../frontend) inside a temporary directory"""
+    root = tmp_path_factory.mktemp("app")
+    (root / "backend").mkdir()
+    (root / "frontend").mkdir()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(root / "backend")
+        use_hashed_embeddings(monkeypatch)
+        yield importlib.import_module("app")
+
+def test_flood_gets_429_with_retry_after(app_module, monkeypatch):
+    controller = AdmissionController(max_concurrent=1, max_queue=2, default_timeout=5)
+    monkeypatch.setattr(app_module.rag_system, "admission", controller)
+    release = threading.Event()
+
+    def slow_query(query, session_id=None, received_at=None):
+        release.wait(10)
+        return "answer", []
+
+    monkeypatch.setattr(app_module.rag_system, "query", slow_query)
+    client = TestClient(app_module.app)
+    requests = 10
+
+    def post(i):
+        return client.post("/api/query", json={"query": f"question {i}", "session_id": "s1"})
+
+    with ThreadPoolExecutor(requests) as executor:
+        futures = [executor.submit(post, i) for i in range(requests)]
+        # Rejections come back while the admitted requests are still running
+        deadline = time.monotonic() + 10
+        while sum(f.done() for f in futures) < requests - 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert controller.pending_requests == 3
+        release.set()
+        responses = [f.result() for f in futures]
+
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [200] * 3 + [429] * (requests - 3)
+    for response in responses:
+        if response.status_code == 429:
+            assert int(response.headers["Retry-After"]) >= 1
+    assert controller.pending_requests == 0
@@ -0,0 +1,23 @@
+from models import ChunkBatch, CourseChunk
+
+def test_chunk_batch_round_trip():
+    chunks = [
+        CourseChunk(content="Intro to MCP", course_title="MCP", lesson_number=0, chunk_index=0),
+        CourseChunk(content="Ünïcödé text ✓", course_title="MCP", lesson_number=1, chunk_index=1),
+        CourseChunk(content="No lesson", course_title="Retrieval", lesson_number=None, chunk_index=0),
+        CourseChunk(content="", course_title="Retrieval", lesson_number=2, chunk_index=1),
+    ]
+    batch = ChunkBatch.from_chunks(chunks)
+
+    assert len(batch) == 4
+    assert batch.to_chunks() == chunks
+    assert batch.titles == ["MCP", "Retrieval"]
+    assert batch.contents(1, 3) == ["Ünïcödé text ✓", "No lesson"]
+    assert batch.lesson_number(2) is None
+    assert batch.course_title(3) == "Retrieval"
+
+def test_empty_chunk_batch():
+    batch = ChunkBatch()
+    assert len(batch) == 0
+    assert batch.to_chunks() == []
+    assert batch.contents(0, 0) == []
@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+
+import pytest
+
+import session_store
+from session_store import InMemorySessionStore, Message, SQLiteSessionStore
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    # Both stores read the clock through their module's time import
+    monkeypatch.setattr(session_store, "time", SimpleNamespace(monotonic=clock, time=clock))
+    return clock
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path, clock):
+    if request.param == "memory":
+        return InMemorySessionStore(max_sessions=100, ttl_seconds=60)
+    return SQLiteSessionStore(str(tmp_path / "sessions.db"), ttl_seconds=60, purge_interval=2)
+
+def messages(*contents):
+    return [Message(role="user", content=content) for content in contents]
+
+def test_append_creates_and_extends_session(store):
+    assert store.get_messages("s1") is None
+    store.append_messages("s1", messages("a", "b"), max_messages=10)
+    store.append_messages("s1", messages("c"), max_messages=10)
+    assert [m.content for m in store.get_messages("s1")] == ["a", "b", "c"]
+
+def test_append_keeps_newest_messages(store):
+    store.append_messages("s1", messages("a", "b", "c"), max_messages=4)
+    store.append_messages("s1", messages("d", "e"), max_messages=4)
+    assert [m.content for m in store.get_messages("s1")] == ["b", "c", "d", "e"]
+
+def test_create_and_clear(store):
+    store.create("s1")
+    assert store.get_messages("s1") == []
+    store.append_messages("s1", messages("a"), max_messages=10)
+    store.clear("s1")
+    assert store.get_messages("s1") == []
+
+def test_idle_session_expires(store, clock):
+    store.append_messages("s1", messages("a"), max_messages=10)
+    clock.now += 59
+    assert store.get_messages("s1") is not None
+    clock.now += 61
+    assert store.get_messages("s1") is None
+
+def test_append_to_expired_session_starts_over(store, clock):
+    store.append_messages("s1", messages("a"), max_messages=10)
+    clock.now += 61
+    store.append_messages("s1", messages("b"), max_messages=10)
+    assert [m.content for m in store.get_messages("s1")] == ["b"]
+
+def test_memory_store_evicts_least_recently_used(clock):
+    store = InMemorySessionStore(max_sessions=2, ttl_seconds=60)
+    store.create("s1")
+    store.create("s2")
+    clock.now += 1
+    store.get_messages("s1")  # s2 is now the least recently used
+    store.create("s3")
+    assert store.get_messages("s1") == []
+    assert store.get_messages("s2") is None
+    assert store.get_messages("s3") == []
+
+def test_sqlite_store_purges_expired_rows(tmp_path, clock):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"), ttl_seconds=60, purge_interval=2)
+    store.append_messages("old", messages("a"), max_messages=10)
+    clock.now += 61
+    store.append_messages("new", messages("b"), max_messages=10)
+    rows = store._connection().execute("SELECT session_id FROM sessions").fetchall()
+    assert rows == [("new",)]
+
+def test_sqlite_sessions_are_shared_between_stores(tmp_path, clock):
+    path = str(tmp_path / "sessions.db")
+    SQLiteSessionStore(path).append_messages("s1", messages("a"), max_messages=10)
+    assert [m.content for m in SQLiteSessionStore(path).get_messages("s1")] == ["a"]
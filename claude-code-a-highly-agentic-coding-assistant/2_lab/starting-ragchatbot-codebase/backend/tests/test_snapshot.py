@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import hashed_embeddings
+from embeddings import LazySentenceTransformerEmbeddingFunction
+from models import Course, CourseChunk, Lesson
+from snapshot import Snapshot, load_snapshot, write_snapshot
+from vector_store import VectorStore
+
+CONFIG = SimpleNamespace(EMBEDDING_MODEL="all-MiniLM-L6-v2", CHUNK_SIZE=800, CHUNK_OVERLAP=100)
+
+@pytest.fixture
+def embedded_texts(monkeypatch):
+    """Every text the embedding model is asked to embed"""
+    texts = []
+
+    def embed(self, input):
+        texts.extend(input)
+        return hashed_embeddings(input)
+
+    monkeypatch.setattr(LazySentenceTransformerEmbeddingFunction, "__call__", embed)
+    return texts
+
+@pytest.fixture
+def open_store(tmp_path, embedded_texts):
+    stores = []
+
+    def open_store(name, index_sentences=True):
+        store = VectorStore(str(tmp_path / name), CONFIG.EMBEDDING_MODEL, index_sentences=index_sentences)
+        stores.append(store)
+        return store
+
+    yield open_store
+    for store in stores:
+        store.close()
+
+def add_course(store):
+    course = Course(title="Building with MCP", instructor="Ada", lessons=[Lesson(lesson_number=1, title="Servers")])
+    chunks = [
+        CourseChunk(content="Servers expose tools. Clients call them.", course_title=course.title,
+                    lesson_number=1, chunk_index=0),
+        CourseChunk(content="Resources are read-only. Prompts are templates.", course_title=course.title,
+                    lesson_number=1, chunk_index=1),
+    ]
+    store.replace_course(course, chunks)
+
+def sentences(store):
+    records = store.chunk_sentences.get(include=["documents", "metadatas"])
+    return sorted(zip(records["ids"], records["documents"]))
+
+def test_snapshot_carries_sentence_embeddings(tmp_path, open_store, embedded_texts):
+    source = open_store("source")
+    add_course(source)
+    write_snapshot(str(tmp_path / "index.snap"), source, CONFIG)
+    with Snapshot(str(tmp_path / "index.snap")) as snapshot:
+        assert snapshot.sentence_count == 4
+
+    target = open_store("target")
+    embedded_texts.clear()
+    assert load_snapshot(str(tmp_path / "index.snap"), target, CONFIG) == 2
+
+    assert sentences(target) == sentences(source)
+    assert embedded_texts == []
+    chunk_ids = target.course_content.get()["ids"]
+    assert set(target.get_sentence_embeddings(chunk_ids)) == set(chunk_ids)
+
+def test_snapshot_without_sentences_embeds_them_on_load(tmp_path, open_store, embedded_texts):
+    source = open_store("source", index_sentences=False)
+    add_course(source)
+    write_snapshot(str(tmp_path / "index.snap"), source, CONFIG)
+
+    target = open_store("target")
+    embedded_texts.clear()
+    load_snapshot(str(tmp_path / "index.snap"), target, CONFIG)
+
+    assert sorted(document for _, document in sentences(target)) == sorted(embedded_texts)
+    assert len(embedded_texts) == 4
@@ -0,0 +1,52 @@
+import threading
+
+from tool_context import ToolContext, current_context, timed_call, tool_context
+
+def test_no_context_outside_with_block():
+    assert current_context() is None
+    with tool_context() as context:
+        assert current_context() is context
+    assert current_context() is None
+
+def test_timed_call_records_result():
+    with tool_context() as context:
+        with timed_call("search_course_content", {"query": "mcp"}) as outcome:
+            outcome["result"] = "found"
+    assert [(call.tool_name, call.result) for call in context.tool_calls] == [("search_course_content", "found")]
+    assert context.tool_seconds >= 0
+
+def test_timed_call_without_context_is_a_no_op():
+    with timed_call("search_course_content", {}) as outcome:
+        outcome["result"] = "ignored"
+    assert current_context() is None
+
+def test_sources_stay_isolated_across_threads():
+    threads = 8
+    barrier = threading.Barrier(threads)
+    results = {}
+
+    def query(name):
+        with tool_context() as context:
+            # Every thread has its context set before any of them adds sources
+            barrier.wait()
+            for i in range(50):
+                current_context().add_sources([f"{name}-{i}"])
+            barrier.wait()
+            results[name] = list(context.sources)
+
+    workers = [threading.Thread(target=query, args=(f"t{n}",)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert len(results) == threads
+    for name, sources in results.items():
+        assert sources == [f"{name}-{i}" for i in range(50)]
+
+def test_explicit_context_is_used():
+    context = ToolContext()
+    with tool_context(context) as active:
+        current_context().add_sources(["a"])
+    assert active is context
+    assert context.sources == ["a"]
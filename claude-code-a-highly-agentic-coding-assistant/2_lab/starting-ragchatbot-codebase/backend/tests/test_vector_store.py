@@ -0,0 +1,64 @@
+from models import Course, CourseChunk, Lesson
+
+def make_course(title="Building with MCP"):
+    return Course(title=title, course_link="https://example.com/mcp", instructor="Ada",
+                  lessons=[Lesson(lesson_number=1, title="Servers"), Lesson(lesson_number=2, title="Clients")])
+
+def make_chunks(title, texts):
+    return [CourseChunk(content=text, course_title=title, lesson_number=i % 2 + 1, chunk_index=i)
+            for i, text in enumerate(texts)]
+
+def stored_contents(store, title):
+    records = store.course_content.get(where={"course_title": title})
+    return sorted(records["documents"])
+
+def test_replace_course_adds_new_course(vector_store):
+    course = make_course()
+    version = vector_store.replace_course(course, make_chunks(course.title, ["mcp servers expose tools",
+                                                                           "clients call tools"]))
+
+    assert vector_store.get_course_version(course.title) == version
+    assert vector_store.get_existing_course_titles() == [course.title]
+    results = vector_store.search("servers expose tools", course_name=course.title)
+    assert results.error is None
+    assert results.documents[0] == "mcp servers expose tools"
+
+def test_replace_course_swaps_chunks_and_keeps_previous_version(vector_store):
+    course = make_course()
+    first = vector_store.replace_course(course, make_chunks(course.title, ["old text one", "old text two"]))
+    second = vector_store.replace_course(course, make_chunks(course.title, ["new text one"]))
+    assert second > first
+
+    # Searches only see the active version
+    results = vector_store.search("text one", course_name=course.title)
+    assert results.documents == ["new text one"]
+    results = vector_store.search("text one")
+    assert results.documents == ["new text one"]
+
+    # The replaced version stays for other processes until the next replace
+    assert stored_contents(vector_store, course.title) == ["new text one", "old text one", "old text two"]
+    vector_store.replace_course(course, make_chunks(course.title, ["newest text"]))
+    assert stored_contents(vector_store, course.title) == ["new text one", "newest text"]
+
+def test_replace_course_leaves_other_courses_alone(vector_store):
+    mcp, rag = make_course("Building with MCP"), make_course("Retrieval basics")
+    vector_store.replace_course(mcp, make_chunks(mcp.title, ["mcp text"]))
+    vector_store.replace_course(rag, make_chunks(rag.title, ["retrieval text"]))
+    vector_store.replace_course(mcp, make_chunks(mcp.title, ["mcp text again"]))
+
+    assert stored_contents(vector_store, rag.title) == ["retrieval text"]
+    assert sorted(vector_store.get_existing_course_titles()) == [mcp.title, rag.title]
+
+def test_delete_course(vector_store):
+    mcp, rag = make_course("Building with MCP"), make_course("Retrieval basics")
+    vector_store.replace_course(mcp, make_chunks(mcp.title, ["mcp text"]))
+    vector_store.replace_course(rag, make_chunks(rag.title, ["retrieval text"]))
+
+    assert vector_store.delete_course(mcp.title) is True
+    assert vector_store.get_course_version(mcp.title) is None
+    assert vector_store.get_existing_course_titles() == [rag.title]
+    assert stored_contents(vector_store, mcp.title) == []
+    assert vector_store.lesson_index.get(where={"course_title": mcp.title})["ids"] == []
+    assert vector_store.search("mcp text").documents == ["retrieval text"]
+
+    assert vector_store.delete_course(mcp.title) is False
@@ -0,0 +1,72 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+@dataclass
+class ToolCallRecord:
+    """One tool execution within a query"""
+    tool_name: str
+    tool_input: Dict[str, Any]
+    result: str
+    seconds: float
+
+@dataclass
+class ToolContext:
+    """Per-query state collected while tools run: UI sources, and each call with its result and timing"""
+    sources: List[str] = field(default_factory=list)
+    tool_calls: List[ToolCallRecord] = field(default_factory=list)
+
+    def add_sources(self, sources: List[str]):
+        self.sources.extend(sources)
+
+    def record_call(self, tool_name: str, tool_input: Dict[str, Any], result: str, seconds: float):
+        self.tool_calls.append(ToolCallRecord(tool_name, tool_input, result, seconds))
+
+    @property
+    def tool_seconds(self) -> float:
+        """Total time spent executing tools"""
+        return sum(call.seconds for call in self.tool_calls)
+
+# Each thread and asyncio task sees its own value, so concurrent queries
+# sharing one RAGSystem never see each other's sources
+_current: ContextVar[Optional[ToolContext]] = ContextVar("tool_context", default=None)
+
+def current_context() -> Optional[ToolContext]:
+    """The ToolContext of the query running in this thread or task, if any"""
+    return _current.get()
+
+@contextmanager
+def tool_context(context: Optional[ToolContext] = None) -> Iterator[ToolContext]:
+    """
+    Make a ToolContext current for the duration of the with-block.
+
+    Args:
+        context: Context to use; a fresh one is created if omitted
+
+    Yields:
+        The active ToolContext
+    """
+    context = context or ToolContext()
+    token = _current.set(context)
+    try:
+        yield context
+    finally:
+        _current.reset(token)
+
+@contextmanager
+def timed_call(tool_name: str, tool_input: Dict[str, Any]) -> Iterator[Dict[str, str]]:
+    """
+    Record a tool call in the current context, if there is one.
+
+    The with-block stores the tool's result under the "result" key of the yielded dict.
+    """
+    outcome = {"result": ""}
+    start = time.perf_counter()
+    try:
+        yield outcome
+    finally:
+        context = _current.get()
+        if context is not None:
+            context.record_call(tool_name, tool_input, outcome["result"], time.perf_counter() - start)
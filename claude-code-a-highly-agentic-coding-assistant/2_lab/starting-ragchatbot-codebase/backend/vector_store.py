@@ -1,9 +1,22 @@
+import copy
+from abc import ABC, abstractmethod
+import threading
+import time
 import chromadb
+import numpy as np
 from chromadb.config import Settings
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
-from models import Course, CourseChunk
-from sentence_transformers import SentenceTransformer
+from chromadb.errors import NotFoundError
+from typing import List, Dict, Any, Iterator, Optional, Tuple, Union
+from dataclasses import dataclass, field
+from models import Course, CourseChunk, ChunkBatch
+from document_processor import split_sentences
+from embeddings import LazySentenceTransformerEmbeddingFunction
+from embedding_batcher import EmbeddingBatcher
+from embedding_pool import EmbeddingPool
+from near_duplicates import MinHashDeduplicator
+from embedding_reduction import EmbeddingReducer, FULL_EMBEDDING_KEY, encode_embedding, decode_embeddings, distances
+from chroma_client import release_client
+import metrics
 
 @dataclass
 class SearchResults:
@@ -12,14 +25,18 @@ class SearchResults:
     metadata: List[Dict[str, Any]]
     distances: List[float]
     error: Optional[str] = None
+    ids: List[str] = field(default_factory=list)  # Chunk ids, for looking up cached sentence embeddings
+    query_embedding: Optional[Any] = None          # Embedding the search was run with
     
     @classmethod
-    def from_chroma(cls, chroma_results: Dict) -> 'SearchResults':
-        """Create SearchResults from ChromaDB query results"""
+    def from_chroma(cls, chroma_results: Dict, index: int = 0, query_embedding: Optional[Any] = None) -> 'SearchResults':
+        """Create SearchResults from ChromaDB query results (index selects the query in a multi-query result)"""
         return cls(
-            documents=chroma_results['documents'][0] if chroma_results['documents'] else [],
-            metadata=chroma_results['metadatas'][0] if chroma_results['metadatas'] else [],
-            distances=chroma_results['distances'][0] if chroma_results['distances'] else []
+            documents=chroma_results['documents'][index] if chroma_results['documents'] else [],
+            metadata=chroma_results['metadatas'][index] if chroma_results['metadatas'] else [],
+            distances=chroma_results['distances'][index] if chroma_results['distances'] else [],
+            ids=chroma_results['ids'][index] if chroma_results.get('ids') else [],
+            query_embedding=query_embedding
         )
     
     @classmethod
@@ -31,32 +48,96 @@ class SearchResults:
         """Check if results are empty"""
         return len(self.documents) == 0
 
-class VectorStore:
-    """Vector storage using ChromaDB for course content and metadata"""
+class LessonCentroids:
+    """Running sums of chunk embeddings per lesson, turned into lesson_index rows"""
     
-    def __init__(self, chroma_path: str, embedding_model: str, max_results: int = 5):
-        self.max_results = max_results
-        # Initialize ChromaDB client
-        self.client = chromadb.PersistentClient(
-            path=chroma_path,
-            settings=Settings(anonymized_telemetry=False)
-        )
-        
-        # Set up sentence transformer embedding function
-        self.embedding_function = chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction(
+    NO_LESSON = -1  # lesson_number of the centroid of chunks outside any lesson
+    
+    def __init__(self):
+        self.sums: Dict[Tuple[str, int], np.ndarray] = {}
+        self.counts: Dict[Tuple[str, int], int] = {}
+        self.titles: Dict[str, str] = {}  # course_version key -> course title
+    
+    def add(self, metadatas: List[Dict[str, Any]], embeddings: list):
+        """Add chunk embeddings, grouped by the course version and lesson in their metadata"""
+        for metadata, embedding in zip(metadatas, embeddings):
+            lesson_number = metadata.get("lesson_number")
+            key = (metadata["course_version"], self.NO_LESSON if lesson_number is None else lesson_number)
+            vector = np.asarray(embedding, dtype=np.float32)
+            if key in self.sums:
+                self.sums[key] += vector
+                self.counts[key] += 1
+            else:
+                self.sums[key] = vector.copy()
+                self.counts[key] = 1
+                self.titles[key[0]] = metadata["course_title"]
+    
+    def rows(self, active: bool = True) -> Tuple[List[str], List[list], List[Dict[str, Any]]]:
+        """(ids, normalized centroid embeddings, metadatas) for every lesson seen, with the given active flag"""
+        ids, embeddings, metadatas = [], [], []
+        for (version_key, lesson_number), total in self.sums.items():
+            norm = float(np.linalg.norm(total))
+            ids.append(f"{version_key}#{lesson_number}")
+            embeddings.append((total / norm if norm else total).tolist())
+            metadatas.append({
+                "course_title": self.titles[version_key],
+                "course_version": version_key,
+                "lesson_number": lesson_number,
+                "chunk_count": self.counts[(version_key, lesson_number)],
+                "active": active
+            })
+        return ids, embeddings, metadatas
+
+class SearchFrontend(ABC):
+    """
+    Text search over course content, shared by VectorStore and ShardedVectorStore.
+    
+    Holds the query side: the embedding model (or worker pool) and the query
+    micro-batcher. It resolves course names and embeds queries, then hands the
+    embedded searches to the subclass's search_embedded_batch. Subclasses match
+    course names against their catalog in _resolve_course_names.
+    """
+    
+    def _init_embedders(self, embedding_model: str, embedding_workers: int = 0,
+                        embedding_batch_window_ms: float = 0.0, embedding_max_batch: int = 64):
+        """Set up the embedding model, worker pool and query batcher; the model loads on first use or warm_up()"""
+        self.embedding_function = LazySentenceTransformerEmbeddingFunction(
             model_name=embedding_model
         )
         
-        # Create collections for different types of data
-        self.course_catalog = self._create_collection("course_catalog")  # Course titles/instructors
-        self.course_content = self._create_collection("course_content")  # Actual course material
+        # All embedding goes through self.embedder: the model in this process, or a
+        # pool of worker processes that keeps transformer work off the API process
+        self.embedding_pool = None
+        self.embedder = self.embedding_function
+        if embedding_workers > 0:
+            self.embedding_pool = EmbeddingPool(embedding_model, embedding_workers)
+            self.embedder = self.embedding_pool
+        
+        # Query embeddings of concurrent searches share model calls when a batch window is set
+        self.query_embedder = None
+        if embedding_batch_window_ms > 0:
+            self.query_embedder = EmbeddingBatcher(
+                self.embedder,
+                max_batch_size=embedding_max_batch,
+                max_wait_ms=embedding_batch_window_ms
+            )
     
-    def _create_collection(self, name: str):
-        """Create or get a ChromaDB collection"""
-        return self.client.get_or_create_collection(
-            name=name,
-            embedding_function=self.embedding_function
-        )
+    def warm_up(self):
+        """Load the embedding model and run one embedding so the first real query is not slow"""
+        if self.embedding_pool is not None:
+            self.embedding_pool.warm_up()
+        else:
+            self.embedding_function(["warm-up query"])
+    
+    def embed_queries(self, queries: List[str]) -> list:
+        """Embed query texts, through the micro-batcher when one is configured"""
+        if self.query_embedder is not None:
+            return self.query_embedder.embed(queries)
+        return self.embedder(queries)
+    
+    def embed_documents(self, documents: List[str]) -> list:
+        """Embed documents for indexing (never micro-batched; they come in large lists already)"""
+        return self.embedder(documents)
     
     def search(self, 
                query: str,
@@ -78,62 +159,823 @@ class VectorStore:
         # Step 1: Resolve course name if provided
         course_title = None
         if course_name:
-            course_title = self._resolve_course_name(course_name)
+            with metrics.COURSE_RESOLUTION.time():
+                course_title = self._resolve_course_name(course_name)
             if not course_title:
                 return SearchResults.empty(f"No course found matching '{course_name}'")
         
-        # Step 2: Build filter for content search
-        filter_dict = self._build_filter(course_title, lesson_number)
+        # Step 2: Embed the query and search course content
+        try:
+            with metrics.QUERY_EMBEDDING.time():
+                query_embedding = self.embed_queries([query])[0]
+        except Exception as e:
+            return SearchResults.empty(f"Search error: {str(e)}")
+        return self.search_embedded(query_embedding, course_title, lesson_number, limit)
+    
+    def search_embedded(self,
+                        query_embedding: Any,
+                        course_title: Optional[str] = None,
+                        lesson_number: Optional[int] = None,
+                        limit: Optional[int] = None) -> SearchResults:
+        """
+        Search course content with an embedded query.
+        
+        Args:
+            query_embedding: Embedding of the query
+            course_title: Optional exact course title to filter by
+            lesson_number: Optional lesson number to filter by
+            limit: Maximum results to return
+            
+        Returns:
+            SearchResults object with documents and metadata
+        """
+        return self.search_embedded_batch([{
+            "query_embedding": query_embedding,
+            "course_title": course_title,
+            "lesson_number": lesson_number,
+            "limit": limit
+        }])[0]
+    
+    def search_batch(self, requests: List[Dict[str, Any]]) -> List[SearchResults]:
+        """
+        Run many searches with one embedding pass, searched together by search_embedded_batch.
+        
+        Args:
+            requests: Dicts with the keyword arguments accepted by search()
+                      (query, and optionally course_name, lesson_number, limit)
+            
+        Returns:
+            SearchResults for each request, in request order
+        """
+        if not requests:
+            return []
+        
+        results: List[Optional[SearchResults]] = [None] * len(requests)
+        
+        # Step 1: Resolve all distinct course names with a single catalog query
+        course_names = list({req["course_name"] for req in requests if req.get("course_name")})
+        with metrics.COURSE_RESOLUTION.time():
+            resolved = self._resolve_course_names(course_names)
+        for i, req in enumerate(requests):
+            course_name = req.get("course_name")
+            if course_name and not resolved.get(course_name):
+                results[i] = SearchResults.empty(f"No course found matching '{course_name}'")
         
-        # Step 3: Search course content
-        # Use provided limit or fall back to configured max_results
-        search_limit = limit if limit is not None else self.max_results
+        pending = [i for i, result in enumerate(results) if result is None]
+        if not pending:
+            return results
         
+        # Step 2: Embed every remaining query in one batch, then search them together
         try:
-            results = self.course_content.query(
-                query_texts=[query],
-                n_results=search_limit,
-                where=filter_dict
-            )
-            return SearchResults.from_chroma(results)
+            with metrics.QUERY_EMBEDDING.time():
+                embeddings = self.embedder([requests[i]["query"] for i in pending])
         except Exception as e:
-            return SearchResults.empty(f"Search error: {str(e)}")
+            for i in pending:
+                results[i] = SearchResults.empty(f"Search error: {str(e)}")
+            return results
+        
+        searched = self.search_embedded_batch([{
+            "query_embedding": embedding,
+            "course_title": resolved.get(requests[i].get("course_name")),
+            "lesson_number": requests[i].get("lesson_number"),
+            "limit": requests[i].get("limit")
+        } for i, embedding in zip(pending, embeddings)])
+        for i, result in zip(pending, searched):
+            results[i] = result
+        return results
+    
+    @abstractmethod
+    def search_embedded_batch(self, requests: List[Dict[str, Any]]) -> List[SearchResults]:
+        """
+        Run many searches with embedded queries.
+        
+        Args:
+            requests: Dicts with the keyword arguments accepted by search_embedded()
+                      (query_embedding, and optionally course_title, lesson_number, limit)
+            
+        Returns:
+            SearchResults for each request, in request order
+        """
+        pass
+    
+    @abstractmethod
+    def _resolve_course_names(self, course_names: List[str]) -> Dict[str, str]:
+        """Map each course name to its best matching course title; names without a match are left out"""
+        pass
     
     def _resolve_course_name(self, course_name: str) -> Optional[str]:
-        """Use vector search to find best matching course by name"""
+        """Best matching course title for a name, or None"""
+        return self._resolve_course_names([course_name]).get(course_name)
+
+class VectorStore(SearchFrontend):
+    """
+    Vector storage using ChromaDB for course content and metadata.
+    
+    Every course's chunks carry a course_version key ("<title>@<version>") and
+    the catalog records which version of each course is active. Searches within
+    a course match its active version key, so a course is replaced by writing
+    its new chunks first and then flipping the version in its catalog entry, a
+    single-row write. Chunks and lesson centroids also carry an active flag, set
+    on the new version and cleared on the old one right after the flip, which
+    is what searches over all courses filter on.
+    
+    The lesson_index collection holds one centroid per lesson (the normalized mean
+    of its chunk embeddings), written along with the chunks. With hierarchical
+    search on, a search first picks the lessons whose centroids are closest to the
+    query and then searches only their chunks, instead of every chunk.
+    
+    With embedding_dimensions set, course_content holds chunk vectors reduced by
+    a PCA fitted on the corpus (saved next to the index), which makes its HNSW
+    graph smaller and faster to search; each chunk's full-width vector is kept in
+    its metadata, and the reduced-space candidates of a search are re-ranked by
+    their full-width distance. The other collections stay at full width.
+    """
+    
+    # How long other processes may serve a course version after it was replaced
+    VERSION_CACHE_SECONDS = 1.0
+    # Where _rebuild_course_content() builds the new course_content, and keeps the old one until it is swapped in
+    REBUILD_COLLECTION = "course_content_rebuild"
+    REPLACED_COLLECTION = "course_content_replaced"
+    
+    def __init__(self, chroma_path: str, embedding_model: str, max_results: int = 5,
+                 embedding_batch_window_ms: float = 0.0, embedding_max_batch: int = 64,
+                 embedding_workers: int = 0, index_sentences: bool = False,
+                 hierarchical_lessons: int = 0, near_duplicate_threshold: float = 0.0,
+                 hnsw_params: Optional[Dict[str, int]] = None, embedding_dimensions: int = 0,
+                 embedding_reduction: str = "pca", rescore_factor: int = 4, repair_on_open: bool = True):
+        self.max_results = max_results
+        # Run repair_index() whenever an index is opened; off for stores that must not
+        # write to what they open (index generations repair inside their writes)
+        self.repair_on_open = repair_on_open
+        # Dimensions course_content vectors are reduced to (0 = full width), and how:
+        # "pca", or "truncate" for models trained so that a prefix of the vector works alone
+        self.embedding_dimensions = embedding_dimensions
+        self.embedding_reduction = embedding_reduction
+        # Searches on reduced vectors re-rank limit * rescore_factor candidates at full width
+        self.rescore_factor = rescore_factor
+        # HNSW settings of course_content (max_neighbors, ef_construction, ef_search), e.g.
+        # chosen by hnsw_tuning.py; None keeps Chroma's defaults
+        self.hnsw_params = hnsw_params
+        # Search chunks only within this many best-matching lessons (0 = all chunks)
+        self.hierarchical_lessons = hierarchical_lessons
+        # Also embed every sentence of each chunk at ingest, for context compression
+        self.index_sentences = index_sentences
+        # Store near-identical chunks of a course once, listing every lesson they appear in
+        self.deduplicator = None
+        if near_duplicate_threshold > 0:
+            self.deduplicator = MinHashDeduplicator(near_duplicate_threshold)
+        self._init_embedders(embedding_model, embedding_workers, embedding_batch_window_ms, embedding_max_batch)
+        self._open(chroma_path)
+    
+    def _open(self, chroma_path: str):
+        """Open the index at chroma_path: client, collections and version cache"""
+        self.chroma_path = chroma_path
+        # Initialize ChromaDB client
+        self.client = chromadb.PersistentClient(
+            path=chroma_path,
+            settings=Settings(anonymized_telemetry=False)
+        )
+        
+        # Create collections for different types of data
+        self._recover_content_swap()
+        self.course_catalog = self._create_collection("course_catalog")  # Course titles/instructors
+        self.course_content = self._create_collection("course_content")  # Actual course material
+        self.chunk_sentences = self._create_collection("chunk_sentences")  # Sentence embeddings of each chunk
+        self.lesson_index = self._create_collection("lesson_index")  # One centroid vector per lesson
+        
+        # Active course_version key per course title, cached from the catalog
+        self._active_versions: Dict[str, str] = {}
+        self._versions_loaded_at = 0.0
+        self._versions_lock = threading.Lock()
+        # Reduction course_content's vectors were stored with (None = full width)
+        self.reducer = EmbeddingReducer.load(chroma_path)
+        if self.repair_on_open:
+            self.repair_index()
+    
+    def repair_index(self):
+        """
+        Bring the index in line with this code and these settings: tag chunks indexed
+        before course versioning, set active flags from the catalog (e.g. after a crash
+        mid-replace), build missing lesson centroids for hierarchical search and apply
+        the configured ef_search. Every step writes to the index.
+        """
+        self._migrate_unversioned_courses()
+        self._sync_active_flags()
+        if self.hierarchical_lessons > 0:
+            self.build_missing_lesson_centroids()
+        if self.hnsw_params:
+            self._check_hnsw_params()
+    
+    def needs_repair(self) -> bool:
+        """Whether repair_index() has anything to write; only reads the index"""
         try:
-            results = self.course_catalog.query(
-                query_texts=[course_name],
-                n_results=1
-            )
+            catalog = self.course_catalog.get(include=["metadatas"])
+            if any("version" not in metadata for metadata in catalog["metadatas"]):
+                return True
+            active_versions = {
+                title: self.version_key(title, metadata["version"])
+                for title, metadata in zip(catalog["ids"], catalog["metadatas"])
+            }
+            for title, version_key in active_versions.items():
+                for collection in (self.course_content, self.lesson_index):
+                    for _, where in self._active_flag_changes(title, version_key):
+                        if collection.get(where=where, limit=1, include=[])["ids"]:
+                            return True
+            if self.hierarchical_lessons > 0 and self._versions_missing_centroids(active_versions):
+                return True
+            return bool(self.hnsw_params) and self._ef_search_outdated()
+        except Exception as e:
+            print(f"Error checking index at {self.chroma_path}: {e}")
+            return False
+    
+    def at_path(self, chroma_path: str) -> 'VectorStore':
+        """
+        Open another index with this store's settings, sharing its embedding model,
+        worker pool and query batcher.
+        
+        Args:
+            chroma_path: Directory of the index to open
             
-            if results['documents'][0] and results['metadatas'][0]:
-                # Return the title (which is now the ID)
-                return results['metadatas'][0][0]['title']
+        Returns:
+            A VectorStore for that index
+        """
+        store = copy.copy(self)
+        store._open(chroma_path)
+        return store
+    
+    def close(self):
+        """
+        Release this store's Chroma client (see chroma_client.release_client), so
+        the directory can be deleted and reopened. The embedding model and worker
+        pool are left running.
+        """
+        release_client(self.chroma_path)
+    
+    def warm_index(self):
+        """Run one content search so Chroma loads its vector index before the first real query"""
+        try:
+            if self.course_content.count() > 0:
+                self._query_content(self.embed_queries(["warm-up query"]), 1, None)
         except Exception as e:
-            print(f"Error resolving course name: {e}")
+            print(f"Index warm-up failed: {e}")
+    
+    def _create_collection(self, name: str):
+        """
+        Get a ChromaDB collection, creating it if it does not exist yet.
+        
+        hnsw_params only apply to a new course_content: Chroma ignores the configuration
+        of an existing collection, whose settings _check_hnsw_params() compares instead.
+        """
+        try:
+            return self.client.get_collection(name=name, embedding_function=self.embedding_function)
+        except NotFoundError:
+            pass
+        configuration = None
+        if name == "course_content" and self.hnsw_params:
+            configuration = {"hnsw": dict(self.hnsw_params)}
+        # get_or_create, in case another process created it meanwhile
+        return self.client.get_or_create_collection(
+            name=name,
+            embedding_function=self.embedding_function,
+            configuration=configuration
+        )
+    
+    def hnsw_configuration(self) -> Dict[str, Any]:
+        """HNSW settings course_content was created with (space, max_neighbors, ef_construction, ef_search, ...)"""
+        return dict(self.course_content.configuration.get("hnsw") or {})
+    
+    def _check_hnsw_params(self):
+        """
+        Bring an existing course_content in line with hnsw_params where that is cheap.
+        
+        ef_search can change in place and applies once Chroma loads the index, which
+        it does on the first query. max_neighbors and ef_construction shape the
+        graph itself, so a mismatch there needs set_hnsw_params() to rebuild it.
+        """
+        current = self.hnsw_configuration()
+        if self._ef_search_outdated():
+            self.course_content.modify(configuration={"hnsw": {"ef_search": self.hnsw_params["ef_search"]}})
+        stale = {name: current.get(name) for name in ("max_neighbors", "ef_construction")
+                 if name in self.hnsw_params and current.get(name) != self.hnsw_params[name]}
+        if stale:
+            print(f"course_content at {self.chroma_path} was built with {stale}, not the tuned "
+                  f"HNSW settings; run hnsw_tuning.py --apply to rebuild it")
+    
+    def _ef_search_outdated(self) -> bool:
+        ef_search = self.hnsw_params.get("ef_search")
+        return ef_search is not None and self.hnsw_configuration().get("ef_search") != ef_search
+    
+    def set_hnsw_params(self, hnsw_params: Dict[str, int]):
+        """
+        Use new HNSW settings for course_content, rebuilding its graph if needed.
+        
+        Other processes that already loaded the index keep searching it with the
+        old ef_search until they reopen it (with index generations they do so at
+        the next publish).
         
-        return None
+        Args:
+            hnsw_params: max_neighbors, ef_construction and ef_search
+        """
+        self.hnsw_params = dict(hnsw_params)
+        current = self.hnsw_configuration()
+        if all(current.get(name) == value for name, value in self.hnsw_params.items()
+               if name != "ef_search"):
+            self._check_hnsw_params()
+            return
+        
+        self._rebuild_course_content(self.reducer)
+    
+    def _rebuild_course_content(self, reducer: Optional[EmbeddingReducer]):
+        """
+        Copy every course_content record into a collection built with the current
+        HNSW settings, then swap it in under the old name.
+        
+        The old collection is only renamed out of the way, and deleted once the
+        rebuilt one holds the name, so there is a course_content at every point a
+        crash can stop the swap (_recover_content_swap() restores the old one if
+        it stopped between the two renames).
+        
+        Args:
+            reducer: Reduction of the vectors in the new collection (None = full width);
+                     vectors are copied as they are when it is the current one
+        """
+        existing = [collection.name for collection in self.client.list_collections()]
+        # Leftovers of a rebuild that was interrupted
+        for name in (self.REBUILD_COLLECTION, self.REPLACED_COLLECTION):
+            if name in existing:
+                self.client.delete_collection(name)
+        rebuilt = self.client.create_collection(
+            name=self.REBUILD_COLLECTION,
+            embedding_function=self.embedding_function,
+            configuration={"hnsw": dict(self.hnsw_params)} if self.hnsw_params else None
+        )
+        batch_size = self.client.get_max_batch_size()
+        offset = 0
+        while True:
+            page = self.course_content.get(include=["documents", "metadatas", "embeddings"],
+                                           limit=batch_size, offset=offset)
+            if not page["ids"]:
+                break
+            embeddings = page["embeddings"]
+            if reducer is not self.reducer:
+                embeddings = self.full_embeddings(page["embeddings"], page["metadatas"])
+                if reducer is not None:
+                    for metadata, embedding in zip(page["metadatas"], embeddings):
+                        metadata[FULL_EMBEDDING_KEY] = encode_embedding(embedding)
+                    embeddings = reducer.transform(embeddings)
+            rebuilt.add(ids=page["ids"], embeddings=embeddings,
+                        documents=page["documents"], metadatas=page["metadatas"])
+            offset += len(page["ids"])
+        self.course_content.modify(name=self.REPLACED_COLLECTION)
+        rebuilt.modify(name="course_content")
+        self.course_content = self.client.get_collection("course_content", embedding_function=self.embedding_function)
+        self.client.delete_collection(self.REPLACED_COLLECTION)
+    
+    def _recover_content_swap(self):
+        """Put the old course_content back if a rebuild stopped after renaming it away"""
+        existing = [collection.name for collection in self.client.list_collections()]
+        if "course_content" not in existing and self.REPLACED_COLLECTION in existing:
+            self.client.get_collection(self.REPLACED_COLLECTION).modify(name="course_content")
+            print(f"Restored course_content at {self.chroma_path} after an interrupted rebuild")
+    
+    def embedding_reduction_outdated(self) -> bool:
+        """
+        Whether course_content's vectors are not reduced as configured and
+        update_embedding_reduction() can change that (PCA needs at least as many
+        chunks as dimensions to fit).
+        """
+        current = (self.reducer.dimensions, self.reducer.method) if self.reducer is not None else (0, None)
+        wanted = (self.embedding_dimensions, self.embedding_reduction) if self.embedding_dimensions > 0 else (0, None)
+        if current == wanted:
+            return False
+        return wanted[0] == 0 or self.course_content.count() >= self.embedding_dimensions
+    
+    def update_embedding_reduction(self):
+        """
+        Reduce course_content's vectors as configured: fit the reduction on every
+        stored chunk vector and rebuild the collection with the reduced vectors, or
+        rebuild it at full width when reduction was turned off. Chunks added later
+        are reduced with the same fit.
+        """
+        reducer = None
+        if self.embedding_dimensions > 0:
+            reducer = EmbeddingReducer.fit(self._full_content_embeddings(), self.embedding_dimensions,
+                                           self.embedding_reduction)
+        self._rebuild_course_content(reducer)
+        if reducer is None:
+            EmbeddingReducer.remove(self.chroma_path)
+        else:
+            reducer.save(self.chroma_path)
+        self.reducer = reducer
+        width = f"{reducer.dimensions}-dimensional" if reducer is not None else "full-width"
+        print(f"Rebuilt course_content with {width} vectors")
+    
+    def _full_content_embeddings(self) -> np.ndarray:
+        """Full-width vectors of every course_content record, a page at a time"""
+        batch_size = self.client.get_max_batch_size()
+        pages = []
+        offset = 0
+        while True:
+            page = self.course_content.get(include=["metadatas", "embeddings"], limit=batch_size, offset=offset)
+            if not page["ids"]:
+                break
+            pages.append(self.full_embeddings(page["embeddings"], page["metadatas"]))
+            offset += len(page["ids"])
+        return np.concatenate(pages) if pages else np.zeros((0, 0), dtype=np.float32)
+    
+    @staticmethod
+    def full_embeddings(embeddings: list, metadatas: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        Full-width vectors of course_content records read with their metadata.
+        
+        Records stored with reduced vectors carry their full-width vector in their
+        metadata, which is removed from the metadata dicts here; other records'
+        vectors are returned as they are.
+        """
+        encoded = [metadata.pop(FULL_EMBEDDING_KEY, None) for metadata in metadatas]
+        if encoded and all(text is not None for text in encoded):
+            return decode_embeddings(encoded)
+        return np.asarray(embeddings, dtype=np.float32)
+    
+    def _query_content(self, query_embeddings: list, n_results: int, where: Optional[Dict]) -> Dict[str, list]:
+        """
+        Query course_content with full-width query embeddings.
+        
+        With reduced vectors, the reduced queries fetch n_results * rescore_factor
+        candidates, which are re-ranked by their full-width distance to the query.
+        
+        Returns:
+            Chroma query results (ids, documents, metadatas and distances per query)
+        """
+        if self.reducer is None:
+            return self.course_content.query(query_embeddings=query_embeddings, n_results=n_results, where=where)
+        candidates = self.course_content.query(
+            query_embeddings=self.reducer.transform(query_embeddings),
+            n_results=n_results * max(1, self.rescore_factor),
+            where=where
+        )
+        with metrics.FULL_WIDTH_RESCORE.time():
+            space = self.hnsw_configuration().get("space", "l2")
+            results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+            for i, query_embedding in enumerate(query_embeddings):
+                metadatas = candidates["metadatas"][i]
+                vectors = self.full_embeddings([], metadatas)
+                scores = distances(np.asarray([query_embedding], dtype=np.float32), vectors, space)[0] \
+                    if len(vectors) else np.zeros(0)
+                order = np.argsort(scores, kind="stable")[:n_results]
+                results["ids"].append([candidates["ids"][i][j] for j in order])
+                results["documents"].append([candidates["documents"][i][j] for j in order])
+                results["metadatas"].append([metadatas[j] for j in order])
+                results["distances"].append([float(scores[j]) for j in order])
+        return results
+    
+    def search_embedded_batch(self, requests: List[Dict[str, Any]]) -> List[SearchResults]:
+        """
+        Run many searches with embedded queries, one ChromaDB query per distinct filter.
+        
+        Args:
+            requests: Dicts with the keyword arguments accepted by search_embedded()
+                      (query_embedding, and optionally course_title, lesson_number, limit)
+            
+        Returns:
+            SearchResults for each request, in request order
+        """
+        import json
+        
+        results: List[Optional[SearchResults]] = [None] * len(requests)
+        
+        # Group requests that share the same filter and limit
+        groups: Dict[str, List[int]] = {}
+        filters: Dict[str, Tuple[Optional[Dict], int]] = {}
+        unfiltered_lessons = set()  # Groups without a lesson filter, narrowed by hierarchical search
+        for i, req in enumerate(requests):
+            course_title = req.get("course_title")
+            filter_dict = self._build_filter(course_title, req.get("lesson_number"))
+            if filter_dict is None:
+                results[i] = SearchResults.empty(f"No course found matching '{course_title}'")
+                continue
+            limit = req.get("limit")
+            search_limit = limit if limit is not None else self.max_results
+            key = json.dumps([filter_dict, search_limit], sort_keys=True)
+            groups.setdefault(key, []).append(i)
+            filters[key] = (filter_dict, search_limit)
+            if req.get("lesson_number") is None:
+                unfiltered_lessons.add(key)
+        embedding_by_request = {i: requests[i]["query_embedding"] for indices in groups.values() for i in indices}
+        
+        for key, indices in groups.items():
+            filter_dict, search_limit = filters[key]
+            if self.hierarchical_lessons > 0 and key in unfiltered_lessons:
+                # Each query gets its own lessons, so the group is searched one query at a time
+                self._search_top_lessons(indices, [embedding_by_request[i] for i in indices],
+                                         filter_dict, search_limit, results)
+                continue
+            try:
+                with metrics.CHROMA_QUERY.time():
+                    chroma_results = self._query_content([embedding_by_request[i] for i in indices],
+                                                         search_limit, filter_dict)
+                for position, i in enumerate(indices):
+                    results[i] = SearchResults.from_chroma(chroma_results, position, embedding_by_request[i])
+            except Exception as e:
+                for i in indices:
+                    results[i] = SearchResults.empty(f"Search error: {str(e)}")
+        
+        return results
+    
+    def _resolve_course_names(self, course_names: List[str]) -> Dict[str, str]:
+        """Resolve several course names with one catalog query, mapping each name to its best matching title"""
+        if not course_names:
+            return {}
+        
+        resolved = {}
+        try:
+            matches = self.match_course_names(self.embedder(course_names))
+            for course_name, match in zip(course_names, matches):
+                if match is not None:
+                    resolved[course_name] = match[0]
+        except Exception as e:
+            print(f"Error resolving course names: {e}")
+        
+        return resolved
+    
+    def match_course_names(self, name_embeddings: list) -> List[Optional[Tuple[str, float]]]:
+        """Best matching course title and its distance for each embedded course name (None with no courses)"""
+        results = self.course_catalog.query(
+            query_embeddings=name_embeddings,
+            n_results=1,
+            include=["metadatas", "distances"]
+        )
+        return [
+            (metadatas[0]['title'], distances[0]) if metadatas else None
+            for metadatas, distances in zip(results['metadatas'], results['distances'])
+        ]
     
     def _build_filter(self, course_title: Optional[str], lesson_number: Optional[int]) -> Optional[Dict]:
-        """Build ChromaDB filter from search parameters"""
-        if not course_title and lesson_number is None:
+        """
+        Build ChromaDB filter from search parameters.
+        
+        The filter always restricts results to active course versions: the course's
+        active version key, or the active flag across all courses. Returns None if
+        course_title has no active version (e.g. it was just deleted).
+        """
+        if course_title:
+            version_key = self._active_version_key(course_title)
+            if version_key is None:
+                return None
+            version_filter = {"course_version": version_key}
+        else:
+            version_filter = {"active": True}
+        
+        if lesson_number is None:
+            return version_filter
+        return {"$and": [
+            version_filter,
+            self._lesson_filter(lesson_number)
+        ]}
+    
+    def _lesson_filter(self, lesson_number: int) -> Dict:
+        """
+        Chunks of a lesson. With near-duplicate dedup on, this includes chunks stored
+        once for near-duplicates in several lessons (see _add_duplicate_lessons).
+        """
+        if self.deduplicator is None:
+            return {"lesson_number": lesson_number}
+        return {"$or": [
+            {"lesson_number": lesson_number},
+            {f"also_lesson_{lesson_number}": True}
+        ]}
+    
+    def _top_lesson_filters(self, query_embeddings: list, base_filter: Dict) -> List[Dict]:
+        """
+        Narrow a content filter to the lessons whose centroids best match each query.
+        
+        Args:
+            query_embeddings: Query embeddings
+            base_filter: Filter from _build_filter without a lesson number
+            
+        Returns:
+            One filter per query; base_filter itself when no lesson centroids match
+            (e.g. an index built before lesson centroids existed)
+        """
+        with metrics.LESSON_SELECTION.time():
+            try:
+                lessons = self.lesson_index.query(
+                    query_embeddings=query_embeddings,
+                    n_results=self.hierarchical_lessons,
+                    where=base_filter,
+                    include=["metadatas"]
+                )
+            except Exception as e:
+                print(f"Error selecting lessons: {e}")
+                return [base_filter] * len(query_embeddings)
+        
+        filters = []
+        for metadatas in lessons["metadatas"]:
+            clauses = [
+                {"course_version": meta["course_version"]} if meta["lesson_number"] == LessonCentroids.NO_LESSON
+                else {"$and": [{"course_version": meta["course_version"]}, self._lesson_filter(meta["lesson_number"])]}
+                for meta in metadatas
+            ]
+            if not clauses:
+                filters.append(base_filter)
+            elif len(clauses) == 1:
+                filters.append(clauses[0])
+            else:
+                filters.append({"$or": clauses})
+        return filters
+    
+    def _search_top_lessons(self, indices: List[int], embeddings: list, base_filter: Dict,
+                            search_limit: int, results: List[Optional[SearchResults]]):
+        """Hierarchical search for a group of batched requests, storing each SearchResults at its index"""
+        lesson_filters = self._top_lesson_filters(embeddings, base_filter)
+        for i, embedding, filter_dict in zip(indices, embeddings, lesson_filters):
+            try:
+                with metrics.CHROMA_QUERY.time():
+                    chroma_results = self._query_content([embedding], search_limit, filter_dict)
+                results[i] = SearchResults.from_chroma(chroma_results, query_embedding=embedding)
+            except Exception as e:
+                results[i] = SearchResults.empty(f"Search error: {str(e)}")
+    
+    def _active_version_key(self, course_title: str) -> Optional[str]:
+        version_key = self._load_active_versions().get(course_title)
+        if version_key is None:
+            # The course may have been added by another process since the last refresh
+            version_key = self._load_active_versions(force=True).get(course_title)
+        return version_key
+    
+    def _load_active_versions(self, force: bool = False) -> Dict[str, str]:
+        """Active course_version key per title, re-read from the catalog every VERSION_CACHE_SECONDS"""
+        if not force and time.monotonic() - self._versions_loaded_at < self.VERSION_CACHE_SECONDS:
+            return self._active_versions
+        with self._versions_lock:
+            try:
+                results = self.course_catalog.get(include=["metadatas"])
+                self._active_versions = {
+                    title: self.version_key(title, metadata.get("version", 0))
+                    for title, metadata in zip(results['ids'], results['metadatas'])
+                }
+                self._versions_loaded_at = time.monotonic()
+            except Exception as e:
+                print(f"Error loading course versions: {e}")
+        return self._active_versions
+    
+    @staticmethod
+    def version_key(course_title: str, version: int) -> str:
+        """Value of the course_version metadata field for one version of a course"""
+        return f"{course_title}@{version}"
+    
+    @staticmethod
+    def chunk_id(course_title: str, chunk_index: int, version: int = 0) -> str:
+        """ChromaDB id of a content chunk, derived from its course title and chunk index"""
+        chunk_id = f"{course_title.replace(' ', '_')}_{chunk_index}"
+        return chunk_id if version == 0 else f"{chunk_id}@v{version}"
+    
+    def get_course_version(self, course_title: str) -> Optional[int]:
+        """Active version of a course, or None if it is not in the catalog"""
+        results = self.course_catalog.get(ids=[course_title], include=["metadatas"])
+        if not results['ids']:
             return None
+        return results['metadatas'][0].get("version", 0)
+    
+    def _migrate_unversioned_courses(self):
+        """Tag chunks indexed before course versioning existed as version 0 of their course"""
+        try:
+            catalog = self.course_catalog.get(include=["metadatas"])
+        except Exception as e:
+            print(f"Error reading course catalog: {e}")
+            return
+        
+        for title, metadata in zip(catalog['ids'], catalog['metadatas']):
+            if "version" in metadata:
+                continue
+            chunks = self.course_content.get(where={"course_title": title}, include=["metadatas"])
+            if chunks['ids']:
+                self.course_content.update(
+                    ids=chunks['ids'],
+                    metadatas=[
+                        {**chunk_meta, "course_version": self.version_key(title, 0)}
+                        for chunk_meta in chunks['metadatas']
+                    ]
+                )
+            self.course_catalog.update(ids=[title], metadatas=[{**metadata, "version": 0}])
+            print(f"Tagged {len(chunks['ids'])} chunks of '{title}' as version 0")
+    
+    def _sync_active_flags(self):
+        """Set the active flags of every course from the catalog, e.g. after a crash mid-replace"""
+        try:
+            active_versions = self._load_active_versions(force=True)
+            for title, version_key in active_versions.items():
+                self._activate_version(title, version_key)
+        except Exception as e:
+            print(f"Error syncing active course versions: {e}")
+    
+    def _activate_version(self, course_title: str, version_key: str):
+        """
+        Flag one version of a course active in course_content and lesson_index and
+        clear the flag on its other versions. The new version is flagged first, so
+        searches over all courses never miss the course while this runs.
+        """
+        for collection in (self.course_content, self.lesson_index):
+            for active, where in self._active_flag_changes(course_title, version_key):
+                ids = collection.get(where=where, include=[])["ids"]
+                batch_size = self.client.get_max_batch_size()
+                for start in range(0, len(ids), batch_size):
+                    batch = ids[start:start + batch_size]
+                    # Metadata updates merge, so only the flag changes
+                    collection.update(ids=batch, metadatas=[{"active": active}] * len(batch))
+    
+    @staticmethod
+    def _active_flag_changes(course_title: str, version_key: str) -> List[Tuple[bool, Dict]]:
+        """(flag to set, filter of the records that need it) to make version_key the course's active version"""
+        return [
+            (True, {"$and": [{"course_version": version_key}, {"active": {"$ne": True}}]}),
+            (False, {"$and": [{"course_title": course_title}, {"course_version": {"$ne": version_key}},
+                              {"active": True}]})
+        ]
+    
+    def replace_course(self, course: Course, chunks: Union[ChunkBatch, List[CourseChunk]],
+                       source_file: Optional[str] = None, source_hash: Optional[str] = None) -> int:
+        """
+        Add a course, or replace every chunk of an existing course with the same title.
+        
+        The new chunks are written under a new version first, invisible to searches;
+        then the catalog entry is flipped to that version in one write, and the
+        active flags follow. A crash before the flip leaves the old version active,
+        and its leftovers are removed by the next replace; one between the flip and
+        the flags is repaired when the index is next opened. Only this course's chunks are written or deleted, and only text
+        that differs from the previous version is embedded.
+        
+        Args:
+            course: Course metadata (its title identifies the course)
+            chunks: All content chunks of the new version
+            source_file: Name of the document the course was read from
+            source_hash: Content hash of that document
             
-        # Handle different filter combinations
-        if course_title and lesson_number is not None:
-            return {"$and": [
-                {"course_title": course_title},
-                {"lesson_number": lesson_number}
-            ]}
+        Returns:
+            The new version number
+        """
+        previous = self.get_course_version(course.title)
+        # Millisecond timestamps keep versions unique even after a crash mid-replace
+        version = int(time.time() * 1000)
+        if previous is not None and version <= previous:
+            version = previous + 1
         
-        if course_title:
-            return {"course_title": course_title}
+        # Step 1: build the new version, invisible until the flip; unchanged chunk
+        # and sentence texts keep the previous version's embeddings
+        known_embeddings = None
+        if previous is not None:
+            previous_key = self.version_key(course.title, previous)
+            known_embeddings = self._stored_embeddings(self.course_content, previous_key)
+            if self.index_sentences:
+                known_embeddings.update(self._stored_embeddings(self.chunk_sentences, previous_key))
+        self.add_course_content(chunks, version, known_embeddings, active=False)
+        
+        # Step 2: flip visibility, for searches within the course and then over all courses
+        self.add_course_metadata(course, version, source_file, source_hash)
+        with self._versions_lock:
+            self._active_versions[course.title] = self.version_key(course.title, version)
+        self._activate_version(course.title, self.version_key(course.title, version))
+        
+        # Step 3: drop older versions, keeping the one just replaced so other
+        # processes that haven't refreshed their version cache can still serve it
+        keep = [self.version_key(course.title, version)]
+        if previous is not None:
+            keep.append(self.version_key(course.title, previous))
+        stale_versions = {"$and": [
+            {"course_title": course.title},
+            {"course_version": {"$nin": keep}}
+        ]}
+        self.course_content.delete(where=stale_versions)
+        self.chunk_sentences.delete(where=stale_versions)
+        self.lesson_index.delete(where=stale_versions)
+        return version
+    
+    def delete_course(self, course_title: str) -> bool:
+        """
+        Remove a course and all of its chunks.
+        
+        The catalog entry is removed first, which hides the course from searches at
+        once; its chunks are deleted afterwards.
+        
+        Args:
+            course_title: Exact title of the course
             
-        return {"lesson_number": lesson_number}
+        Returns:
+            True if the course existed
+        """
+        if self.get_course_version(course_title) is None:
+            return False
+        self.course_catalog.delete(ids=[course_title])
+        with self._versions_lock:
+            self._active_versions.pop(course_title, None)
+        self.course_content.delete(where={"course_title": course_title})
+        self.chunk_sentences.delete(where={"course_title": course_title})
+        self.lesson_index.delete(where={"course_title": course_title})
+        return True
     
-    def add_course_metadata(self, course: Course):
-        """Add course information to the catalog for semantic search"""
+    def add_course_metadata(self, course: Course, version: int = 0,
+                            source_file: Optional[str] = None, source_hash: Optional[str] = None):
+        """Add or update course information in the catalog for semantic search"""
         import json
 
         course_text = course.title
@@ -147,46 +989,262 @@ class VectorStore:
                 "lesson_link": lesson.lesson_link
             })
         
-        self.course_catalog.add(
+        metadata = {
+            "title": course.title,
+            "instructor": course.instructor,
+            "course_link": course.course_link,
+            "lessons_json": json.dumps(lessons_metadata),  # Serialize as JSON string
+            "lesson_count": len(course.lessons),
+            "version": version
+        }
+        # Which document the course came from, so a docs watcher can tell when it changed
+        if source_file is not None:
+            metadata["source_file"] = source_file
+            metadata["source_hash"] = source_hash
+        
+        # Upsert, so writing an existing course's entry flips its active version
+        self.course_catalog.upsert(
             documents=[course_text],
-            metadatas=[{
-                "title": course.title,
-                "instructor": course.instructor,
-                "course_link": course.course_link,
-                "lessons_json": json.dumps(lessons_metadata),  # Serialize as JSON string
-                "lesson_count": len(course.lessons)
-            }],
+            embeddings=self.embed_documents([course_text]),
+            metadatas=[metadata],
             ids=[course.title]
         )
     
-    def add_course_content(self, chunks: List[CourseChunk]):
-        """Add course content chunks to the vector store"""
-        if not chunks:
+    def add_course_content(self, chunks: Union[ChunkBatch, List[CourseChunk]], version: int = 0,
+                           known_embeddings: Optional[Dict[str, Any]] = None, active: bool = True):
+        """
+        Add course content chunks to the vector store as the given version of their course.
+        
+        Args:
+            chunks: Chunks to add
+            version: Course version the chunks belong to
+            known_embeddings: Embeddings by text to reuse instead of embedding those texts again
+            active: Whether searches over all courses see the chunks at once
+        """
+        if not isinstance(chunks, ChunkBatch):
+            chunks = ChunkBatch.from_chunks(chunks)
+        
+        duplicates = None
+        if self.deduplicator is not None:
+            # Near-duplicates are only matched within a course: each course's versions
+            # are replaced and deleted on their own, so no stored chunk may serve two courses
+            duplicates = self.deduplicator.find_duplicates(chunks.contents(0, len(chunks)), chunks.title_ids)
+            metrics.NEAR_DUPLICATE_CHUNKS.inc(len(duplicates))
+        
+        centroids = LessonCentroids()
+        batch_size = self.client.get_max_batch_size()
+        for documents, metadatas, ids in self.content_records(chunks, version, batch_size, duplicates, active):
+            embeddings = self._embed_reusing(documents, known_embeddings)
+            stored_embeddings = embeddings
+            if self.reducer is not None:
+                stored_embeddings = self.reducer.transform(embeddings)
+                for metadata, embedding in zip(metadatas, embeddings):
+                    metadata[FULL_EMBEDDING_KEY] = encode_embedding(embedding)
+            # Upsert, so re-running an interrupted ingestion overwrites its leftovers
+            self.course_content.upsert(
+                documents=documents,
+                embeddings=stored_embeddings,
+                metadatas=metadatas,
+                ids=ids
+            )
+            # Centroids (and reused embeddings) are always full width
+            centroids.add(metadatas, embeddings)
+            if self.index_sentences:
+                self.add_sentence_embeddings(ids, documents, metadatas, known_embeddings)
+        self._write_lesson_centroids(centroids, active)
+    
+    def _embed_reusing(self, documents: List[str], known_embeddings: Optional[Dict[str, Any]]) -> list:
+        """Embed documents, taking the vectors of texts in known_embeddings from there"""
+        if not known_embeddings:
+            return self.embed_documents(documents)
+        missing = list(dict.fromkeys(document for document in documents if document not in known_embeddings))
+        embedded = dict(zip(missing, self.embed_documents(missing))) if missing else {}
+        metrics.EMBEDDINGS_REUSED.inc(len(documents) - sum(1 for document in documents if document in embedded))
+        return [known_embeddings[document] if document in known_embeddings else embedded[document]
+                for document in documents]
+    
+    def _stored_embeddings(self, collection, version_key: str) -> Dict[str, Any]:
+        """Full-width embeddings of one course version's documents in a collection, by text"""
+        try:
+            stored = collection.get(where={"course_version": version_key},
+                                    include=["documents", "metadatas", "embeddings"])
+        except Exception as e:
+            print(f"Error reading embeddings of {version_key}: {e}")
+            return {}
+        return dict(zip(stored["documents"], self.full_embeddings(stored["embeddings"], stored["metadatas"])))
+    
+    def _write_lesson_centroids(self, centroids: LessonCentroids, active: bool = True):
+        ids, embeddings, metadatas = centroids.rows(active)
+        if ids:
+            self.lesson_index.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas)
+    
+    def _versions_missing_centroids(self, active_versions: Dict[str, str]) -> Dict[str, str]:
+        """The active versions (title -> key) that have chunks but no lesson centroids"""
+        indexed = {meta["course_version"] for meta in self.lesson_index.get(include=["metadatas"])["metadatas"]}
+        return {
+            title: version_key for title, version_key in active_versions.items()
+            if version_key not in indexed
+            and self.course_content.get(where={"course_version": version_key}, limit=1, include=[])["ids"]
+        }
+    
+    def build_missing_lesson_centroids(self):
+        """Compute lesson centroids for active courses indexed without them, from their stored chunk embeddings"""
+        try:
+            missing = self._versions_missing_centroids(self._load_active_versions(force=True))
+        except Exception as e:
+            print(f"Error reading lesson index: {e}")
             return
         
-        documents = [chunk.content for chunk in chunks]
-        metadatas = [{
-            "course_title": chunk.course_title,
-            "lesson_number": chunk.lesson_number,
-            "chunk_index": chunk.chunk_index
-        } for chunk in chunks]
-        # Use title with chunk index for unique IDs
-        ids = [f"{chunk.course_title.replace(' ', '_')}_{chunk.chunk_index}" for chunk in chunks]
-        
-        self.course_content.add(
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids
+        for title, version_key in missing.items():
+            chunks = self.course_content.get(where={"course_version": version_key}, include=["metadatas", "embeddings"])
+            centroids = LessonCentroids()
+            centroids.add(chunks["metadatas"], self.full_embeddings(chunks["embeddings"], chunks["metadatas"]))
+            self._write_lesson_centroids(centroids)
+            print(f"Built {len(centroids.sums)} lesson centroids for '{title}'")
+    
+    def add_sentence_embeddings(self, chunk_ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]],
+                                known_embeddings: Optional[Dict[str, Any]] = None):
+        """Embed and store each sentence of the given chunks, tagged with the chunk's id and course version"""
+        sentence_ids, sentences, sentence_metadatas = [], [], []
+        for chunk_id, document, metadata in zip(chunk_ids, documents, metadatas):
+            for position, sentence in enumerate(split_sentences(document)):
+                sentence_ids.append(f"{chunk_id}#{position}")
+                sentences.append(sentence)
+                sentence_metadatas.append({
+                    "chunk_id": chunk_id,
+                    "position": position,
+                    "course_title": metadata["course_title"],
+                    "course_version": metadata["course_version"]
+                })
+        
+        batch_size = self.client.get_max_batch_size()
+        for start in range(0, len(sentences), batch_size):
+            end = start + batch_size
+            self.chunk_sentences.upsert(
+                documents=sentences[start:end],
+                embeddings=self._embed_reusing(sentences[start:end], known_embeddings),
+                metadatas=sentence_metadatas[start:end],
+                ids=sentence_ids[start:end]
+            )
+    
+    def get_sentence_embeddings(self, chunk_ids: List[str]) -> Dict[str, Tuple[List[str], Any]]:
+        """
+        Cached sentences of the given chunks.
+        
+        Args:
+            chunk_ids: Content chunk ids
+            
+        Returns:
+            Mapping of chunk id to (sentences in order, their embeddings as a 2-D array);
+            chunks indexed without sentence embeddings are missing
+        """
+        if not chunk_ids:
+            return {}
+        results = self.chunk_sentences.get(
+            where={"chunk_id": {"$in": list(chunk_ids)}},
+            include=["documents", "metadatas", "embeddings"]
         )
+        rows: Dict[str, list] = {}
+        for document, metadata, embedding in zip(results["documents"], results["metadatas"], results["embeddings"]):
+            rows.setdefault(metadata["chunk_id"], []).append((metadata["position"], document, embedding))
+        
+        cached = {}
+        for chunk_id, sentence_rows in rows.items():
+            sentence_rows.sort(key=lambda row: row[0])
+            cached[chunk_id] = (
+                [document for _, document, _ in sentence_rows],
+                np.asarray([embedding for _, _, embedding in sentence_rows], dtype=np.float32)
+            )
+        return cached
+    
+    @classmethod
+    def content_records(cls, chunks: ChunkBatch, version: int, batch_size: int,
+                        duplicates: Optional[Dict[int, int]] = None, active: bool = True
+                        ) -> Iterator[Tuple[List[str], List[Dict[str, Any]], List[str]]]:
+        """
+        Turn a chunk batch into Chroma documents, metadatas and ids, one write batch at a time.
+        
+        Only the rows of the current batch exist as Python objects, so memory stays
+        flat however many chunks are ingested.
+        
+        Args:
+            chunks: Chunks to write
+            version: Course version the chunks belong to
+            batch_size: Rows per yielded batch
+            duplicates: Rows to leave out -> the row they duplicate, which records their lessons
+            active: Active flag of the chunks
+            
+        Returns:
+            Iterator of (documents, metadatas, ids)
+        """
+        # Title-derived keys are computed once per course, not once per chunk
+        titles = chunks.titles
+        version_keys = [cls.version_key(title, version) for title in titles]
+        duplicates = duplicates or {}
+        duplicate_lessons: Dict[int, List[int]] = {}
+        for row, kept in duplicates.items():
+            duplicate_lessons.setdefault(kept, []).append(chunks.lesson_numbers[row])
+        
+        for start in range(0, len(chunks), batch_size):
+            end = min(start + batch_size, len(chunks))
+            documents = chunks.contents(start, end)
+            metadatas = []
+            ids = []
+            for row, title_id, lesson_number, chunk_index in zip(range(start, end),
+                                                                 chunks.title_ids[start:end],
+                                                                 chunks.lesson_numbers[start:end],
+                                                                 chunks.chunk_indexes[start:end]):
+                if row in duplicates:
+                    documents[row - start] = None
+                    continue
+                title = titles[title_id]
+                metadata = {
+                    "course_title": title,
+                    "lesson_number": None if lesson_number == ChunkBatch.NO_LESSON else lesson_number,
+                    "chunk_index": chunk_index,
+                    "course_version": version_keys[title_id],
+                    "active": active
+                }
+                if row in duplicate_lessons:
+                    cls._add_duplicate_lessons(metadata, duplicate_lessons[row])
+                metadatas.append(metadata)
+                # Use title with chunk index (and version) for unique IDs
+                ids.append(cls.chunk_id(title, chunk_index, version))
+            if duplicates:
+                documents = [document for document in documents if document is not None]
+            yield documents, metadatas, ids
+    
+    @staticmethod
+    def _add_duplicate_lessons(metadata: Dict[str, Any], lesson_numbers: List[int]):
+        """Record on a stored chunk the lessons of the near-duplicates it stands for"""
+        metadata["duplicate_count"] = len(lesson_numbers)
+        other_lessons = sorted({
+            lesson_number for lesson_number in lesson_numbers
+            if lesson_number != ChunkBatch.NO_LESSON and lesson_number != metadata["lesson_number"]
+        })
+        if other_lessons:
+            # A string for display; one flag per lesson so lesson filters match the chunk
+            metadata["duplicate_lessons"] = ",".join(str(lesson_number) for lesson_number in other_lessons)
+            for lesson_number in other_lessons:
+                metadata[f"also_lesson_{lesson_number}"] = True
     
     def clear_all_data(self):
-        """Clear all data from both collections"""
+        """Clear all data: the catalog, chunks, chunk sentences and lesson centroids, and the embedding reduction"""
         try:
             self.client.delete_collection("course_catalog")
             self.client.delete_collection("course_content")
+            self.client.delete_collection("chunk_sentences")
+            self.client.delete_collection("lesson_index")
             # Recreate collections
             self.course_catalog = self._create_collection("course_catalog")
             self.course_content = self._create_collection("course_content")
+            self.chunk_sentences = self._create_collection("chunk_sentences")
+            self.lesson_index = self._create_collection("lesson_index")
+            # An empty index is full width; the reduction is fitted again on the next corpus
+            EmbeddingReducer.remove(self.chroma_path)
+            self.reducer = None
+            with self._versions_lock:
+                self._active_versions = {}
         except Exception as e:
             print(f"Error clearing data: {e}")
     
@@ -233,6 +1291,18 @@ class VectorStore:
             print(f"Error getting courses metadata: {e}")
             return []
 
+    def get_course_sources(self) -> Dict[str, Dict[str, str]]:
+        """Source document name and content hash of every course indexed with them, by course title"""
+        try:
+            metadatas = self.course_catalog.get(include=["metadatas"])["metadatas"]
+        except Exception as e:
+            print(f"Error getting course sources: {e}")
+            return {}
+        return {
+            metadata["title"]: {"source_file": metadata["source_file"], "source_hash": metadata.get("source_hash")}
+            for metadata in metadatas if metadata.get("source_file")
+        }
+    
     def get_course_link(self, course_title: str) -> Optional[str]:
         """Get course link for a given course title"""
         try:
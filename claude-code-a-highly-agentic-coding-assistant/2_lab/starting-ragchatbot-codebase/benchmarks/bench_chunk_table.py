@@ -0,0 +1,144 @@
+"""
+Compare memory and throughput of CourseChunk objects and the columnar ChunkBatch.
+
+Chunks the docs/ corpus once, then replays its rows COPIES times under distinct
+course titles to simulate a large ingestion. For each representation it measures
+building the chunk table and turning it into Chroma's documents, metadatas and
+ids, without embedding or writing anything:
+
+    objects   one Pydantic CourseChunk per chunk, then parallel lists for the
+              whole table (ingestion before ChunkBatch)
+    columnar  ChunkBatch rows, then VectorStore.content_records one Chroma
+              write batch at a time (current ingestion)
+
+Memory is measured with tracemalloc in a separate run: "table" is what the chunk
+table holds once built, "peak" the high-water mark including the Chroma payloads.
+
+Usage (from the project root):
+    uv run python benchmarks/bench_chunk_table.py --copies 200
+    uv run python benchmarks/bench_chunk_table.py --copies 2000 --batch-size 5461
+"""
+import argparse
+import gc
+import glob
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(PROJECT_DIR, "backend"))
+
+from config import config
+from document_processor import DocumentProcessor
+from models import ChunkBatch, CourseChunk
+from vector_store import VectorStore
+
+
+def corpus_rows(base, copies):
+    """Rows of the base batch, repeated under a distinct course title per copy"""
+    for copy in range(copies):
+        for i in range(len(base)):
+            yield (base.content(i), f"{base.course_title(i)} #{copy}",
+                   base.lesson_number(i), base.chunk_indexes[i])
+
+
+def build_objects(rows):
+    return [
+        CourseChunk(content=content, course_title=title, lesson_number=lesson_number, chunk_index=chunk_index)
+        for content, title, lesson_number, chunk_index in rows
+    ]
+
+
+def records_objects(chunks, batch_size):
+    """What add_course_content did with a list of CourseChunk"""
+    documents = [chunk.content for chunk in chunks]
+    metadatas = [{
+        "course_title": chunk.course_title,
+        "lesson_number": chunk.lesson_number,
+        "chunk_index": chunk.chunk_index,
+        "course_version": VectorStore.version_key(chunk.course_title, 0)
+    } for chunk in chunks]
+    ids = [VectorStore.chunk_id(chunk.course_title, chunk.chunk_index, 0) for chunk in chunks]
+    for start in range(0, len(documents), batch_size):
+        yield documents[start:start + batch_size], metadatas[start:start + batch_size], ids[start:start + batch_size]
+
+
+def build_columnar(rows):
+    batch = ChunkBatch()
+    for row in rows:
+        batch.append(*row)
+    return batch
+
+
+def records_columnar(batch, batch_size):
+    return VectorStore.content_records(batch, 0, batch_size)
+
+
+MODES = {
+    "objects": (build_objects, records_objects),
+    "columnar": (build_columnar, records_columnar),
+}
+
+
+def run(mode, base, copies, batch_size, trace):
+    """Build the table and walk its records; returns seconds per phase and, when tracing, bytes"""
+    build, records = MODES[mode]
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    table = build(corpus_rows(base, copies))
+    build_seconds = time.perf_counter() - start
+    table_bytes = tracemalloc.get_traced_memory()[0] if trace else None
+
+    start = time.perf_counter()
+    rows = 0
+    for documents, metadatas, ids in records(table, batch_size):
+        rows += len(ids)
+    records_seconds = time.perf_counter() - start
+    peak_bytes = tracemalloc.get_traced_memory()[1] if trace else None
+
+    if trace:
+        tracemalloc.stop()
+    return rows, build_seconds, records_seconds, table_bytes, peak_bytes
+
+
+def measure(mode, base, copies, batch_size):
+    # Timed and traced separately: tracemalloc slows every allocation down
+    rows, build_seconds, records_seconds, _, _ = run(mode, base, copies, batch_size, trace=False)
+    _, _, _, table_bytes, peak_bytes = run(mode, base, copies, batch_size, trace=True)
+    return {
+        "mode": mode,
+        "chunks": rows,
+        "build_seconds": round(build_seconds, 3),
+        "records_seconds": round(records_seconds, 3),
+        "chunks_per_second": round(rows / (build_seconds + records_seconds)),
+        "table_mb": round(table_bytes / 2**20, 1),
+        "peak_mb": round(peak_bytes / 2**20, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=200, help="Times the docs/ corpus is repeated")
+    parser.add_argument("--batch-size", type=int, default=5461, help="Rows per Chroma write (Chroma's default maximum)")
+    parser.add_argument("--docs", default=os.path.join(PROJECT_DIR, "docs"))
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    args = parser.parse_args()
+
+    processor = DocumentProcessor(config.CHUNK_SIZE, config.CHUNK_OVERLAP)
+    base = ChunkBatch()
+    for file_path in sorted(glob.glob(os.path.join(args.docs, "*.txt"))):
+        _, chunks = processor.process_course_document(file_path)
+        for i in range(len(chunks)):
+            base.append(chunks.content(i), chunks.course_title(i), chunks.lesson_number(i), chunks.chunk_indexes[i])
+
+    for mode in args.modes:
+        print(json.dumps({"copies": args.copies, **measure(mode, base, args.copies, args.batch_size)}), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark query embedding with and without the cross-request micro-batcher.
+
+Simulates concurrent searches: each client thread embeds one query at a time in
+a closed loop, either by calling the embedding function directly (one model
+call per query) or through EmbeddingBatcher. Reports throughput and latency
+percentiles per mode and client count.
+
+--simulate-ms replaces the model with a stand-in that sleeps that long per
+call plus --simulate-per-text-ms per text and returns zero vectors. Calls run
+one at a time, as on a model that keeps every core busy, so the batching
+effect can be measured without the model or independently of the machine.
+
+Usage (from the project root):
+    uv run python benchmarks/bench_embedding_batcher.py --clients 1 8 32 --seconds 10
+    uv run python benchmarks/bench_embedding_batcher.py --window-ms 1 5 --max-batch 32
+    uv run python benchmarks/bench_embedding_batcher.py --simulate-ms 5 --simulate-per-text-ms 0.2
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from config import config
+from embeddings import LazySentenceTransformerEmbeddingFunction
+from embedding_batcher import EmbeddingBatcher
+
+QUERIES = [
+    "What is the Model Context Protocol?",
+    "How do I build an MCP server in Python?",
+    "Explain computer use with Claude",
+    "What does lesson 3 of the retrieval course cover?",
+    "How does query expansion improve retrieval?",
+    "What are embeddings adapters?",
+    "How can prompts be compressed without losing accuracy?",
+    "Which tools can an MCP client call?",
+]
+
+
+class SimulatedEmbeddingFunction:
+    """Stand-in model whose cost is a fixed time per call plus a time per text, one call at a time"""
+
+    def __init__(self, call_ms, per_text_ms, dimensions=384):
+        self.call_seconds = call_ms / 1000
+        self.per_text_seconds = per_text_ms / 1000
+        self.dimensions = dimensions
+        self._lock = threading.Lock()
+
+    def __call__(self, texts):
+        with self._lock:
+            time.sleep(self.call_seconds + self.per_text_seconds * len(texts))
+        return [[0.0] * self.dimensions for _ in texts]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(embed, clients, seconds):
+    """Closed-loop load: each client embeds one query, waits for it, and repeats"""
+    latencies = [[] for _ in range(clients)]
+    stop = time.perf_counter() + seconds
+
+    def client(samples):
+        rng = random.Random()
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            embed([rng.choice(QUERIES)])
+            samples.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(samples,)) for samples in latencies]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    samples = [latency for client_samples in latencies for latency in client_samples]
+    return {
+        "queries": len(samples),
+        "queries_per_second": round(len(samples) / elapsed, 1),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--window-ms", type=float, nargs="+", default=[config.EMBEDDING_BATCH_WINDOW_MS or 2.0])
+    parser.add_argument("--max-batch", type=int, default=config.EMBEDDING_MAX_BATCH)
+    parser.add_argument("--simulate-ms", type=float, help="Use a stand-in model costing this many ms per call")
+    parser.add_argument("--simulate-per-text-ms", type=float, default=0.0,
+                        help="Additional stand-in model cost per text in the call")
+    args = parser.parse_args()
+
+    if args.simulate_ms is not None:
+        embedding_function = SimulatedEmbeddingFunction(args.simulate_ms, args.simulate_per_text_ms)
+        model = f"simulated:{args.simulate_ms}ms+{args.simulate_per_text_ms}ms/text"
+    else:
+        embedding_function = LazySentenceTransformerEmbeddingFunction(model_name=config.EMBEDDING_MODEL)
+        embedding_function(QUERIES)  # Load and warm up the model outside the measurements
+        model = config.EMBEDDING_MODEL
+
+    for clients in args.clients:
+        result = run(embedding_function, clients, args.seconds)
+        print(json.dumps({"model": model, "mode": "per_request", "clients": clients, **result}), flush=True)
+        for window_ms in args.window_ms:
+            batcher = EmbeddingBatcher(embedding_function, args.max_batch, window_ms)
+            result = run(batcher.embed, clients, args.seconds)
+            print(json.dumps({"model": model, "mode": "batched", "window_ms": window_ms, "clients": clients,
+                              **result}), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Memory, latency and recall of reduced-dimension chunk vectors over the docs/ corpus.
+
+Builds one full-width index from docs/course*_script.txt (optionally repeated
+--copies times under distinct titles), then, for every --dimensions value,
+rebuilds course_content with vectors reduced to that many dimensions
+(VectorStore.update_embedding_reduction; 0 = full width) and measures, for
+every --rescore-factors value:
+
+    neighbor_recall_at_k   share of the exact full-width k nearest chunks a
+                           search returns (ties with the k-th count as found)
+    question_recall_at_k   share of retrieval_questions.json answered from the
+                           expected lesson, as in bench_retrieval.py, and MRR@k
+    search_p50_ms/p99_ms   time of the content search itself (reduced query,
+                           HNSW search and full-width re-ranking), without
+                           embedding the query
+    vector_mb              memory of the vectors in course_content's HNSW index
+                           (stored chunks x dimensions x 4 bytes); the graph
+                           links (hnsw_links_mb, about 2 x max_neighbors ids per
+                           chunk) do not shrink with the dimensions
+    index_mb               index size on disk, which grows with reduction: each
+                           chunk keeps its full-width vector (float16) in its
+                           metadata for re-ranking
+
+Queries for neighbor recall are the benchmark questions plus the first sentence
+of --sample-queries random chunks. Prints one JSON object per grid point,
+tagged with the current git commit.
+
+Usage (from the project root):
+    uv run python benchmarks/bench_embedding_reduction.py
+    uv run python benchmarks/bench_embedding_reduction.py --dimensions 0 32 64 128 --rescore-factors 1 4 10
+    uv run python benchmarks/bench_embedding_reduction.py --copies 20 --reduction truncate --output results.jsonl
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.join(BENCHMARKS_DIR, "..")
+sys.path.insert(0, os.path.join(PROJECT_DIR, "backend"))
+
+from config import config
+from embedding_reduction import distances
+from hnsw_tuning import kth_distances, query_texts
+from bench_retrieval import build_index, directory_size, evaluate, git_commit, percentile
+
+
+def exact_neighbors(store, texts, k):
+    """Full-width vectors of the active chunks, the query embeddings and each query's exact k-th distance"""
+    where = store._build_filter(None, None)
+    records = store.course_content.get(where=where, include=["metadatas", "embeddings"])
+    vectors = store.full_embeddings(records["embeddings"], records["metadatas"])
+    queries = np.asarray(store.embed_queries(texts), dtype=np.float32)
+    rows = {chunk_id: row for row, chunk_id in enumerate(records["ids"])}
+    return where, vectors, rows, queries, kth_distances(queries, vectors, k, "l2")
+
+
+def measure(store, where, vectors, rows, queries, kth, k):
+    """Search every query; returns neighbor recall@k and latency percentiles"""
+    store._query_content(queries[:1], k, where)  # Loads the index before timing
+    latencies = []
+    recalls = []
+    for query, kth_distance in zip(queries, kth):
+        start = time.perf_counter()
+        found = store._query_content([query], k, where)["ids"][0]
+        latencies.append(time.perf_counter() - start)
+        found_distances = distances(query[None, :], vectors[[rows[chunk_id] for chunk_id in found]], "l2")[0]
+        recalls.append(int((found_distances <= kth_distance + 1e-5).sum()) / k)
+    return {
+        "neighbor_recall_at_k": round(float(np.mean(recalls)), 4),
+        "search_p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "search_p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[0, 32, 64, 128],
+                        help="Dimensions of the stored chunk vectors (0 = full width)")
+    parser.add_argument("--rescore-factors", type=int, nargs="+", default=[1, config.EMBEDDING_RESCORE_FACTOR],
+                        help="Candidates re-ranked at full width, as a multiple of k")
+    parser.add_argument("--reduction", choices=["pca", "truncate"], default=config.EMBEDDING_REDUCTION)
+    parser.add_argument("--k", type=int, default=config.MAX_RESULTS)
+    parser.add_argument("--model", default=config.EMBEDDING_MODEL)
+    parser.add_argument("--chunk-size", type=int, default=config.CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=config.CHUNK_OVERLAP)
+    parser.add_argument("--copies", type=int, default=1, help="Times the corpus is indexed under distinct titles")
+    parser.add_argument("--sample-queries", type=int, default=200, help="Chunks whose first sentence is a query")
+    parser.add_argument("--docs", default=os.path.join(PROJECT_DIR, "docs"))
+    parser.add_argument("--questions", default=os.path.join(BENCHMARKS_DIR, "retrieval_questions.json"))
+    parser.add_argument("--output", help="Also append the JSON lines to this file")
+    args = parser.parse_args()
+
+    with open(args.questions, encoding="utf-8") as f:
+        questions = json.load(f)["questions"]
+    files = sorted(glob.glob(os.path.join(args.docs, "course*_script.txt")))
+    if not files:
+        parser.error(f"No course*_script.txt files in {args.docs}")
+    commit = git_commit()
+    output = open(args.output, "a", encoding="utf-8") if args.output else None
+
+    with tempfile.TemporaryDirectory(prefix="bench_embedding_reduction_") as chroma_path:
+        store, chunk_count, _ = build_index(chroma_path, args.model, files, args.chunk_size,
+                                            args.chunk_overlap, args.copies)
+        store.embedding_reduction = args.reduction
+        texts = query_texts(store, store.course_content.get(include=[])["ids"], args.questions, args.sample_queries)
+        where, vectors, rows, queries, kth = exact_neighbors(store, texts, args.k)
+        stored_chunks = store.course_content.count()
+        max_neighbors = store.hnsw_configuration().get("max_neighbors", 16)
+
+        for dimensions in sorted(set(args.dimensions)):
+            store.embedding_dimensions = dimensions
+            if store.embedding_reduction_outdated():
+                start = time.perf_counter()
+                store.update_embedding_reduction()
+                rebuild_seconds = time.perf_counter() - start
+            else:
+                rebuild_seconds = 0.0
+            width = dimensions or vectors.shape[1]
+            # Re-ranking only applies to reduced vectors
+            for rescore_factor in (args.rescore_factors if dimensions else [None]):
+                store.rescore_factor = rescore_factor or 1
+                result = measure(store, where, vectors, rows, queries, kth, args.k)
+                question_result, _ = evaluate(store, questions, args.k)
+                line = {
+                    "commit": commit,
+                    "embedding_model": args.model,
+                    "reduction": args.reduction if dimensions else None,
+                    "dimensions": width,
+                    "rescore_factor": rescore_factor,
+                    "k": args.k,
+                    "queries": len(queries),
+                    **result,
+                    "question_recall_at_k": question_result["recall_at_k"],
+                    "mrr_at_k": question_result["mrr_at_k"],
+                    "chunks": chunk_count,
+                    "stored_chunks": stored_chunks,
+                    "vector_mb": round(stored_chunks * width * 4 / 2**20, 2),
+                    "hnsw_links_mb": round(stored_chunks * 2 * max_neighbors * 4 / 2**20, 2),
+                    "index_mb": round(directory_size(chroma_path) / 2**20, 1),
+                    "rebuild_seconds": round(rebuild_seconds, 2),
+                }
+                print(json.dumps(line), flush=True)
+                if output:
+                    output.write(json.dumps(line) + "\n")
+                    output.flush()
+        store.close()
+
+    if output:
+        output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Query latency while the index is being written, with and without index generations.
+
+Builds an index from docs/course*_script.txt, then runs closed-loop search
+clients over the questions of retrieval_questions.json, first with the index
+idle and then while a writer process re-ingests the whole corpus again and
+again, as in a serve.py deployment where workers answer queries while another
+process ingests (a writer thread in the same process would also compete with
+the searches for the GIL):
+
+    single       writer replaces each course in the index the clients read
+                 (INDEX_GENERATIONS off)
+    generations  writer copies the committed generation, replaces every course
+                 in the copy and publishes it; clients pin the committed
+                 generation per search (INDEX_GENERATIONS on)
+
+The writer embeds the corpus once before the measurement and reuses the vectors,
+so the comparison measures index contention rather than the embedding model
+competing for the CPU. Prints one JSON object per mode and phase with search latency
+percentiles and, for the ingest phase, the corpus passes the writer completed.
+
+Usage (from the project root):
+    uv run python benchmarks/bench_ingest_latency.py
+    uv run python benchmarks/bench_ingest_latency.py --clients 8 --seconds 20 --copies 5
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.join(BENCHMARKS_DIR, "..")
+sys.path.insert(0, os.path.join(PROJECT_DIR, "backend"))
+
+from config import config
+from document_processor import DocumentProcessor
+from index_generations import IndexGenerations
+from ingest_lock import IngestLock
+from vector_store import VectorStore
+from bench_retrieval import MemoizedEmbedder, copy_title, percentile
+
+
+def load_corpus(files, copies):
+    """(course, chunks) for every course file, repeated under distinct titles per copy"""
+    processor = DocumentProcessor(config.CHUNK_SIZE, config.CHUNK_OVERLAP)
+    corpus = []
+    for file_path in files:
+        course, chunks = processor.process_course_document(file_path)
+        for copy in range(copies):
+            title = copy_title(course.title, copy)
+            copy_chunks = chunks.to_chunks()
+            for chunk in copy_chunks:
+                chunk.course_title = title
+            corpus.append((course.model_copy(update={"title": title}), copy_chunks))
+    return corpus
+
+
+class SingleIndex:
+    """Writer and readers share one index"""
+
+    def __init__(self, chroma_path, model):
+        self.store = VectorStore(chroma_path, model)
+
+    def search(self, query):
+        return self.store.search(query)
+
+    def ingest(self, corpus):
+        for course, chunks in corpus:
+            self.store.replace_course(course, chunks)
+
+    def close(self):
+        self.store.close()
+
+
+class GenerationIndex:
+    """Writer builds a new generation; readers pin the committed one"""
+
+    def __init__(self, chroma_path, model):
+        self.ingest_lock = IngestLock(chroma_path)
+        self.generations = IndexGenerations(chroma_path, lambda path: VectorStore(path, model), self.ingest_lock)
+        with self.generations.read() as store:
+            self.store = store
+
+    def search(self, query):
+        with self.generations.read() as store:
+            return store.search(query)
+
+    def ingest(self, corpus):
+        with self.ingest_lock, self.generations.write() as store:
+            for course, chunks in corpus:
+                store.replace_course(course, chunks)
+
+    def close(self):
+        with self.generations.read() as store:
+            store.close()
+
+
+MODES = {"single": SingleIndex, "generations": GenerationIndex}
+
+
+def writer_main(mode, chroma_path, model, files, copies, ready, stop, passes):
+    """Writer process: re-ingest the corpus until stopped, reporting each pass's seconds"""
+    corpus = load_corpus(files, copies)
+    index = MODES[mode](chroma_path, model)
+    index.store.embedder = MemoizedEmbedder(index.store.embedder)
+    index.store.embedder([chunk.content for _, chunks in corpus for chunk in chunks])
+    ready.set()
+    while not stop.is_set():
+        start = time.perf_counter()
+        index.ingest(corpus)
+        passes.put(time.perf_counter() - start)
+    index.close()
+
+
+def measure(index, questions, clients, seconds, writer=None):
+    """Closed-loop searches for the given seconds, while the writer process runs if given"""
+    latencies = [[] for _ in range(clients)]
+    errors = []
+    stop = threading.Event()
+
+    def client(samples):
+        rng = random.Random()
+        while not stop.is_set():
+            start = time.perf_counter()
+            results = index.search(rng.choice(questions)["question"])
+            samples.append(time.perf_counter() - start)
+            if results.error:
+                errors.append(results.error)
+
+    passes = []
+    if writer is not None:
+        context = multiprocessing.get_context("spawn")
+        ready, writer_stop, pass_queue = context.Event(), context.Event(), context.Queue()
+        process = context.Process(target=writer_main, args=(*writer, ready, writer_stop, pass_queue))
+        process.start()
+        ready.wait()
+
+    threads = [threading.Thread(target=client, args=(samples,)) for samples in latencies]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    if writer is not None:
+        writer_stop.set()
+        while process.is_alive() or not pass_queue.empty():
+            try:
+                passes.append(pass_queue.get(timeout=0.1))
+            except Exception:
+                pass
+        process.join()
+
+    samples = [latency for client_samples in latencies for latency in client_samples]
+    result = {
+        "searches": len(samples),
+        "search_p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "search_p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "search_max_ms": round(max(samples) * 1000, 2),
+        "errors": len(errors),
+    }
+    if writer is not None:
+        result["ingest_passes"] = len(passes)
+        result["ingest_pass_seconds"] = round(sum(passes) / len(passes), 2) if passes else None
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--clients", type=int, default=4, help="Concurrent search threads")
+    parser.add_argument("--seconds", type=float, default=10, help="Duration of each phase")
+    parser.add_argument("--copies", type=int, default=1, help="Times the corpus is indexed under distinct titles")
+    parser.add_argument("--docs", default=os.path.join(PROJECT_DIR, "docs"))
+    parser.add_argument("--questions", default=os.path.join(BENCHMARKS_DIR, "retrieval_questions.json"))
+    args = parser.parse_args()
+
+    with open(args.questions, encoding="utf-8") as f:
+        questions = json.load(f)["questions"]
+    files = sorted(glob.glob(os.path.join(args.docs, "course*_script.txt")))
+    if not files:
+        parser.error(f"No course*_script.txt files in {args.docs}")
+    corpus = load_corpus(files, args.copies)
+    embedder = None
+
+    for mode in args.modes:
+        with tempfile.TemporaryDirectory(prefix="bench_ingest_latency_") as chroma_path:
+            index = MODES[mode](chroma_path, config.EMBEDDING_MODEL)
+            store = index.store
+            if embedder is None:
+                store.warm_up()
+                embedder = MemoizedEmbedder(store.embedder)
+            # Every store of this mode shares the embedding settings of the first one
+            store.embedder = embedder
+            index.ingest(corpus)
+            index.search(questions[0]["question"])  # Warm Chroma's indexes before timing searches
+
+            writer = (mode, chroma_path, config.EMBEDDING_MODEL, files, args.copies)
+            for phase, phase_writer in (("idle", None), ("ingest", writer)):
+                result = measure(index, questions, args.clients, args.seconds, phase_writer)
+                print(json.dumps({
+                    "mode": mode,
+                    "phase": phase,
+                    "clients": args.clients,
+                    "chunks": sum(len(chunks) for _, chunks in corpus),
+                    **result,
+                }), flush=True)
+            index.close()
+
+
+if __name__ == "__main__":
+    main()
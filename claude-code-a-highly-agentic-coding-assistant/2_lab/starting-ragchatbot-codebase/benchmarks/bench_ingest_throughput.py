@@ -0,0 +1,271 @@
+"""
+Ingestion throughput of DocumentProcessor and VectorStore, stage by stage.
+
+Replicates the docs/course*_script.txt transcripts under distinct course titles
+into a temporary folder until it holds each target corpus size, then ingests
+that folder into a fresh index one course at a time, timing each stage
+separately:
+
+    parse  read the file and split it into course metadata and lessons
+           (process_course_document minus chunking)
+    chunk  DocumentProcessor.chunk_text
+    embed  the embedding model, EMBED_BATCH_SIZE texts per call
+    write  VectorStore.replace_course, as the server ingests a course, minus
+           its embedding calls: near-duplicate detection, Chroma upserts of
+           chunks, sentence vectors and lesson centroids, the catalog entry and
+           the version switch; then, as after the server's folder ingestion,
+           fitting the embedding reduction and rebuilding course_content with it
+
+The store is configured from backend/config.py (NEAR_DUPLICATE_THRESHOLD,
+INDEX_SENTENCES, HIERARCHICAL_TOP_LESSONS, EMBEDDING_DIMENSIONS, ...), so the
+write stage does what the server's would. With INDEX_SENTENCES on, the embed
+stage includes the sentence embeddings as well.
+
+Courses are processed one at a time, as the server ingests them, so memory
+stays bounded by the largest course rather than the corpus. For every stage it
+prints one JSON object with its wall time, throughput (input MB/s and chunks/s),
+CPU utilization (CPU seconds per wall second, summed over threads, so above 1
+when the embedding model uses several cores) and the peak resident memory seen
+while the stage ran. Peak memory is sampled from /proc (Linux); elsewhere it is
+the process high-water mark so far.
+
+--until chunk skips the embedding model entirely, for quick checks of
+chunk_text at large corpus sizes.
+
+Usage (from the project root):
+    uv run python benchmarks/bench_ingest_throughput.py
+    uv run python benchmarks/bench_ingest_throughput.py --sizes 10MB 100MB 1GB --until chunk
+    uv run python benchmarks/bench_ingest_throughput.py --sizes 10MB --embed-batch-size 32 256 --output results.jsonl
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.join(BENCHMARKS_DIR, "..")
+sys.path.insert(0, os.path.join(PROJECT_DIR, "backend"))
+
+from config import config
+from document_processor import DocumentProcessor
+from vector_store import VectorStore
+from bench_retrieval import git_commit
+
+STAGES = ("parse", "chunk", "embed", "write")
+SIZE_UNITS = {"": 1, "KB": 2**10, "MB": 2**20, "GB": 2**30}
+
+
+def parse_size(text):
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([KMG]?B?)", text.strip().upper())
+    if not match or match.group(2) not in SIZE_UNITS:
+        raise argparse.ArgumentTypeError(f"Invalid size {text!r}; use e.g. 10MB or 1GB")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def rss_bytes():
+    """Current resident memory, or the process high-water mark where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class StageMeter:
+    """Accumulates wall time, CPU time and peak RSS per stage across many short stage runs"""
+
+    def __init__(self, sample_interval=0.01):
+        self.wall = dict.fromkeys(STAGES, 0.0)
+        self.cpu = dict.fromkeys(STAGES, 0.0)
+        self.peak_rss = dict.fromkeys(STAGES, 0)
+        self._stage = None
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, args=(sample_interval,), daemon=True)
+        self._sampler.start()
+
+    def _sample(self, interval):
+        while not self._stop.wait(interval):
+            stage = self._stage
+            if stage is not None:
+                self.peak_rss[stage] = max(self.peak_rss[stage], rss_bytes())
+
+    def run(self, stage, func, *args):
+        """Call func(*args) as part of the given stage and return its result; stages may nest"""
+        outer, self._stage = self._stage, stage
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            return func(*args)
+        finally:
+            wall = time.perf_counter() - start_wall
+            cpu = time.process_time() - start_cpu
+            self.wall[stage] += wall
+            self.cpu[stage] += cpu
+            if outer is not None:
+                # Time of a nested stage is not counted in the enclosing one as well
+                self.wall[outer] -= wall
+                self.cpu[outer] -= cpu
+            self.peak_rss[stage] = max(self.peak_rss[stage], rss_bytes())
+            self._stage = outer
+
+    def close(self):
+        self._stop.set()
+        self._sampler.join()
+
+
+class StagedDocumentProcessor(DocumentProcessor):
+    """DocumentProcessor whose chunk_text calls are metered as the chunk stage"""
+
+    def __init__(self, chunk_size, chunk_overlap, meter):
+        super().__init__(chunk_size, chunk_overlap)
+        self.meter = meter
+
+    def chunk_text(self, text):
+        # Runs inside process_course_document, i.e. nested in the parse stage
+        return self.meter.run("chunk", super().chunk_text, text)
+
+
+class MeteredEmbedder:
+    """Embeds batch_size texts per model call, each metered as the embed stage"""
+
+    def __init__(self, embed, meter, batch_size):
+        self.embed = embed
+        self.meter = meter
+        self.batch_size = batch_size
+
+    def __call__(self, texts):
+        embeddings = []
+        for start in range(0, len(texts), self.batch_size):
+            embeddings.extend(self.meter.run("embed", self.embed, texts[start:start + self.batch_size]))
+        return embeddings
+
+
+def store_settings():
+    """VectorStore settings from the config that change what ingestion does"""
+    return dict(
+        index_sentences=config.CONTEXT_TOKEN_BUDGET > 0 and config.INDEX_SENTENCES,
+        hierarchical_lessons=config.HIERARCHICAL_TOP_LESSONS,
+        near_duplicate_threshold=config.NEAR_DUPLICATE_THRESHOLD,
+        embedding_dimensions=config.EMBEDDING_DIMENSIONS,
+        embedding_reduction=config.EMBEDDING_REDUCTION,
+    )
+
+
+def build_corpus(docs_files, folder, target_bytes):
+    """Copy the transcripts into folder under distinct course titles until it holds target_bytes"""
+    sources = []
+    for file_path in docs_files:
+        with open(file_path, encoding="utf-8") as f:
+            sources.append(f.read().split("\n", 1))
+    total = 0
+    copy = 0
+    while total < target_bytes:
+        for index, (first_line, rest) in enumerate(sources):
+            if total >= target_bytes:
+                break
+            text = f"{first_line} (copy {copy})\n{rest}" if copy else f"{first_line}\n{rest}"
+            data = text.encode("utf-8")
+            with open(os.path.join(folder, f"course{copy:06d}_{index:03d}.txt"), "wb") as f:
+                f.write(data)
+            total += len(data)
+        copy += 1
+    return total
+
+
+def ingest(folder, chroma_path, model, chunk_size, chunk_overlap, embed_batch_size, until):
+    """Ingest every file of the folder stage by stage; returns the meter and the chunk count"""
+    meter = StageMeter()
+    processor = StagedDocumentProcessor(chunk_size, chunk_overlap, meter)
+    store = VectorStore(chroma_path, model, **store_settings()) if until != "chunk" else None
+    if store is not None:
+        store.warm_up()  # Model loading is not part of the embed stage
+        # Embedding calls made inside the write stage are counted as embed, not write
+        store.embedder = MeteredEmbedder(store.embedder, meter, embed_batch_size)
+        write_batch_size = store.client.get_max_batch_size()
+    chunk_count = 0
+    try:
+        for file_path in sorted(glob.glob(os.path.join(folder, "*.txt"))):
+            course, chunks = meter.run("parse", processor.process_course_document, file_path)
+            chunk_count += len(chunks)
+            if store is None:
+                continue
+            if until == "write":
+                meter.run("write", store.replace_course, course, chunks)
+            else:
+                for documents, _, _ in VectorStore.content_records(chunks, 0, write_batch_size):
+                    store.embed_documents(documents)
+        if until == "write" and store.embedding_reduction_outdated():
+            meter.run("write", store.update_embedding_reduction)
+    finally:
+        meter.close()
+        if store is not None:
+            store.close()
+    return meter, chunk_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=parse_size, nargs="+", default=[parse_size("10MB")],
+                        help="Target corpus sizes, e.g. 10MB 100MB 1GB")
+    parser.add_argument("--until", choices=STAGES[1:], default="write", help="Last stage to run")
+    parser.add_argument("--embed-batch-size", type=int, nargs="+", default=[64], help="Chunks per embedding call")
+    parser.add_argument("--model", default=config.EMBEDDING_MODEL)
+    parser.add_argument("--chunk-size", type=int, default=config.CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=config.CHUNK_OVERLAP)
+    parser.add_argument("--docs", default=os.path.join(PROJECT_DIR, "docs"))
+    parser.add_argument("--output", help="Also append the JSON lines to this file")
+    args = parser.parse_args()
+
+    docs_files = sorted(glob.glob(os.path.join(args.docs, "course*_script.txt")))
+    if not docs_files:
+        parser.error(f"No course*_script.txt files in {args.docs}")
+    commit = git_commit()
+    output = open(args.output, "a", encoding="utf-8") if args.output else None
+    stages = STAGES[:STAGES.index(args.until) + 1]
+    # Embedding batch size only matters once the embed stage runs
+    batch_sizes = args.embed_batch_size if args.until != "chunk" else args.embed_batch_size[:1]
+
+    for target_bytes in args.sizes:
+        corpus_dir = tempfile.mkdtemp(prefix="bench_ingest_corpus_")
+        try:
+            corpus_bytes = build_corpus(docs_files, corpus_dir, target_bytes)
+            for embed_batch_size in batch_sizes:
+                with tempfile.TemporaryDirectory(prefix="bench_ingest_throughput_") as chroma_path:
+                    meter, chunk_count = ingest(corpus_dir, chroma_path, args.model, args.chunk_size,
+                                                args.chunk_overlap, embed_batch_size, args.until)
+                for stage in stages:
+                    wall = meter.wall[stage]
+                    line = {
+                        "commit": commit,
+                        "stage": stage,
+                        "corpus_mb": round(corpus_bytes / 2**20, 1),
+                        "chunks": chunk_count,
+                        "chunk_size": args.chunk_size,
+                        "chunk_overlap": args.chunk_overlap,
+                        "embed_batch_size": embed_batch_size if stage == "embed" else None,
+                        "seconds": round(wall, 3),
+                        "mb_per_second": round(corpus_bytes / 2**20 / wall, 2) if wall else None,
+                        "chunks_per_second": round(chunk_count / wall) if wall else None,
+                        "cpu_utilization": round(meter.cpu[stage] / wall, 2) if wall else None,
+                        "peak_rss_mb": round(meter.peak_rss[stage] / 2**20, 1),
+                    }
+                    print(json.dumps(line), flush=True)
+                    if output:
+                        output.write(json.dumps(line) + "\n")
+                        output.flush()
+        finally:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    if output:
+        output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Retrieval quality and latency benchmark over the docs/ corpus.
+
+For every combination of embedding model, chunk size and chunk overlap, builds
+a fresh index from docs/course*_script.txt in a temporary directory, then runs
+the checked-in questions of retrieval_questions.json through VectorStore.search
+for every result limit k. A search hits when one of its results comes from the
+question's expected course and lesson.
+
+Each index is searched flat (every chunk) and hierarchically (only the chunks of
+the --top-lessons lessons whose centroids best match the query). --copies
+repeats the corpus under distinct course titles to simulate a large catalog; a
+result from any copy of the expected lesson counts as a hit. Copies fill the
+top k with duplicates of the same chunk, so compare search modes at equal
+--copies rather than against a single-copy run.
+
+--near-duplicate-thresholds builds one index per MinHash threshold (0 = no
+deduplication); a result stored once for near-duplicate chunks hits for any of
+the lessons it lists.
+
+Prints one JSON object per grid point with recall@k, MRR@k, index build time,
+index size on disk, stored chunk count and search latency percentiles, tagged with the current git
+commit, so runs can be saved with --output and compared across commits.
+
+Usage (from the project root):
+    uv run python benchmarks/bench_retrieval.py
+    uv run python benchmarks/bench_retrieval.py --chunk-sizes 400 800 1200 --overlaps 0 100 --k 1 3 5 10
+    uv run python benchmarks/bench_retrieval.py --models all-MiniLM-L6-v2 all-mpnet-base-v2 --output results.jsonl
+    uv run python benchmarks/bench_retrieval.py --copies 50 --search-modes flat hierarchical --top-lessons 4 8
+    uv run python benchmarks/bench_retrieval.py --near-duplicate-thresholds 0 0.8 0.6
+"""
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.join(BENCHMARKS_DIR, "..")
+sys.path.insert(0, os.path.join(PROJECT_DIR, "backend"))
+
+from config import config
+from document_processor import DocumentProcessor
+from models import ChunkBatch
+from vector_store import VectorStore
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class MemoizedEmbedder:
+    """Embeds each distinct text once, so corpus copies cost no extra model calls"""
+
+    def __init__(self, embed):
+        self.embed = embed
+        self.vectors = {}
+
+    def __call__(self, texts):
+        missing = list(dict.fromkeys(text for text in texts if text not in self.vectors))
+        if missing:
+            self.vectors.update(zip(missing, self.embed(missing)))
+        return [self.vectors[text] for text in texts]
+
+
+def copy_title(title, copy):
+    return title if copy == 0 else f"{title} (copy {copy})"
+
+
+def copy_chunks(chunks, title):
+    """A new ChunkBatch with the rows of chunks under another course title"""
+    batch = ChunkBatch()
+    for i in range(len(chunks)):
+        batch.append(chunks.content(i), title, chunks.lesson_number(i), chunks.chunk_indexes[i])
+    return batch
+
+
+def build_index(chroma_path, model, files, chunk_size, chunk_overlap, copies, near_duplicate_threshold=0.0):
+    """Index the course files into a new store; returns the store, chunk count and build seconds"""
+    store = VectorStore(chroma_path, model, near_duplicate_threshold=near_duplicate_threshold)
+    store.warm_up()  # Model loading is not part of the build time
+    embedder = store.embedder
+    if copies > 1:
+        store.embedder = MemoizedEmbedder(embedder)
+
+    start = time.perf_counter()
+    processor = DocumentProcessor(chunk_size, chunk_overlap)
+    chunk_count = 0
+    for file_path in files:
+        course, chunks = processor.process_course_document(file_path)
+        for copy in range(copies):
+            title = copy_title(course.title, copy)
+            store.replace_course(course.model_copy(update={"title": title}), copy_chunks(chunks, title))
+            chunk_count += len(chunks)
+    build_seconds = time.perf_counter() - start
+    store.embedder = embedder
+    return store, chunk_count, build_seconds
+
+
+def lessons(metadata):
+    """Lesson of a result, plus those of the near-duplicates stored as it"""
+    other_lessons = metadata.get("duplicate_lessons")
+    return [metadata.get("lesson_number")] + ([int(n) for n in other_lessons.split(",")] if other_lessons else [])
+
+
+def is_hit(metadata, item):
+    title = metadata.get("course_title", "")
+    return (item["lesson_number"] in lessons(metadata)
+            and (title == item["course_title"] or title.startswith(item["course_title"] + " (copy ")))
+
+
+def evaluate(store, questions, k):
+    """Search every question with limit k; returns quality, latency and the missed questions"""
+    reciprocal_ranks = []
+    latencies = []
+    missed = []
+    for item in questions:
+        start = time.perf_counter()
+        results = store.search(item["question"], course_name=item.get("course_name"), limit=k)
+        latencies.append(time.perf_counter() - start)
+
+        rank = next((
+            position for position, metadata in enumerate(results.metadata, 1) if is_hit(metadata, item)
+        ), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+        if rank is None:
+            missed.append(item["question"])
+
+    return {
+        "recall_at_k": round(sum(1 for rr in reciprocal_ranks if rr) / len(questions), 4),
+        "mrr_at_k": round(sum(reciprocal_ranks) / len(questions), 4),
+        "search_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "search_p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }, missed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", nargs="+", default=[config.EMBEDDING_MODEL])
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[config.CHUNK_SIZE])
+    parser.add_argument("--overlaps", type=int, nargs="+", default=[config.CHUNK_OVERLAP])
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, config.MAX_RESULTS])
+    parser.add_argument("--search-modes", nargs="+", choices=["flat", "hierarchical"], default=["flat", "hierarchical"])
+    parser.add_argument("--top-lessons", type=int, nargs="+", default=[config.HIERARCHICAL_TOP_LESSONS or 8],
+                        help="Lessons searched in hierarchical mode")
+    parser.add_argument("--copies", type=int, default=1, help="Times the corpus is indexed under distinct titles")
+    parser.add_argument("--near-duplicate-thresholds", type=float, nargs="+", default=[config.NEAR_DUPLICATE_THRESHOLD],
+                        help="MinHash similarity at which a course's chunks are stored once (0 = off)")
+    parser.add_argument("--docs", default=os.path.join(PROJECT_DIR, "docs"))
+    parser.add_argument("--questions", default=os.path.join(BENCHMARKS_DIR, "retrieval_questions.json"))
+    parser.add_argument("--output", help="Also append the JSON lines to this file")
+    parser.add_argument("--show-misses", action="store_true", help="Include the questions that missed")
+    args = parser.parse_args()
+
+    with open(args.questions, encoding="utf-8") as f:
+        questions = json.load(f)["questions"]
+    files = sorted(glob.glob(os.path.join(args.docs, "course*_script.txt")))
+    if not files:
+        parser.error(f"No course*_script.txt files in {args.docs}")
+    commit = git_commit()
+    output = open(args.output, "a", encoding="utf-8") if args.output else None
+
+    for model in args.models:
+        for chunk_size in args.chunk_sizes:
+            for chunk_overlap in args.overlaps:
+                if chunk_overlap >= chunk_size:
+                    print(f"Skipping chunk_size={chunk_size} chunk_overlap={chunk_overlap}: overlap must be smaller",
+                          file=sys.stderr)
+                    continue
+                for threshold in args.near_duplicate_thresholds:
+                    with tempfile.TemporaryDirectory(prefix="bench_retrieval_") as chroma_path:
+                        store, chunk_count, build_seconds = build_index(
+                            chroma_path, model, files, chunk_size, chunk_overlap, args.copies, threshold
+                        )
+                        stored_chunks = store.course_content.count()
+                        index_bytes = directory_size(chroma_path)
+
+                        searches = [("flat", 0)] if "flat" in args.search_modes else []
+                        if "hierarchical" in args.search_modes:
+                            searches += [("hierarchical", top_lessons) for top_lessons in args.top_lessons]
+                        for search_mode, top_lessons in searches:
+                            store.hierarchical_lessons = top_lessons
+                            store.search(questions[0]["question"])  # Warm Chroma's indexes before timing searches
+                            for k in args.k:
+                                result, missed = evaluate(store, questions, k)
+                                line = {
+                                    "commit": commit,
+                                    "embedding_model": model,
+                                    "chunk_size": chunk_size,
+                                    "chunk_overlap": chunk_overlap,
+                                    "copies": args.copies,
+                                    "near_duplicate_threshold": threshold,
+                                    "search_mode": search_mode,
+                                    "top_lessons": top_lessons or None,
+                                    "k": k,
+                                    "questions": len(questions),
+                                    **result,
+                                    "chunks": chunk_count,
+                                    "stored_chunks": stored_chunks,
+                                    "build_seconds": round(build_seconds, 2),
+                                    "index_bytes": index_bytes,
+                                }
+                                if args.show_misses:
+                                    line["missed"] = missed
+                                print(json.dumps(line), flush=True)
+                                if output:
+                                    output.write(json.dumps(line) + "\n")
+                                    output.flush()
+
+    if output:
+        output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark per-request session overhead for each session store backend.
+
+A simulated request does what RAGSystem.query does with a session: read the
+formatted conversation history, then append the question/answer exchange.
+
+Usage (from the project root):
+    uv run python benchmarks/bench_session_store.py --requests 20000 --sessions 1000
+    uv run python benchmarks/bench_session_store.py --processes 4
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from session_manager import SessionManager
+from session_store import InMemorySessionStore, SQLiteSessionStore
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_requests(manager, session_ids, requests, seed=0):
+    """Time history read and exchange write per simulated request, in microseconds"""
+    rng = random.Random(seed)
+    answer = "An answer of typical length. " * 20
+    reads, writes = [], []
+    for i in range(requests):
+        session_id = rng.choice(session_ids)
+
+        start = time.perf_counter()
+        manager.get_conversation_history(session_id)
+        reads.append((time.perf_counter() - start) * 1e6)
+
+        start = time.perf_counter()
+        manager.add_exchange(session_id, f"question {i}", answer)
+        writes.append((time.perf_counter() - start) * 1e6)
+    return reads, writes
+
+
+def summarize(name, reads, writes, elapsed):
+    totals = [r + w for r, w in zip(reads, writes)]
+    return {
+        "backend": name,
+        "requests": len(totals),
+        "read_us_p50": round(percentile(reads, 50), 1),
+        "read_us_p99": round(percentile(reads, 99), 1),
+        "write_us_p50": round(percentile(writes, 50), 1),
+        "write_us_p99": round(percentile(writes, 99), 1),
+        "request_us_mean": round(statistics.mean(totals), 1),
+        "requests_per_sec": round(len(totals) / elapsed, 1),
+    }
+
+
+def _sqlite_worker(args):
+    """Run requests against a shared SQLite store from a separate process"""
+    db_path, session_ids, requests, seed = args
+    manager = SessionManager(2, SQLiteSessionStore(db_path))
+    return run_requests(manager, session_ids, requests, seed)
+
+
+def bench_single(name, store, sessions, requests):
+    manager = SessionManager(2, store)
+    session_ids = [manager.create_session() for _ in range(sessions)]
+    start = time.perf_counter()
+    reads, writes = run_requests(manager, session_ids, requests)
+    return summarize(name, reads, writes, time.perf_counter() - start)
+
+
+def bench_sqlite_processes(db_path, sessions, requests, processes):
+    manager = SessionManager(2, SQLiteSessionStore(db_path))
+    session_ids = [manager.create_session() for _ in range(sessions)]
+    per_process = requests // processes
+    start = time.perf_counter()
+    with Pool(processes) as pool:
+        outputs = pool.map(
+            _sqlite_worker,
+            [(db_path, session_ids, per_process, seed) for seed in range(processes)]
+        )
+    elapsed = time.perf_counter() - start
+    reads = [r for out in outputs for r in out[0]]
+    writes = [w for out in outputs for w in out[1]]
+    return summarize(f"sqlite x{processes} processes", reads, writes, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--processes", type=int, default=0,
+                        help="Also run the SQLite store from this many concurrent processes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = [
+            bench_single("memory", InMemorySessionStore(), args.sessions, args.requests),
+            bench_single("sqlite", SQLiteSessionStore(os.path.join(tmp, "single.db")),
+                         args.sessions, args.requests),
+        ]
+        if args.processes > 1:
+            results.append(bench_sqlite_processes(
+                os.path.join(tmp, "shared.db"), args.sessions, args.requests, args.processes
+            ))
+
+    for result in results:
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Search throughput and per-process index size of the sharded index, by shard count.
+
+Indexes docs/course*_script.txt --copies times under distinct course titles
+once per --shards value: 0 is the single in-process VectorStore, N > 0 a
+ShardedVectorStore with N shard processes. Shard indexes are built in this
+process, each course written to its shard's directory, with every distinct
+text embedded once. The benchmark questions are embedded once as well, then
+searched over all courses (search_embedded, as the search tool does after
+embedding) from --clients concurrent threads, --rounds times each.
+
+For every (shards, clients) pair it prints one JSON object with:
+
+    queries_per_second       searches completed per wall-clock second
+    search_p50_ms/p99_ms     latency of one search, including the fan-out and merge
+    recall_vs_single         share of k results at most as far as the single index's
+                             k-th result (ties count as found: copies of a chunk
+                             are equally close); below 1 when shards miss the
+                             deadline or their smaller HNSW graphs find other neighbors
+    timeouts                 shard searches left out for missing --timeout-ms
+    max_shard_chunks         chunks held by the largest shard (the whole index at 0)
+    max_shard_rss_mb         resident memory of the largest shard process
+                             (this process at 0, which also holds the model)
+
+Results are tagged with the current git commit.
+
+Usage (from the project root):
+    uv run python benchmarks/bench_sharding.py
+    uv run python benchmarks/bench_sharding.py --copies 100 --shards 0 1 2 4 8 --clients 1 8 32
+    uv run python benchmarks/bench_sharding.py --timeout-ms 50 --output results.jsonl
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.join(BENCHMARKS_DIR, "..")
+sys.path.insert(0, os.path.join(PROJECT_DIR, "backend"))
+
+from config import config
+from document_processor import DocumentProcessor
+from vector_store import VectorStore
+from sharding import ShardedVectorStore, shard_for, shard_path
+import metrics
+from bench_retrieval import MemoizedEmbedder, build_index, copy_chunks, copy_title, git_commit, percentile
+
+
+def rss_mb(pid):
+    with open(f"/proc/{pid}/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def build_shards(chroma_path, model, files, chunk_size, chunk_overlap, copies, shards, embedder):
+    """Write every course copy into its shard's index; returns the chunk count of each shard"""
+    stores = [VectorStore(shard_path(chroma_path, index), model) for index in range(shards)]
+    for store in stores:
+        store.embedder = embedder
+    processor = DocumentProcessor(chunk_size, chunk_overlap)
+    for file_path in files:
+        course, chunks = processor.process_course_document(file_path)
+        for copy in range(copies):
+            title = copy_title(course.title, copy)
+            stores[shard_for(title, shards)].replace_course(course.model_copy(update={"title": title}),
+                                                            copy_chunks(chunks, title))
+    counts = [store.course_content.count() for store in stores]
+    for store in stores:
+        store.close()
+    return counts
+
+
+def run_clients(store, embeddings, k, clients, rounds):
+    """Search every embedding rounds times from concurrent threads; returns results, latencies and wall time"""
+    work = [i for _ in range(rounds) for i in range(len(embeddings))]
+    latencies = [0.0] * len(work)
+    found = [None] * len(work)
+
+    def client(offset):
+        for position in range(offset, len(work), clients):
+            start = time.perf_counter()
+            result = store.search_embedded(embeddings[work[position]], limit=k)
+            latencies[position] = time.perf_counter() - start
+            found[position] = result.distances
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as executor:
+        list(executor.map(client, range(clients)))
+    return work, found, latencies, time.perf_counter() - start
+
+
+def timeouts():
+    return sum(child.value for child in metrics.SHARD_TIMEOUTS._children.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, nargs="+", default=[0, 1, 2, 4], help="Shard counts (0 = unsharded)")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8], help="Concurrent searching threads")
+    parser.add_argument("--copies", type=int, default=20, help="Times the corpus is indexed under distinct titles")
+    parser.add_argument("--rounds", type=int, default=5, help="Times each client set searches every question")
+    parser.add_argument("--timeout-ms", type=float, default=config.SHARD_TIMEOUT_MS)
+    parser.add_argument("--k", type=int, default=config.MAX_RESULTS)
+    parser.add_argument("--model", default=config.EMBEDDING_MODEL)
+    parser.add_argument("--chunk-size", type=int, default=config.CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=config.CHUNK_OVERLAP)
+    parser.add_argument("--docs", default=os.path.join(PROJECT_DIR, "docs"))
+    parser.add_argument("--questions", default=os.path.join(BENCHMARKS_DIR, "retrieval_questions.json"))
+    parser.add_argument("--output", help="Also append the JSON lines to this file")
+    args = parser.parse_args()
+
+    with open(args.questions, encoding="utf-8") as f:
+        questions = [item["question"] for item in json.load(f)["questions"]]
+    files = sorted(glob.glob(os.path.join(args.docs, "course*_script.txt")))
+    if not files:
+        parser.error(f"No course*_script.txt files in {args.docs}")
+    commit = git_commit()
+    output = open(args.output, "a", encoding="utf-8") if args.output else None
+
+    # The unsharded index is always built first: it embeds the corpus and gives the reference results
+    root = tempfile.mkdtemp(prefix="bench_sharding_")
+    try:
+        single, chunk_count, _ = build_index(os.path.join(root, "single"), args.model, files,
+                                             args.chunk_size, args.chunk_overlap, args.copies)
+        embedder = MemoizedEmbedder(single.embedder)
+        embeddings = single.embed_queries(questions)
+        # k-th distance of each question in the single index; copies of a chunk tie, so ids are not compared
+        reference = [single.search_embedded(embedding, limit=args.k).distances[-1] for embedding in embeddings]
+
+        for shards in sorted(set(args.shards)):
+            if shards == 0:
+                store, shard_chunks = single, [single.course_content.count()]
+            else:
+                chroma_path = os.path.join(root, f"shards-{shards}")
+                shard_chunks = build_shards(chroma_path, args.model, files, args.chunk_size, args.chunk_overlap,
+                                            args.copies, shards, embedder)
+                store = ShardedVectorStore(chroma_path, shards, timeout=args.timeout_ms / 1000,
+                                           embedding_model=args.model, max_results=args.k)
+                store.warm_index()  # Shards load their indexes before timing searches
+            for clients in args.clients:
+                timeouts_before = timeouts()
+                work, found, latencies, wall = run_clients(store, embeddings, args.k, clients, args.rounds)
+                recall = [sum(distance <= reference[i] + 1e-5 for distance in found_distances) / args.k
+                          for i, found_distances in zip(work, found)]
+                pids = store.shard_pids() if shards else [os.getpid()]
+                line = {
+                    "commit": commit,
+                    "embedding_model": args.model,
+                    "shards": shards,
+                    "clients": clients,
+                    "k": args.k,
+                    "searches": len(work),
+                    "queries_per_second": round(len(work) / wall, 1),
+                    "search_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+                    "search_p99_ms": round(percentile(latencies, 99) * 1000, 2),
+                    "recall_vs_single": round(sum(recall) / len(recall), 4),
+                    "timeouts": int(timeouts() - timeouts_before),
+                    "timeout_ms": args.timeout_ms if shards else None,
+                    "chunks": chunk_count,
+                    "max_shard_chunks": max(shard_chunks),
+                    "max_shard_rss_mb": round(max(rss_mb(pid) for pid in pids), 1),
+                }
+                print(json.dumps(line), flush=True)
+                if output:
+                    output.write(json.dumps(line) + "\n")
+                    output.flush()
+            if shards:
+                store.close()
+        single.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    if output:
+        output.close()
+
+
+if __name__ == "__main__":
+    main()
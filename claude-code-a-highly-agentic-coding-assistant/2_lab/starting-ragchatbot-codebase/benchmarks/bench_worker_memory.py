@@ -0,0 +1,130 @@
+"""
+Measure resident memory per extra worker (Linux only).
+
+Starts the backend with 1..N workers, once through the pre-fork launcher
+(backend/serve.py) and once through plain `uvicorn --workers`, waits until it
+answers /api/courses, and sums the proportional set size (PSS) of the whole
+process tree. PSS splits shared pages between the processes sharing them, so
+the growth from one worker to N is the real cost of each extra worker.
+
+Usage (from the project root):
+    uv run python benchmarks/bench_worker_memory.py --workers 1 2 4
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+
+def children_of(pid):
+    """All descendants of pid, found by scanning /proc"""
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; ppid follows the closing paren
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        parents.setdefault(ppid, []).append(int(entry))
+
+    found, stack = [], [pid]
+    while stack:
+        for child in parents.get(stack.pop(), []):
+            found.append(child)
+            stack.append(child)
+    return found
+
+
+def memory_kb(pid):
+    """(Pss, Private) in kB from smaps_rollup"""
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if parts[0] in ("Pss:", "Private_Clean:", "Private_Dirty:"):
+                    values[parts[0]] = int(parts[1])
+    except OSError:
+        return 0, 0
+    return values.get("Pss:", 0), values.get("Private_Clean:", 0) + values.get("Private_Dirty:", 0)
+
+
+def wait_until_ready(port, expected_children, root_pid, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/api/courses", timeout=5).read()
+            # Give every worker time to finish importing the app
+            if len(children_of(root_pid)) >= expected_children:
+                time.sleep(5)
+                return True
+        except OSError:
+            pass
+        time.sleep(1)
+    return False
+
+
+def measure(mode, workers, port, timeout):
+    if mode == "prefork":
+        cmd = [sys.executable, "serve.py", "--workers", str(workers), "--port", str(port),
+               "--log-level", "warning"]
+        expected_children = workers
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "app:app", "--workers", str(workers),
+               "--port", str(port), "--log-level", "warning"]
+        # A single uvicorn worker runs in the launching process itself
+        expected_children = workers if workers > 1 else 0
+
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_until_ready(port, expected_children, proc.pid, timeout):
+            return {"mode": mode, "workers": workers, "error": "server did not become ready"}
+        pids = [proc.pid] + children_of(proc.pid)
+        pss, private = map(sum, zip(*(memory_kb(pid) for pid in pids)))
+        return {
+            "mode": mode,
+            "workers": workers,
+            "processes": len(pids),
+            "pss_mb": round(pss / 1024, 1),
+            "private_mb": round(private / 1024, 1),
+        }
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--modes", nargs="+", default=["prefork", "uvicorn"], choices=["prefork", "uvicorn"])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    for mode in args.modes:
+        baseline = None
+        for workers in sorted(args.workers):
+            result = measure(mode, workers, args.port, args.timeout)
+            if "error" not in result:
+                if baseline is None:
+                    baseline = result
+                elif workers > baseline["workers"]:
+                    extra = workers - baseline["workers"]
+                    result["pss_mb_per_extra_worker"] = round((result["pss_mb"] - baseline["pss_mb"]) / extra, 1)
+            print(json.dumps(result), flush=True)
+
+
+if __name__ == "__main__":
+    main()
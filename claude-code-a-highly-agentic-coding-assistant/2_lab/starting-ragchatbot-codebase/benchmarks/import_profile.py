@@ -0,0 +1,83 @@
+"""
+Import-time profile of the backend.
+
+Runs `import app` in a fresh interpreter under `python -X importtime` and
+reports the wall time of the import, the slowest modules by cumulative
+import time, and whether the heavy dependencies (torch,
+sentence_transformers, anthropic) were loaded at import time at all.
+
+Usage (from the project root):
+    uv run python benchmarks/import_profile.py                # FAST_START = True
+    uv run python benchmarks/import_profile.py --eager --top 30
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+HEAVY_MODULES = ["torch", "sentence_transformers", "transformers", "anthropic", "chromadb"]
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from config import config
+config.FAST_START = {fast_start}
+config.INGEST_ON_STARTUP = False
+import app
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy} if m in sys.modules]}}))
+"""
+
+
+def parse_importtime(stderr):
+    """Parse -X importtime lines into (module, self_us, cumulative_us)"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            rows.append((name.strip(), int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--eager", action="store_true", help="Profile with FAST_START = False (loads the model)")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest top-level imports to list")
+    args = parser.parse_args()
+
+    script = IMPORT_SCRIPT.format(fast_start=not args.eager, heavy=HEAVY_MODULES)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        print(proc.stderr[-2000:], file=sys.stderr)
+        return proc.returncode
+
+    summary = json.loads(proc.stdout.strip().splitlines()[-1])
+    rows = parse_importtime(proc.stderr)
+    # Only top-level packages, so nested imports are not double counted
+    top_level = [row for row in rows if "." not in row[0]]
+    slowest = sorted(top_level, key=lambda row: row[2], reverse=True)[:args.top]
+
+    print(json.dumps({
+        "fast_start": not args.eager,
+        "import_app_seconds": round(summary["seconds"], 3),
+        "modules_imported": len(rows),
+        "heavy_modules_loaded": summary["loaded"],
+        "slowest_imports_ms": [
+            {"module": name, "cumulative_ms": round(cumulative / 1000, 1)}
+            for name, _, cumulative in slowest
+        ],
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Concurrency stress test for RAGSystem.query.
+
+Runs many queries at once against one shared RAGSystem and checks that every
+query gets back exactly the sources of its own searches. Each query searches a
+single course, so any source from another course means state leaked between
+concurrent queries.
+
+The Anthropic call is replaced by a scripted generator that issues the same
+tool call Claude would, with a random delay around it to interleave threads.
+The searches themselves run against the real vector store built from docs/.
+
+Usage (from the project root):
+    uv run python benchmarks/stress_concurrent_queries.py --queries 2000 --threads 32
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+from config import config
+from rag_system import RAGSystem
+
+
+class ScriptedGenerator:
+    """Stands in for AIGenerator: searches the course named in the query, like Claude's tool call would"""
+
+    def __init__(self, max_delay):
+        self.max_delay = max_delay
+
+    def generate_response(self, query, conversation_history=None, tools=None, tool_manager=None):
+        course_title = query.rsplit("|", 1)[1]
+        time.sleep(random.uniform(0, self.max_delay))
+        result = tool_manager.execute_tool(
+            "search_course_content", query="lesson overview", course_name=course_title
+        )
+        time.sleep(random.uniform(0, self.max_delay))
+        return f"Answer from {len(result)} characters of course content"
+
+
+def run_query(rag_system, course_title):
+    answer, sources = rag_system.query(f"stress|{course_title}")
+    leaked = [source for source in sources if not source.startswith(course_title)]
+    return bool(sources), leaked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--max-delay", type=float, default=0.01, help="Max random delay around the tool call (s)")
+    args = parser.parse_args()
+
+    os.chdir(BACKEND_DIR)
+    rag_system = RAGSystem(config)
+    rag_system.add_course_folder("../docs")
+    rag_system.ai_generator = ScriptedGenerator(args.max_delay)
+    course_titles = rag_system.vector_store.get_existing_course_titles()
+
+    workload = [random.choice(course_titles) for _ in range(args.queries)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        outcomes = list(executor.map(lambda title: run_query(rag_system, title), workload))
+    elapsed = time.perf_counter() - start
+
+    queries_with_leaks = sum(1 for _, leaked in outcomes if leaked)
+    queries_without_sources = sum(1 for has_sources, _ in outcomes if not has_sources)
+    print(json.dumps({
+        "queries": args.queries,
+        "threads": args.threads,
+        "seconds": round(elapsed, 2),
+        "queries_per_second": round(args.queries / elapsed, 1),
+        "queries_with_foreign_sources": queries_with_leaks,
+        "queries_without_sources": queries_without_sources,
+    }))
+    return 1 if queries_with_leaks or queries_without_sources else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
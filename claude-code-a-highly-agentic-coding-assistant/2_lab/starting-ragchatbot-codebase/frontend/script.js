@@ -80,9 +80,15 @@ async function sendMessage() {
             currentSessionId = data.session_id;
         }
 
+        // Flag answers produced while course materials are still being indexed
+        let answer = data.answer;
+        if (data.partial_index) {
+            answer += '\n\n*Course materials are still being indexed, so this answer may be incomplete.*';
+        }
+
         // Replace loading message with response
         loadingMessage.remove();
-        addMessage(data.answer, 'assistant', data.sources);
+        addMessage(answer, 'assistant', data.sources);
 
     } catch (error) {
         // Replace loading message with error